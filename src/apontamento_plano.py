@@ -0,0 +1,58 @@
+import logging
+import time
+from pathlib import Path
+from typing import Optional
+
+from src.tx.exceptions import CircuitOpenError
+from src.tx.tx import Tx
+
+logger = logging.getLogger("src.apontamento_plano")
+
+# Sufixo do arquivo que indica que o início do plano já foi apontado. Contém
+# _APONTADO para ser ignorado pelos observadores e pela busca de arquivos .tx
+SUFIXO_INICIO_APONTADO = "_INICIO_APONTADO"
+
+
+def caminho_marcador_inicio(pasta: Path, nome_base: str) -> Path:
+    return Path(pasta) / f"{nome_base}{SUFIXO_INICIO_APONTADO}.tx"
+
+
+def aponta_plano(
+    tx: Tx,
+    codigo_layout: str,
+    tipo_apontamento: str,
+    marcador_inicio: Optional[Path] = None,
+    espera: float = 2.0,
+):
+    """
+    Aponta o plano e, com `INICIO_E_FIM`, também o seu fim.
+
+    Cada chamada ao `/apontar` alterna o estado do plano. Se o circuit breaker
+    abrir depois de o início ter sido apontado, `marcador_inicio` é criado e a
+    próxima tentativa aponta somente o fim.
+    """
+
+    if marcador_inicio is not None and marcador_inicio.exists():
+        logger.info(f"Início do plano {codigo_layout} já apontado, apontando o fim")
+        tx.plano_de_corte.apontar(codigo_layout=codigo_layout)
+        marcador_inicio.unlink()
+        return
+
+    tx.plano_de_corte.apontar(codigo_layout=codigo_layout)
+
+    if tipo_apontamento != "INICIO_E_FIM":
+        return
+
+    time.sleep(espera)
+
+    logger.info(f"Apontando fim do plano de corte: {codigo_layout}")
+
+    try:
+        tx.plano_de_corte.apontar(codigo_layout=codigo_layout)
+    except CircuitOpenError:
+        if marcador_inicio is not None:
+            try:
+                marcador_inicio.touch()
+            except OSError as exc:
+                logger.error(f"Erro ao criar {marcador_inicio}: {exc}")
+        raise
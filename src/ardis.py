@@ -0,0 +1,243 @@
+import logging
+import re
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from src.tx.modules.plano_de_corte.types import (
+    PlanoDeCorteCreateModel,
+    PlanoDeCortePecasCreateModel,
+    TipoMateriaPrima,
+)
+
+logger = logging.getLogger("src.ardis")
+
+# Mesmo código gerado pelo relatório CSV_TO_TEMPOX_DB do Ardis:
+# str(LayRemark1 + "I" + LayRemark4 + "L" + LayNo + "-")
+FORMATO_CODIGO_LAYOUT = "{LayRemark1}I{LayRemark4}L{LayNo}-"
+
+# Referência das peças que o Ardis gera a partir das sobras do layout
+REFERENCIA_RECORTE = "Sobras"
+
+_SECAO = re.compile(r"^\[([^\]]+)\]$")
+_NOME_E_INDICE = re.compile(r"^(.*)-(\d+)$")
+
+Registro = Dict[str, str]
+
+
+def le_secoes(
+    caminho: Path, encoding: str = "latin1"
+) -> Iterator[Tuple[str, Optional[int], List[Registro]]]:
+    """
+    Percorre as seções de um arquivo de otimização do Ardis (`.R41` ou `.STK`),
+    no formato:
+
+        [ISTK-1]
+        L=739
+        B=340
+        [ISTK-1]
+
+    Retorna, para cada seção, o nome, o índice (`1` em `ISTK-1`, ou `None`) e
+    os registros. Uma seção pode ter vários registros separados por linhas em
+    branco, como em `LAYSTK`. O arquivo é lido linha a linha.
+    """
+
+    secao: Optional[str] = None
+    registros: List[Registro] = []
+    registro: Registro = {}
+
+    with open(caminho, "r", encoding=encoding, errors="replace") as arquivo:
+        for linha in arquivo:
+            linha = linha.rstrip("\r\n")
+            marcador = _SECAO.match(linha)
+
+            if secao is None:
+                if marcador:
+                    secao = marcador.group(1)
+                continue
+
+            if marcador and marcador.group(1) == secao:
+                if registro:
+                    registros.append(registro)
+
+                nome_e_indice = _NOME_E_INDICE.match(secao)
+
+                if nome_e_indice:
+                    yield nome_e_indice.group(1), int(nome_e_indice.group(2)), registros
+                else:
+                    yield secao, None, registros
+
+                secao = None
+                registros = []
+                registro = {}
+                continue
+
+            if not linha.strip():
+                if registro:
+                    registros.append(registro)
+                    registro = {}
+                continue
+
+            chave, separador, valor = linha.partition("=")
+
+            if separador:
+                registro[chave.strip()] = valor
+
+
+def _float(registro: Registro, chave: str, padrao: float = 0.0):
+    valor = registro.get(chave, "").strip()
+
+    return float(valor.replace(",", ".")) if valor else padrao
+
+
+def _int_opcional(valor: Optional[str]):
+    """
+    Extrai o número de campos como `ORD9011188`, ou `None` se não houver
+    """
+
+    digitos = re.sub(r"\D", "", valor or "")
+
+    return int(digitos) if digitos else None
+
+
+class LeitorOtimizacao:
+    """
+    Monta os planos de corte diretamente do arquivo `.R41` da otimização do
+    Ardis, sem a exportação dos relatórios para csv.
+
+    `campo_id_ordem` e `campo_id_unico_peca` indicam quais campos `EXTnn` das
+    peças contém esses ids.
+    """
+
+    def __init__(
+        self,
+        id_recurso: int,
+        formato_codigo_layout: str = FORMATO_CODIGO_LAYOUT,
+        campo_id_ordem: str = "EXT02",
+        campo_id_unico_peca: str = "EXT21",
+    ):
+        self.id_recurso = id_recurso
+        self.formato_codigo_layout = formato_codigo_layout
+        self.campo_id_ordem = campo_id_ordem
+        self.campo_id_unico_peca = campo_id_unico_peca
+
+    def le(self, caminho: Path) -> List[PlanoDeCorteCreateModel]:
+        projeto: Registro = {}
+        materiais: Dict[int, str] = {}
+        chapas: Dict[int, Registro] = {}
+        # Somente os campos usados de cada peça são mantidos em memória
+        pecas: Dict[int, Tuple[Optional[int], Optional[int], bool]] = {}
+        pecas_por_layout: Dict[int, List[Registro]] = {}
+        planos: List[PlanoDeCorteCreateModel] = []
+
+        for nome, indice, registros in le_secoes(caminho):
+            registro = registros[0] if registros else {}
+
+            if nome == "PROJECT":
+                projeto = registro
+            elif nome == "MAT" and indice is not None:
+                materiais[indice] = registro.get("MAT", "")
+            elif nome == "ISTK" and indice is not None:
+                pecas[indice] = (
+                    _int_opcional(registro.get(self.campo_id_ordem)),
+                    _int_opcional(registro.get(self.campo_id_unico_peca)),
+                    registro.get("REF", "").strip() == REFERENCIA_RECORTE,
+                )
+            elif nome == "ISTD" and indice is not None:
+                chapas[indice] = registro
+            elif nome == "LAYSTK" and indice is not None:
+                pecas_por_layout[indice] = registros
+            elif nome == "LAYOUTS" and indice is not None:
+                planos.append(
+                    self._monta_plano(
+                        indice,
+                        registro,
+                        projeto,
+                        chapas,
+                        materiais,
+                        pecas,
+                        pecas_por_layout.pop(indice, []),
+                    )
+                )
+
+        logger.info("Arquivo %s lido com sucesso", caminho.name)
+
+        return planos
+
+    def _monta_plano(
+        self,
+        indice: int,
+        layout: Registro,
+        projeto: Registro,
+        chapas: Dict[int, Registro],
+        materiais: Dict[int, str],
+        pecas: Dict[int, Tuple[Optional[int], Optional[int], bool]],
+        pecas_do_layout: List[Registro],
+    ):
+        chapa = chapas.get(int(layout.get("STDNR", "0")), {})
+        material = materiais.get(int(chapa.get("MATNR", "0")), "")
+
+        codigo_layout = self.formato_codigo_layout.format(
+            **{"LayRemark1": "", "LayRemark4": "", **layout, "LayNo": indice}
+        )
+
+        area_bruta = _float(layout, "BRUTOPP")
+        area_liquida = _float(layout, "NETTOPP")
+        # Área restante descontando peças, perdas de corte e refilos
+        area_sobra = max(
+            area_bruta
+            - area_liquida
+            - _float(layout, "VERLOPP")
+            - _float(layout, "BOORDOPP"),
+            0.0,
+        )
+
+        qtd_recortes = 0
+        pecas_create: List[PlanoDeCortePecasCreateModel] = []
+
+        for peca_layout in pecas_do_layout:
+            id_ordem, id_unico_peca, recorte = pecas.get(
+                int(peca_layout.get("STKNR", "0")), (None, None, False)
+            )
+
+            if recorte:
+                qtd_recortes += 1
+                continue
+
+            pecas_create.append(
+                PlanoDeCortePecasCreateModel(
+                    qtd_cortada_no_layout=int(peca_layout.get("AANT", "1")),
+                    id_unico_peca=id_unico_peca,
+                    id_ordem=id_ordem,
+                    id_retrabalho=None,
+                    tempo_corte_segundos=_float(peca_layout, "LayPartCutTime"),
+                )
+            )
+
+        # Chapas de estoque de sobras vêm marcadas com VOORR=1
+        sobra = (
+            chapa.get("VOORR", "0").strip() == "1"
+            or "SOBRA" in chapa.get("BEM", "").upper()
+        )
+
+        return PlanoDeCorteCreateModel(
+            codigo_layout=codigo_layout,
+            descricao_material=material,
+            id_recurso=self.id_recurso,
+            # Soma dos cortes de todos os níveis (SNLL1, SNLD2, SNLL3...)
+            mm_comp_linear=sum(
+                _float(layout, chave) for chave in layout if chave.startswith("SNL")
+            ),
+            mm_comprimento=_float(chapa, "L", _float(layout, "L")),
+            mm_largura=_float(chapa, "B", _float(layout, "B")),
+            nome_projeto=projeto.get("Name", ""),
+            perc_aproveitamento=area_liquida / area_bruta * 100 if area_bruta else 0,
+            perc_sobras=area_sobra / area_bruta * 100 if area_bruta else 0,
+            tipo=TipoMateriaPrima.sobra if sobra else TipoMateriaPrima.chapa,
+            codigo_lote=layout.get("LayRemark1", ""),
+            qtd_chapas=int(layout.get("AANT", "1")),
+            tempo_estimado_seg=_float(layout, "WERKTIJD"),
+            qtd_recortes=qtd_recortes,
+            qtd_separacao_manual=0,
+            qtd_separacao_automatica=0,
+            pecas=pecas_create,
+        )
@@ -33,6 +33,74 @@ parser.add_argument(
     help="Tempo limite para as requisições HTTP, em segundos.",
     default=None,
 )
+parser.add_argument(
+    "--max-conexoes",
+    type=int,
+    help="Número máximo de conexões simultâneas com a API.",
+    default=10,
+)
+parser.add_argument(
+    "--max-conexoes-keep-alive",
+    type=int,
+    help="Número máximo de conexões ociosas mantidas abertas com a API.",
+    default=5,
+)
+parser.add_argument(
+    "--keep-alive-expiry",
+    type=float,
+    help="Tempo, em segundos, que uma conexão ociosa é mantida aberta.",
+    default=60.0,
+)
+parser.add_argument(
+    "--http2",
+    action="store_true",
+    help="Utiliza HTTP/2 nas requisições, caso o pacote 'h2' esteja instalado.",
+)
+parser.add_argument(
+    "--keep-warm",
+    type=float,
+    help="Intervalo, em segundos, para manter a conexão com a API ativa enquanto "
+    "o programa estiver ocioso. Se não informado, a conexão não é mantida.",
+    default=None,
+)
+parser.add_argument(
+    "--max-tentativas",
+    type=int,
+    help="Número máximo de tentativas para requisições com erros transitórios "
+    "(timeouts, falhas de conexão, erros 5xx e 429). Envios que alteram dados "
+    "(leituras, apontamentos, ordens) só são repetidos quando não chegaram ao "
+    "servidor: falha de conexão, 429 ou 503 com Retry-After.",
+    default=3,
+)
+parser.add_argument(
+    "--circuit-breaker-falhas",
+    type=int,
+    help="Número de falhas seguidas da API para suspender novas requisições.",
+    default=5,
+)
+parser.add_argument(
+    "--circuit-breaker-tempo",
+    type=float,
+    help="Tempo, em segundos, que as requisições ficam suspensas após a API "
+    "atingir o limite de falhas seguidas.",
+    default=60.0,
+)
+parser.add_argument(
+    "--cache-token",
+    type=Path,
+    help="Arquivo onde o token de acesso é guardado entre execuções, evitando "
+    "um novo login a cada chamada. No Windows o arquivo herda as permissões da "
+    "pasta, então use uma pasta do próprio usuário, como %%LOCALAPPDATA%%.",
+    default=None,
+)
+parser.add_argument(
+    "--compressao",
+    type=str,
+    choices=["gzip", "zstd"],
+    help="Comprime o corpo dos envios grandes (novo-plano-de-corte e nova-ordem). "
+    "zstd requer o pacote 'zstandard'.",
+    default=None,
+)
 parser.add_argument(
     "--log-file",
     type=str,
@@ -127,6 +195,29 @@ apontar_leitura_furadeira_nanxing_parser.add_argument(
     required=False,
     default=5
 )
+apontar_leitura_furadeira_nanxing_parser.add_argument(
+    "--outbox",
+    type=Path,
+    help="Arquivo SQLite usado como fila local de envio. Se informado, substitui "
+    "os arquivos _PROCESSADO_TEMPOX e _COM_ERRO",
+    default=None,
+)
+apontar_leitura_furadeira_nanxing_parser.add_argument(
+    "--arquivo-checkpoint",
+    type=Path,
+    help="Arquivo onde é registrada a posição já lida de cada arquivo da "
+    "máquina. Padrão: _CHECKPOINT_TEMPOX.json no diretório dos arquivos",
+    default=None,
+)
+apontar_leitura_furadeira_nanxing_parser.add_argument(
+    "--arquivo-indice",
+    type=Path,
+    help="Arquivo SQLite com o índice das linhas já processadas. Deve ficar em "
+    "um disco local, pois o SQLite em modo WAL não funciona em pastas de rede. "
+    "Padrão: um arquivo por diretório na pasta de dados local do usuário "
+    "(%%LOCALAPPDATA%%\\TempoX no Windows)",
+    default=None,
+)
 
 # Apontar Leitura furadeira scm pratika
 apontar_leitura_furadeira_scm_pratika_parser = subparsers.add_parser(
@@ -152,6 +243,29 @@ apontar_leitura_furadeira_scm_pratika_parser.add_argument(
     required=False,
     default=5
 )
+apontar_leitura_furadeira_scm_pratika_parser.add_argument(
+    "--outbox",
+    type=Path,
+    help="Arquivo SQLite usado como fila local de envio. Se informado, substitui "
+    "os arquivos _PROCESSADO_TEMPOX e _COM_ERRO",
+    default=None,
+)
+apontar_leitura_furadeira_scm_pratika_parser.add_argument(
+    "--arquivo-checkpoint",
+    type=Path,
+    help="Arquivo onde é registrada a posição já lida de cada arquivo .pro. "
+    "Padrão: _CHECKPOINT_TEMPOX.json no diretório informado",
+    default=None,
+)
+apontar_leitura_furadeira_scm_pratika_parser.add_argument(
+    "--arquivo-indice",
+    type=Path,
+    help="Arquivo SQLite com o índice das linhas já processadas. Deve ficar em "
+    "um disco local, pois o SQLite em modo WAL não funciona em pastas de rede. "
+    "Padrão: um arquivo por diretório na pasta de dados local do usuário "
+    "(%%LOCALAPPDATA%%\\TempoX no Windows)",
+    default=None,
+)
 
 # Novo Plano de Corte
 novo_plano_de_corte_parser = subparsers.add_parser(
@@ -162,13 +276,45 @@ novo_plano_de_corte_parser.add_argument(
     "--layouts-file",
     type=open,
     help="Arquivo csv contendo as informações de cada layout",
-    required=True,
+    required=False,
 )
 novo_plano_de_corte_parser.add_argument(
     "--parts-file",
     type=open,
     help="Arquivo csv contendo as informações de peça de cada layout",
-    required=True,
+    required=False,
+)
+novo_plano_de_corte_parser.add_argument(
+    "--otimizacao-file",
+    type=Path,
+    help="Arquivo .R41 da otimização do Ardis. Se informado, os planos são lidos "
+    "diretamente dele, sem os arquivos --layouts-file e --parts-file",
+    required=False,
+)
+novo_plano_de_corte_parser.add_argument(
+    "--id-recurso",
+    type=int,
+    help="Recurso dos planos lidos de --otimizacao-file",
+    default=None,
+)
+novo_plano_de_corte_parser.add_argument(
+    "--formato-codigo-layout",
+    type=str,
+    help="Formato do código de cada layout lido de --otimizacao-file, com os "
+    "campos do layout entre chaves. LayNo é o número do layout",
+    default="{LayRemark1}I{LayRemark4}L{LayNo}-",
+)
+novo_plano_de_corte_parser.add_argument(
+    "--campo-id-ordem",
+    type=str,
+    help="Campo das peças de --otimizacao-file com o id da ordem",
+    default="EXT02",
+)
+novo_plano_de_corte_parser.add_argument(
+    "--campo-id-unico-peca",
+    type=str,
+    help="Campo das peças de --otimizacao-file com o id único da peça",
+    default="EXT21",
 )
 novo_plano_de_corte_parser.add_argument(
     "--sep", type=str, help="Separador de campos dos arquivos csv", default=","
@@ -178,6 +324,52 @@ novo_plano_de_corte_parser.add_argument(
     type=Path,
     help="Diretório onde as figures de cada plano serão buscadas. O nome de cada arquivo deve ser igual ao código do plano, com extensão .png",
 )
+novo_plano_de_corte_parser.add_argument(
+    "--max-bytes-figura",
+    type=int,
+    help="Recomprime e reduz as figuras maiores que este tamanho, em bytes. "
+    "Requer o pacote 'Pillow'",
+    default=None,
+)
+novo_plano_de_corte_parser.add_argument(
+    "--cache-figuras",
+    type=Path,
+    help="Diretório onde as figuras já codificadas são guardadas, evitando "
+    "processar novamente figuras que não mudaram",
+    default=None,
+)
+novo_plano_de_corte_parser.add_argument(
+    "--manifesto",
+    type=Path,
+    help="Arquivo onde é registrado o conteúdo de cada plano enviado. Se "
+    "informado, somente os planos novos ou alterados são enviados",
+    default=None,
+)
+novo_plano_de_corte_parser.add_argument(
+    "--planos-por-envio",
+    type=int,
+    help="Divide o projeto em envios de no máximo esta quantidade de planos",
+    default=None,
+)
+novo_plano_de_corte_parser.add_argument(
+    "--bytes-por-envio",
+    type=int,
+    help="Divide o projeto em envios de aproximadamente este tamanho, em bytes",
+    default=None,
+)
+novo_plano_de_corte_parser.add_argument(
+    "--envios-simultaneos",
+    type=int,
+    help="Quantidade de partes do projeto enviadas ao mesmo tempo",
+    default=4,
+)
+novo_plano_de_corte_parser.add_argument(
+    "--arquivo-progresso",
+    type=Path,
+    help="Arquivo onde as partes já enviadas são registradas. Se o envio for "
+    "interrompido, a próxima execução envia somente as partes pendentes",
+    default=None,
+)
 
 # Nova Ordem
 nova_ordem_parser = subparsers.add_parser(
@@ -205,6 +397,40 @@ nova_ordem_parser.add_argument(
     help="Arquivo csv contendo os ids únicos de cada ordem",
     required=True,
 )
+nova_ordem_parser.add_argument(
+    "--ordenacao-em-disco",
+    action="store_true",
+    help="Une ordens, roteiros e ids únicos ordenando os arquivos em disco, "
+    "com uso de memória limitado. Indicado para arquivos muito grandes",
+    default=False,
+)
+nova_ordem_parser.add_argument(
+    "--linhas-por-bloco",
+    type=int,
+    help="Quantidade de linhas mantidas em memória por bloco ordenado, com "
+    "--ordenacao-em-disco",
+    default=100_000,
+)
+nova_ordem_parser.add_argument(
+    "--ordens-por-envio",
+    type=int,
+    help="Envia as ordens em lotes de no máximo esta quantidade. Um lote "
+    "recusado é dividido até isolar as ordens com erro",
+    default=None,
+)
+nova_ordem_parser.add_argument(
+    "--envios-simultaneos",
+    type=int,
+    help="Quantidade de lotes de ordens enviados ao mesmo tempo",
+    default=4,
+)
+nova_ordem_parser.add_argument(
+    "--arquivo-resultado",
+    type=Path,
+    help="Arquivo json onde são registradas as ordens aceitas e recusadas pela "
+    "API, com --ordens-por-envio",
+    default=None,
+)
 
 # Plano SCM
 apontar_plano_scm_parser = subparsers.add_parser(
@@ -231,8 +457,59 @@ apontar_plano_scm_parser.add_argument(
     required=False,
     default=5
 )
+apontar_plano_scm_parser.add_argument(
+    "--outbox",
+    type=Path,
+    help="Arquivo SQLite usado como fila local de envio. Se informado, substitui "
+    "os arquivos _APONTADO e _COM_ERRO",
+    default=None,
+)
+
+# Opções comuns aos apontamentos que monitoram arquivos da máquina
+for observador_parser in (
+    apontar_plano_de_corte_nanxing_parser,
+    apontar_leitura_furadeira_nanxing_parser,
+    apontar_leitura_furadeira_scm_pratika_parser,
+    apontar_plano_scm_parser,
+):
+    observador_parser.add_argument(
+        "--observador",
+        type=str,
+        help="Como as alterações nos arquivos da máquina são detectadas. 'auto' "
+        "usa o inotify no Linux e 'polling' nos demais sistemas. Em pastas de "
+        "rede use 'polling'. Sem alterações, um novo ciclo é iniciado no "
+        "intervalo padrão do apontamento",
+        choices=["auto", "inotify", "polling"],
+        default="auto",
+    )
+    observador_parser.add_argument(
+        "--debounce",
+        type=float,
+        help="Segundos sem novas gravações antes de ler um arquivo alterado",
+        default=2.0,
+    )
+    observador_parser.add_argument(
+        "--intervalo-polling",
+        type=float,
+        help="Segundos entre as verificações dos arquivos no modo 'polling'. Cada "
+        "verificação percorre as pastas monitoradas; aumente em pastas de rede "
+        "muito grandes",
+        default=2.0,
+    )
+
 
 def parse_args(args=None):
     parsed = parser.parse_args(args)
 
+    if parsed.subcommand == "novo-plano-de-corte":
+        if parsed.otimizacao_file is not None:
+            if parsed.id_recurso is None:
+                novo_plano_de_corte_parser.error(
+                    "--id-recurso é obrigatório com --otimizacao-file"
+                )
+        elif parsed.layouts_file is None or parsed.parts_file is None:
+            novo_plano_de_corte_parser.error(
+                "informe --otimizacao-file ou --layouts-file e --parts-file"
+            )
+
     return parsed
@@ -0,0 +1,162 @@
+import base64
+import hashlib
+import importlib.util
+import io
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+logger = logging.getLogger("src.figuras")
+
+# Número máximo de reduções aplicadas a uma figura acima do tamanho limite
+_MAX_REDUCOES = 5
+
+
+def _pillow_disponivel():
+    if importlib.util.find_spec("PIL") is None:
+        logger.warning(
+            "Redução de figuras solicitada, mas o pacote 'Pillow' não está "
+            "instalado. As figuras serão enviadas sem alteração."
+        )
+        return False
+
+    return True
+
+
+def reduz_png(conteudo: bytes, max_bytes: int) -> bytes:
+    """
+    Recomprime o PNG e, se ainda for maior que `max_bytes`, reduz suas
+    dimensões até caber no limite
+    """
+
+    from PIL import Image
+
+    imagem = Image.open(io.BytesIO(conteudo))
+    reduzido = conteudo
+
+    for _ in range(_MAX_REDUCOES):
+        saida = io.BytesIO()
+        imagem.save(saida, format="PNG", optimize=True)
+        reduzido = saida.getvalue()
+
+        if len(reduzido) <= max_bytes:
+            break
+
+        # O tamanho do PNG é aproximadamente proporcional à área da imagem
+        escala = max((max_bytes / len(reduzido)) ** 0.5, 0.5)
+        imagem = imagem.resize(
+            (max(int(imagem.width * escala), 1), max(int(imagem.height * escala), 1))
+        )
+
+    return reduzido if len(reduzido) < len(conteudo) else conteudo
+
+
+class CacheFiguras:
+    """
+    Guarda em disco as figuras reduzidas e codificadas em base64, identificadas
+    pelo caminho, data de modificação e tamanho do PNG, para que figuras que
+    não mudaram não sejam lidas nem reduzidas novamente
+    """
+
+    def __init__(self, diretorio: Path):
+        self.diretorio = diretorio
+
+        diretorio.mkdir(parents=True, exist_ok=True)
+
+    def _caminho(self, chave: str):
+        return self.diretorio / f"{chave}.b64"
+
+    def busca(self, chave: str) -> Optional[str]:
+        try:
+            return self._caminho(chave).read_text(encoding="ascii")
+        except OSError:
+            return None
+
+    def salva(self, chave: str, figura: str):
+        caminho = self._caminho(chave)
+        temporario = caminho.with_name(caminho.name + f".{os.getpid()}.tmp")
+
+        try:
+            temporario.write_text(figura, encoding="ascii")
+            os.replace(temporario, caminho)
+        except OSError as exc:
+            logger.warning("Não foi possível salvar a figura em cache: %s", exc)
+
+
+class CarregadorFiguras:
+    """
+    Lê e codifica em base64 as figuras dos layouts em paralelo
+    """
+
+    def __init__(
+        self,
+        diretorio: Optional[Path],
+        max_bytes: Optional[int] = None,
+        cache: Optional[CacheFiguras] = None,
+        concorrencia: int = 8,
+    ):
+        # Remove ' e/ou " do diretório informado
+        self.diretorio = str(diretorio).strip('"').strip("'")
+        self.max_bytes = max_bytes if max_bytes and _pillow_disponivel() else None
+        self.cache = cache
+        self.concorrencia = concorrencia
+
+    def carrega(self, codigo_layout: str) -> Optional[str]:
+        figure_path = os.path.join(self.diretorio, f"{codigo_layout}.png")
+
+        try:
+            stat = os.stat(figure_path)
+        except OSError:
+            logger.warning('O arquivo "%s" não foi encontrado', figure_path)
+
+            return None
+
+        # Só a redução é cara o bastante para compensar o cache, codificar em
+        # base64 é mais rápido que ler a figura do cache
+        if (
+            self.cache is None
+            or self.max_bytes is None
+            or stat.st_size <= self.max_bytes
+        ):
+            return self._codifica(self._le(figure_path))
+
+        chave = hashlib.sha256(
+            "|".join(
+                [
+                    os.path.abspath(figure_path),
+                    str(stat.st_mtime_ns),
+                    str(stat.st_size),
+                    str(self.max_bytes),
+                ]
+            ).encode("utf-8", "surrogatepass")
+        ).hexdigest()
+
+        figura = self.cache.busca(chave)
+
+        if figura is None:
+            figura = self._codifica(self._le(figure_path))
+            self.cache.salva(chave, figura)
+
+        return figura
+
+    @staticmethod
+    def _le(figure_path: str):
+        with open(figure_path, "rb") as figure_img:
+            return figure_img.read()
+
+    def _codifica(self, conteudo: bytes):
+        if self.max_bytes is not None and len(conteudo) > self.max_bytes:
+            try:
+                conteudo = reduz_png(conteudo, self.max_bytes)
+            except Exception as exc:
+                logger.warning("Não foi possível reduzir a figura: %s", exc)
+
+        return base64.b64encode(conteudo).decode("utf-8")
+
+    def carrega_todas(self, codigos_layout: Iterable[str]) -> Dict[str, Optional[str]]:
+        codigos = list(dict.fromkeys(codigos_layout))
+
+        with ThreadPoolExecutor(max_workers=self.concorrencia) as executor:
+            return dict(zip(codigos, executor.map(self.carrega, codigos)))
@@ -0,0 +1,258 @@
+import hashlib
+import logging
+import math
+import os
+import sqlite3
+import sys
+from collections import Counter
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Sequence, Set, Tuple
+
+logger = logging.getLogger("src.indice_linhas")
+
+NOME_INDICE = "_INDICE_TEMPOX.db"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS linhas (
+    digest INTEGER PRIMARY KEY
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS arquivos_importados (
+    nome TEXT PRIMARY KEY
+);
+"""
+
+_SEPARADOR = "\x1f"
+
+
+def caminho_indice_padrao(diretorio: Path) -> Path:
+    """
+    Caminho padrão do índice de um diretório monitorado, na pasta de dados
+    local do usuário. O diretório da máquina costuma ser uma pasta de rede,
+    onde o SQLite em modo WAL não funciona.
+    """
+
+    if sys.platform == "win32":
+        base = os.environ.get("LOCALAPPDATA") or Path.home() / "AppData" / "Local"
+    else:
+        base = os.environ.get("XDG_DATA_HOME") or Path.home() / ".local" / "share"
+
+    # Um índice por diretório monitorado
+    chave = hashlib.blake2b(
+        str(Path(diretorio).resolve()).encode("utf-8", "surrogatepass"),
+        digest_size=8,
+    ).hexdigest()
+
+    return Path(base) / "TempoX" / f"{Path(NOME_INDICE).stem}_{chave}.db"
+
+
+def chave_arquivo(diretorio: Path, arquivo: Path) -> str:
+    """
+    Nome de um arquivo no índice: o caminho relativo ao diretório monitorado,
+    para que arquivos de mesmo nome em pastas diferentes não se confundam
+    """
+
+    try:
+        return Path(arquivo).relative_to(diretorio).as_posix()
+    except ValueError:
+        return Path(arquivo).as_posix()
+
+
+def digest_linha(arquivo: str, campos: Sequence[str]) -> int:
+    """
+    Digest de 64 bits (com sinal, como o INTEGER do SQLite) da linha de um
+    arquivo de processados
+    """
+
+    texto = _SEPARADOR.join([arquivo, *campos]).encode("utf-8", "surrogatepass")
+
+    return int.from_bytes(
+        hashlib.blake2b(texto, digest_size=8).digest(), "little", signed=True
+    )
+
+
+class FiltroBloom:
+    """
+    Conjunto probabilístico de digests: `in` nunca falha para um digest
+    adicionado e raramente (`taxa_falsos_positivos`) acerta um que não foi.
+    """
+
+    def __init__(self, capacidade: int, taxa_falsos_positivos: float = 0.001):
+        self.capacidade = max(capacidade, 1024)
+        self.quantidade = 0
+
+        bits = -self.capacidade * math.log(taxa_falsos_positivos) / math.log(2) ** 2
+        self._bits = max(int(bits), 8)
+        self._funcoes = max(round(self._bits / self.capacidade * math.log(2)), 1)
+        self._filtro = bytearray((self._bits + 7) // 8)
+
+    def _posicoes(self, digest: int):
+        # Double hashing com as duas metades do digest
+        h1 = digest & 0xFFFFFFFF
+        h2 = (digest >> 32) & 0xFFFFFFFF | 1
+
+        return ((h1 + i * h2) % self._bits for i in range(self._funcoes))
+
+    def adiciona(self, digest: int):
+        for posicao in self._posicoes(digest):
+            self._filtro[posicao >> 3] |= 1 << (posicao & 7)
+
+        self.quantidade += 1
+
+    def __contains__(self, digest: int):
+        return all(
+            self._filtro[posicao >> 3] & (1 << (posicao & 7))
+            for posicao in self._posicoes(digest)
+        )
+
+
+class IndiceLinhas:
+    """
+    Índice persistente, em SQLite, das linhas já processadas de cada arquivo
+    da máquina. Guarda somente um digest de 64 bits por linha, e um filtro de
+    Bloom em memória responde sem consultar o banco para as linhas novas, que
+    são a maioria.
+
+    Os arquivos _PROCESSADO_TEMPOX continuam sendo gravados, mas só são lidos
+    uma vez, para importar o histórico anterior ao índice.
+    """
+
+    def __init__(self, caminho: Path):
+        self.caminho = caminho
+
+        caminho.parent.mkdir(parents=True, exist_ok=True)
+
+        self._conn = sqlite3.connect(str(caminho), isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+        self._importados = {
+            nome
+            for (nome,) in self._conn.execute("SELECT nome FROM arquivos_importados")
+        }
+        self._carrega_filtro()
+
+    def _carrega_filtro(self):
+        (quantidade,) = self._conn.execute("SELECT COUNT(*) FROM linhas").fetchone()
+
+        self._filtro = FiltroBloom(quantidade * 2)
+
+        for (digest,) in self._conn.execute("SELECT digest FROM linhas"):
+            self._filtro.adiciona(digest)
+
+        logger.debug("Índice de linhas carregado com %s linhas", quantidade)
+
+    def contem(self, arquivo: str, campos: Sequence[str]) -> bool:
+        digest = digest_linha(arquivo, campos)
+
+        if digest not in self._filtro:
+            return False
+
+        cursor = self._conn.execute("SELECT 1 FROM linhas WHERE digest = ?", (digest,))
+
+        return cursor.fetchone() is not None
+
+    def adiciona(self, arquivo: str, linhas: Iterable[Sequence[str]]):
+        digests = [digest_linha(arquivo, campos) for campos in linhas]
+
+        self._conn.execute("BEGIN")
+        self._conn.executemany(
+            "INSERT OR IGNORE INTO linhas (digest) VALUES (?)",
+            ((digest,) for digest in digests),
+        )
+        self._conn.execute("COMMIT")
+
+        for digest in digests:
+            self._filtro.adiciona(digest)
+
+        # Mantém a taxa de falsos positivos quando o índice cresce
+        if self._filtro.quantidade > self._filtro.capacidade:
+            self._carrega_filtro()
+
+    def importa(self, arquivo: str, ler_linhas: Callable[[], Iterable[Sequence[str]]]):
+        """
+        Adiciona ao índice as linhas de um arquivo de processados gravado antes
+        do índice existir. Cada arquivo é lido uma única vez.
+        """
+
+        if arquivo in self._importados:
+            return
+
+        self.adiciona(arquivo, ler_linhas())
+
+        self._conn.execute(
+            "INSERT OR IGNORE INTO arquivos_importados (nome) VALUES (?)", (arquivo,)
+        )
+        self._importados.add(arquivo)
+
+    def close(self):
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class LinhasPorArquivo:
+    """
+    Conjunto das linhas de vários arquivos (como os _COM_ERRO de uma pasta),
+    mantido em memória entre os ciclos. Cada arquivo guarda os digests das suas
+    linhas junto com a data de modificação e o tamanho, e só é lido novamente
+    quando um deles muda.
+    """
+
+    def __init__(self, ler_linhas: Callable[[Path], Iterable[Sequence[str]]]):
+        self.ler_linhas = ler_linhas
+        self._arquivos: Dict[Path, Tuple[Tuple[int, int], Set[int]]] = {}
+        # Quantidade de arquivos em que cada digest aparece
+        self._contagem: Counter = Counter()
+
+    def _remove(self, arquivo: Path):
+        _, digests = self._arquivos.pop(arquivo)
+
+        self._contagem.subtract(digests)
+
+        for digest in digests:
+            if self._contagem[digest] <= 0:
+                del self._contagem[digest]
+
+    def atualiza(self, arquivos: Iterable[Path]):
+        """
+        Relê os arquivos novos ou alterados e descarta os que não existem mais
+        """
+
+        encontrados = set()
+
+        for arquivo in arquivos:
+            try:
+                stat = os.stat(arquivo)
+            except OSError:
+                continue
+
+            encontrados.add(arquivo)
+            assinatura = (stat.st_mtime_ns, stat.st_size)
+            anterior = self._arquivos.get(arquivo)
+
+            if anterior is not None and anterior[0] == assinatura:
+                continue
+
+            if anterior is not None:
+                self._remove(arquivo)
+
+            digests = {digest_linha("", campos) for campos in self.ler_linhas(arquivo)}
+
+            self._arquivos[arquivo] = (assinatura, digests)
+            self._contagem.update(digests)
+
+            logger.debug("%s lido, %s linhas", arquivo.name, len(digests))
+
+        for arquivo in set(self._arquivos) - encontrados:
+            self._remove(arquivo)
+
+    def __contains__(self, campos: Sequence[str]):
+        return digest_linha("", campos) in self._contagem
+
+    def __len__(self):
+        return len(self._contagem)
@@ -0,0 +1,153 @@
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger("src.leitor_incremental")
+
+# Bytes do início do arquivo usados para reconhecer que é o mesmo arquivo
+_TAMANHO_ASSINATURA = 64
+
+
+class CheckpointLeitura:
+    """
+    Registro em disco da posição já lida de cada arquivo da máquina, com a
+    identificação do arquivo (inode e início do conteúdo) para detectar quando
+    ele foi substituído ou truncado.
+    """
+
+    def __init__(self, caminho: Path):
+        self.caminho = caminho
+        self.posicoes: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+        if caminho.exists():
+            try:
+                with open(caminho, "r", encoding="utf-8") as f:
+                    self.posicoes = json.load(f)
+            except (OSError, ValueError) as exc:
+                logger.warning("Checkpoint inválido, lendo arquivos do início: %s", exc)
+
+    def obter(self, arquivo: Path) -> Optional[Dict[str, Any]]:
+        return self.posicoes.get(str(arquivo))
+
+    def salvar(self, arquivo: Path, posicao: Dict[str, Any]):
+        with self._lock:
+            self.posicoes[str(arquivo)] = posicao
+
+            temporario = self.caminho.with_name(self.caminho.name + ".tmp")
+
+            with open(temporario, "w", encoding="utf-8") as f:
+                json.dump(self.posicoes, f, indent=2, sort_keys=True)
+
+            os.replace(temporario, self.caminho)
+
+
+class LeituraIncremental:
+    """
+    Linhas completas acrescentadas ao arquivo desde a última leitura confirmada
+    """
+
+    def __init__(
+        self,
+        arquivo: Path,
+        cabecalho: Optional[str],
+        linhas: List[str],
+        posicao: Dict[str, Any],
+    ):
+        self.arquivo = arquivo
+        self.cabecalho = cabecalho
+        self.linhas = linhas
+        self.posicao = posicao
+
+
+class LeitorIncremental:
+    """
+    Lê somente o que foi acrescentado aos arquivos que a máquina mantém abertos,
+    sem apagá-los nem reprocessar o conteúdo antigo. A leitura só avança no
+    checkpoint quando `confirmar` é chamado, depois que as linhas foram tratadas.
+
+    Com `remover_nulos`, os bytes nulos são descartados antes de decodificar,
+    o que trata arquivos em UTF-16 com texto ASCII ou preenchidos com `\\x00`.
+    """
+
+    def __init__(
+        self,
+        checkpoint: CheckpointLeitura,
+        encoding: str = "utf-8",
+        erros: str = "strict",
+        remover_nulos: bool = False,
+        cabecalho: bool = True,
+    ):
+        self.checkpoint = checkpoint
+        self.encoding = encoding
+        self.erros = erros
+        self.remover_nulos = remover_nulos
+        self.cabecalho = cabecalho
+
+    def _decodifica(self, dados: bytes) -> str:
+        if self.remover_nulos:
+            dados = dados.replace(b"\x00", b"")
+
+        return dados.decode(self.encoding, errors=self.erros)
+
+    def _primeira_linha(self, arquivo) -> Optional[str]:
+        arquivo.seek(0)
+        linhas = self._decodifica(arquivo.readline(64 * 1024)).splitlines()
+
+        return linhas[0] if linhas else None
+
+    def ler(self, arquivo: Path) -> LeituraIncremental:
+        with open(arquivo, "rb") as f:
+            stat = os.fstat(f.fileno())
+            inicio = f.read(_TAMANHO_ASSINATURA)
+            anterior = self.checkpoint.obter(arquivo)
+            posicao = 0
+
+            # Continua de onde parou somente se for o mesmo arquivo e ele não
+            # tiver diminuído
+            if (
+                anterior is not None
+                and anterior.get("inode") == stat.st_ino
+                and anterior.get("posicao", 0) <= stat.st_size
+                and inicio.startswith(bytes.fromhex(anterior.get("inicio", "")))
+            ):
+                posicao = anterior["posicao"]
+            elif anterior is not None:
+                logger.info("Arquivo %s foi substituído, lendo do início", arquivo)
+
+            f.seek(posicao)
+            dados = f.read(stat.st_size - posicao)
+
+            # A última linha pode estar sendo gravada, só as completas são lidas
+            fim = dados.rfind(b"\n") + 1
+            texto = self._decodifica(dados[:fim])
+
+            cabecalho = None
+            linhas = texto.splitlines()
+
+            if self.cabecalho:
+                if posicao == 0:
+                    cabecalho = linhas.pop(0) if linhas else None
+                else:
+                    cabecalho = self._primeira_linha(f)
+
+        return LeituraIncremental(
+            arquivo,
+            cabecalho,
+            linhas,
+            {
+                "posicao": posicao + fim,
+                "inode": stat.st_ino,
+                "inicio": inicio[: posicao + fim].hex(),
+            },
+        )
+
+    def confirmar(self, leitura: LeituraIncremental):
+        """
+        Registra que as linhas da leitura foram tratadas
+        """
+
+        self.checkpoint.salvar(leitura.arquivo, leitura.posicao)
@@ -0,0 +1,321 @@
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import struct
+import sys
+import time
+from abc import ABC, abstractmethod
+from fnmatch import fnmatch
+from pathlib import Path
+from typing import Dict, Sequence, Set, Tuple
+
+logger = logging.getLogger("src.observador")
+
+MODOS_OBSERVADOR = ("auto", "inotify", "polling")
+
+# Eventos do inotify (linux/inotify.h)
+_IN_MODIFY = 0x00000002
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_ISDIR = 0x40000000
+_IN_NONBLOCK = os.O_NONBLOCK
+_IN_CLOEXEC = 0o2000000
+
+_MASCARA = _IN_MODIFY | _IN_CLOSE_WRITE | _IN_MOVED_TO | _IN_CREATE
+_EVENTO = struct.Struct("iIII")
+
+
+class Observador(ABC):
+    """
+    Aguarda alterações nos arquivos monitorados pelos apontamentos, para que um
+    novo ciclo comece assim que a máquina gravar um arquivo, em vez de esperar
+    um intervalo fixo.
+
+    Só são considerados os arquivos cujo nome corresponde a um dos `padroes` e
+    não contém nenhum dos textos de `ignorar` (como os arquivos _APONTADO e
+    _COM_ERRO gerados pelo próprio integrador). Um arquivo alterado só é
+    informado depois de ficar `debounce` segundos sem novas alterações, para
+    não ler um arquivo que ainda está sendo gravado.
+    """
+
+    def __init__(
+        self,
+        diretorios: Sequence[Path],
+        padroes: Sequence[str],
+        ignorar: Sequence[str] = (),
+        recursivo: bool = False,
+        debounce: float = 2.0,
+    ):
+        self.diretorios = [Path(diretorio) for diretorio in diretorios]
+        self.padroes = padroes
+        self.ignorar = ignorar
+        self.recursivo = recursivo
+        self.debounce = debounce
+
+    def corresponde(self, caminho: Path):
+        return any(fnmatch(caminho.name, padrao) for padrao in self.padroes) and (
+            not any(texto in caminho.stem for texto in self.ignorar)
+        )
+
+    @abstractmethod
+    def _alteracoes(self, timeout: float) -> Set[Path]:
+        """
+        Espera até `timeout` segundos e retorna os arquivos alterados
+        """
+
+    def aguardar(self, timeout: float) -> Set[Path]:
+        """
+        Bloqueia até algum arquivo monitorado ser alterado ou até `timeout`
+        segundos se passarem. Retorna os arquivos alterados, ou um conjunto
+        vazio se o tempo acabar sem alterações.
+        """
+
+        fim = time.monotonic() + timeout
+        alterados: Dict[Path, float] = {}
+
+        while True:
+            agora = time.monotonic()
+
+            if alterados:
+                silencio = agora - max(alterados.values())
+
+                # Um arquivo gravado continuamente não atrasa o ciclo além do
+                # tempo máximo de espera
+                if silencio >= self.debounce or agora >= fim + self.debounce:
+                    return set(alterados)
+
+                espera = self.debounce - silencio
+            elif agora >= fim:
+                return set()
+            else:
+                espera = fim - agora
+
+            for caminho in self._alteracoes(espera):
+                alterados[caminho] = time.monotonic()
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class ObservadorPolling(Observador):
+    """
+    Compara periodicamente o tamanho e a data de modificação dos arquivos.
+    Funciona em qualquer sistema, inclusive em pastas de rede, onde o inotify
+    não recebe as alterações feitas por outras máquinas. Os diretórios são
+    percorridos a cada `intervalo` segundos, da ordem do `debounce`, para que
+    uma alteração acorde o ciclo logo; o tempo máximo de espera do ciclo
+    continua sendo o `timeout` de `aguardar`.
+    """
+
+    def __init__(self, *args, intervalo: float = 2.0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.intervalo = intervalo
+        self._estado = self._snapshot()
+
+    def _snapshot(self) -> Dict[Path, Tuple[int, int]]:
+        estado: Dict[Path, Tuple[int, int]] = {}
+
+        for diretorio in self.diretorios:
+            for raiz, subdiretorios, _ in os.walk(diretorio):
+                if not self.recursivo:
+                    subdiretorios.clear()
+
+                try:
+                    entradas = list(os.scandir(raiz))
+                except OSError:
+                    continue
+
+                for entrada in entradas:
+                    caminho = Path(entrada.path)
+
+                    if not self.corresponde(caminho):
+                        continue
+
+                    try:
+                        stat = entrada.stat()
+                    except OSError:
+                        continue
+
+                    if entrada.is_file():
+                        estado[caminho] = (stat.st_mtime_ns, stat.st_size)
+
+        return estado
+
+    def _alteracoes(self, timeout: float) -> Set[Path]:
+        time.sleep(max(min(self.intervalo, timeout), 0))
+
+        anterior, self._estado = self._estado, self._snapshot()
+
+        return {
+            caminho
+            for caminho, assinatura in self._estado.items()
+            if anterior.get(caminho) != assinatura
+        }
+
+
+def _libc():
+    if not sys.platform.startswith("linux"):
+        return None
+
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+    except OSError:
+        return None
+
+    return libc if hasattr(libc, "inotify_init1") else None
+
+
+def inotify_disponivel():
+    return _libc() is not None
+
+
+class ObservadorInotify(Observador):
+    """
+    Recebe as alterações do kernel pelo inotify, sem percorrer os diretórios.
+    Disponível somente no Linux.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        self._libc = _libc()
+
+        if self._libc is None:
+            raise OSError("inotify não está disponível neste sistema")
+
+        self._fd = self._libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "Erro ao iniciar o inotify")
+
+        self._observados: Dict[int, Path] = {}
+        self._adiciona_diretorios()
+
+    def _adiciona(self, diretorio: Path):
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(diretorio), _MASCARA)
+
+        if wd < 0:
+            logger.debug("Não foi possível observar %s", diretorio)
+            return
+
+        self._observados[wd] = diretorio
+
+        if not self.recursivo:
+            return
+
+        try:
+            subdiretorios = [
+                caminho for caminho in diretorio.iterdir() if caminho.is_dir()
+            ]
+        except OSError:
+            # Removido enquanto era percorrido
+            logger.debug("Não foi possível listar %s", diretorio)
+            return
+
+        for subdiretorio in subdiretorios:
+            self._adiciona(subdiretorio)
+
+    def _adiciona_diretorios(self):
+        # Diretórios que ainda não existem são adicionados quando forem criados
+        observados = set(self._observados.values())
+
+        for diretorio in self.diretorios:
+            if diretorio not in observados and diretorio.is_dir():
+                self._adiciona(diretorio)
+
+    def _alteracoes(self, timeout: float) -> Set[Path]:
+        self._adiciona_diretorios()
+
+        prontos, _, _ = select.select([self._fd], [], [], max(timeout, 0))
+
+        if not prontos:
+            return set()
+
+        try:
+            dados = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return set()
+
+        alterados: Set[Path] = set()
+        posicao = 0
+
+        while posicao < len(dados):
+            wd, mascara, _, tamanho = _EVENTO.unpack_from(dados, posicao)
+            posicao += _EVENTO.size
+            nome = dados[posicao : posicao + tamanho].rstrip(b"\0")
+            posicao += tamanho
+
+            if mascara & _IN_Q_OVERFLOW:
+                logger.warning("Fila do inotify cheia, alguns eventos foram perdidos")
+                continue
+
+            diretorio = self._observados.get(wd)
+
+            if mascara & _IN_IGNORED:
+                self._observados.pop(wd, None)
+                continue
+
+            if diretorio is None or not nome:
+                continue
+
+            caminho = diretorio / os.fsdecode(nome)
+
+            if mascara & _IN_ISDIR:
+                if self.recursivo and mascara & (_IN_CREATE | _IN_MOVED_TO):
+                    self._adiciona(caminho)
+                continue
+
+            if self.corresponde(caminho):
+                alterados.add(caminho)
+
+        return alterados
+
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+def cria_observador(
+    modo: str,
+    diretorios: Sequence[Path],
+    padroes: Sequence[str],
+    ignorar: Sequence[str] = (),
+    recursivo: bool = False,
+    debounce: float = 2.0,
+    intervalo_polling: float = 2.0,
+) -> Observador:
+    """
+    Cria o observador do `modo` informado. No modo `auto` usa o inotify quando
+    disponível e, caso contrário, a comparação periódica dos arquivos a cada
+    `intervalo_polling` segundos.
+    """
+
+    if modo in ("auto", "inotify"):
+        if inotify_disponivel():
+            return ObservadorInotify(
+                diretorios, padroes, ignorar, recursivo=recursivo, debounce=debounce
+            )
+
+        if modo == "inotify":
+            logger.warning("inotify não disponível, observando arquivos por polling")
+
+    return ObservadorPolling(
+        diretorios,
+        padroes,
+        ignorar,
+        recursivo=recursivo,
+        debounce=debounce,
+        intervalo=intervalo_polling,
+    )
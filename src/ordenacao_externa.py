@@ -0,0 +1,116 @@
+import heapq
+import json
+import logging
+import tempfile
+from itertools import groupby
+from operator import itemgetter
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger("src.ordenacao_externa")
+
+# Quantidade de linhas mantidas em memória antes de gravar um bloco ordenado
+LINHAS_POR_BLOCO = 100_000
+
+Item = Tuple[int, str]
+
+
+def _grava_bloco(caminho: Path, itens: List[Tuple[int, int, str]]):
+    itens.sort(key=itemgetter(0, 1))
+
+    with open(caminho, "w", encoding="utf-8") as arquivo:
+        for chave, _, linha in itens:
+            arquivo.write(f"{chave}\t{linha}\n")
+
+
+def _le_bloco(caminho: Path) -> Iterator[Item]:
+    with open(caminho, "r", encoding="utf-8") as arquivo:
+        for linha in arquivo:
+            chave, _, conteudo = linha.rstrip("\n").partition("\t")
+
+            yield int(chave), conteudo
+
+
+def ordena_em_disco(
+    itens: Iterable[Item],
+    diretorio: Path,
+    prefixo: str,
+    linhas_por_bloco: int = LINHAS_POR_BLOCO,
+) -> Iterator[Item]:
+    """
+    Ordena pares `(chave, linha)` pela chave mantendo no máximo
+    `linhas_por_bloco` itens em memória: cada bloco é ordenado e gravado em
+    `diretorio`, e os blocos são intercalados na leitura.
+
+    A ordenação é estável, itens com a mesma chave mantêm a ordem original.
+    """
+
+    blocos: List[Path] = []
+    bloco: List[Tuple[int, int, str]] = []
+
+    for sequencia, (chave, linha) in enumerate(itens):
+        bloco.append((chave, sequencia, linha))
+
+        if len(bloco) >= linhas_por_bloco:
+            blocos.append(diretorio / f"{prefixo}-{len(blocos)}.txt")
+            _grava_bloco(blocos[-1], bloco)
+            bloco = []
+
+    if bloco:
+        blocos.append(diretorio / f"{prefixo}-{len(blocos)}.txt")
+        _grava_bloco(blocos[-1], bloco)
+
+    logger.debug("%s ordenado em %s blocos", prefixo, len(blocos))
+
+    # heapq.merge é estável entre os blocos, que estão na ordem de gravação
+    return heapq.merge(*(_le_bloco(caminho) for caminho in blocos), key=itemgetter(0))
+
+
+def agrupa(itens: Iterator[Item]) -> Iterator[Tuple[int, List[str]]]:
+    """
+    Agrupa as linhas de uma sequência ordenada pela chave
+    """
+
+    for chave, grupo in groupby(itens, key=itemgetter(0)):
+        yield chave, [linha for _, linha in grupo]
+
+
+class ArquivoJsonLinhas:
+    """
+    Sequência de objetos gravada em um arquivo temporário, um JSON por linha.
+    Pode ser percorrida mais de uma vez sem manter os objetos em memória.
+    """
+
+    def __init__(self, diretorio: Optional[Path] = None):
+        self._temporario = tempfile.TemporaryDirectory(
+            prefix="tx-mes-cli-", dir=diretorio
+        )
+        self.diretorio = Path(self._temporario.name)
+        self.caminho = self.diretorio / "itens.jsonl"
+        self.quantidade = 0
+        self._arquivo = open(self.caminho, "w", encoding="utf-8")
+
+    def adiciona(self, linha: str):
+        self._arquivo.write(linha + "\n")
+        self.quantidade += 1
+
+    def finaliza(self):
+        self._arquivo.close()
+
+    def __len__(self):
+        return self.quantidade
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        with open(self.caminho, "r", encoding="utf-8") as arquivo:
+            for linha in arquivo:
+                yield json.loads(linha)
+
+    def close(self):
+        self._arquivo.close()
+        self._temporario.cleanup()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,411 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+from pydantic import BaseModel
+
+from src.tx.exceptions import CircuitOpenError
+from src.tx.modules.leituras.types import LeiturasPost
+from src.tx.tx import Tx
+
+logger = logging.getLogger("src.outbox")
+
+PENDENTE = "pendente"
+ENVIADO = "enviado"
+ERRO = "erro"
+
+TIPO_LEITURA = "leitura"
+TIPO_APONTAMENTO = "apontamento"
+
+# Resultado do envio de um item: `None` em caso de sucesso, a mensagem de erro,
+# ou `CircuitOpenError` quando o item não chegou a ser enviado
+ResultadoEnvio = Union[None, str, CircuitOpenError]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY,
+    tipo TEXT NOT NULL,
+    chave TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    estado TEXT NOT NULL DEFAULT 'pendente',
+    tentativas INTEGER NOT NULL DEFAULT 0,
+    ultimo_erro TEXT,
+    criado_em REAL NOT NULL,
+    atualizado_em REAL NOT NULL,
+    proxima_tentativa REAL,
+    UNIQUE (tipo, chave)
+);
+CREATE INDEX IF NOT EXISTS idx_outbox_estado ON outbox (tipo, estado, criado_em);
+CREATE INDEX IF NOT EXISTS idx_outbox_tentativas ON outbox (estado, tentativas);
+CREATE INDEX IF NOT EXISTS idx_outbox_ultimo_erro ON outbox (ultimo_erro);
+"""
+
+
+class ItemOutbox(BaseModel):
+    id: int
+    tipo: str
+    chave: str
+    payload: Dict[str, Any]
+    estado: str
+    tentativas: int
+    ultimo_erro: Optional[str]
+
+
+class Outbox:
+    """
+    Fila local, em um único arquivo SQLite (modo WAL), das leituras e
+    apontamentos que precisam ser enviados ao MES.
+
+    Cada item possui uma chave natural (por exemplo a linha do arquivo da
+    máquina), de modo que enfileirar o mesmo item novamente não tem efeito.
+
+    Um item com erro só é tentado novamente após `espera_erro` segundos,
+    tempo que dobra a cada nova falha até `espera_erro_maxima`.
+    """
+
+    def __init__(
+        self,
+        caminho: Path,
+        espera_erro: float = 60.0,
+        espera_erro_maxima: float = 3600.0,
+    ):
+        self.caminho = caminho
+        self.espera_erro = espera_erro
+        self.espera_erro_maxima = espera_erro_maxima
+
+        caminho.parent.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            str(caminho), check_same_thread=False, isolation_level=None
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._migra()
+
+    def _migra(self):
+        colunas = {
+            linha[1] for linha in self._conn.execute("PRAGMA table_info(outbox)")
+        }
+
+        # Filas criadas antes do intervalo entre as tentativas
+        if "proxima_tentativa" not in colunas:
+            self._conn.execute("ALTER TABLE outbox ADD COLUMN proxima_tentativa REAL")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def enfileirar(self, tipo: str, chave: str, payload: Dict[str, Any]) -> bool:
+        """
+        Adiciona um item à fila. Retorna `False` se a chave já existia
+        """
+
+        return self.enfileirar_varios(tipo, [(chave, payload)]) == 1
+
+    def enfileirar_varios(
+        self, tipo: str, itens: Iterable[Tuple[str, Dict[str, Any]]]
+    ) -> int:
+        agora = time.time()
+
+        with self._lock:
+            antes = self._conn.total_changes
+            self._conn.execute("BEGIN")
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO outbox "
+                "(tipo, chave, payload, criado_em, atualizado_em) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (
+                    (tipo, chave, json.dumps(payload), agora, agora)
+                    for chave, payload in itens
+                ),
+            )
+            self._conn.execute("COMMIT")
+
+            return self._conn.total_changes - antes
+
+    def contem(self, tipo: str, chave: str) -> bool:
+        with self._lock:
+            cursor = self._conn.execute(
+                "SELECT 1 FROM outbox WHERE tipo = ? AND chave = ?", (tipo, chave)
+            )
+            return cursor.fetchone() is not None
+
+    def pendentes(
+        self,
+        tipo: str,
+        limite: int = 500,
+        erros_desde: Optional[datetime] = None,
+        apos_id: int = 0,
+    ) -> List[ItemOutbox]:
+        """
+        Itens ainda não enviados, do mais antigo para o mais recente. Itens que
+        falharam só são incluídos se tiverem sido enfileirados após `erros_desde`
+        e o intervalo até a próxima tentativa já tiver passado
+        """
+
+        # Sem `erros_desde`, itens com erro não são reenviados
+        desde = erros_desde.timestamp() if erros_desde else float("inf")
+
+        with self._lock:
+            cursor = self._conn.execute(
+                "SELECT id, tipo, chave, payload, estado, tentativas, ultimo_erro "
+                "FROM outbox "
+                "WHERE tipo = ? AND id > ? "
+                "AND (estado = ? OR (estado = ? AND criado_em >= ? "
+                "AND COALESCE(proxima_tentativa, 0) <= ?)) "
+                "ORDER BY id LIMIT ?",
+                (tipo, apos_id, PENDENTE, ERRO, desde, time.time(), limite),
+            )
+            linhas = cursor.fetchall()
+
+        return [
+            ItemOutbox(
+                id=id,
+                tipo=tipo,
+                chave=chave,
+                payload=json.loads(payload),
+                estado=estado,
+                tentativas=tentativas,
+                ultimo_erro=ultimo_erro,
+            )
+            for id, tipo, chave, payload, estado, tentativas, ultimo_erro in linhas
+        ]
+
+    def registrar_resultados(self, resultados: Iterable[Tuple[int, Optional[str]]]):
+        """
+        Atualiza o estado dos itens a partir de pares `(id, erro)`. Itens sem
+        erro são marcados como enviados
+        """
+
+        agora = time.time()
+
+        with self._lock:
+            self._conn.execute("BEGIN")
+            # A espera dobra a cada tentativa (`tentativas` ainda é o valor
+            # anterior à atualização)
+            self._conn.executemany(
+                "UPDATE outbox SET estado = ?, tentativas = tentativas + 1, "
+                "ultimo_erro = ?, atualizado_em = ?, "
+                "proxima_tentativa = CASE WHEN ? IS NULL THEN NULL "
+                "ELSE ? + MIN(?, ? * (1 << MIN(tentativas, 20))) END "
+                "WHERE id = ?",
+                (
+                    (
+                        ENVIADO if erro is None else ERRO,
+                        erro,
+                        agora,
+                        erro,
+                        agora,
+                        self.espera_erro_maxima,
+                        self.espera_erro,
+                        id,
+                    )
+                    for id, erro in resultados
+                ),
+            )
+            self._conn.execute("COMMIT")
+
+    def atualizar_payload(self, id: int, payload: Dict[str, Any]):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE outbox SET payload = ?, atualizado_em = ? WHERE id = ?",
+                (json.dumps(payload), time.time(), id),
+            )
+
+    def contar(self, tipo: str, estado: str) -> int:
+        with self._lock:
+            cursor = self._conn.execute(
+                "SELECT COUNT(*) FROM outbox WHERE tipo = ? AND estado = ?",
+                (tipo, estado),
+            )
+            return cursor.fetchone()[0]
+
+    def drenar(
+        self,
+        tipo: str,
+        enviar: Callable[[List[ItemOutbox]], List[ResultadoEnvio]],
+        tamanho_lote: int = 200,
+        erros_desde: Optional[datetime] = None,
+    ):
+        """
+        Envia os itens pendentes em lotes de `tamanho_lote`. `enviar` recebe o
+        lote e retorna, para cada item, `None` em caso de sucesso, a mensagem
+        de erro, ou o `CircuitOpenError` que impediu o envio. Cada item é
+        tentado no máximo uma vez por chamada.
+
+        Os itens não enviados continuam pendentes, sem contar como tentativa, e
+        o `CircuitOpenError` é levantado depois de registrados os resultados
+        dos demais itens do lote.
+
+        Retorna a quantidade de itens enviados e com erro.
+        """
+
+        enviados = 0
+        com_erro = 0
+        ultimo_id = 0
+
+        while True:
+            lote = self.pendentes(
+                tipo,
+                limite=tamanho_lote,
+                erros_desde=erros_desde,
+                apos_id=ultimo_id,
+            )
+
+            if not lote:
+                break
+
+            resultados = enviar(lote)
+
+            interrompido = next(
+                (erro for erro in resultados if isinstance(erro, CircuitOpenError)),
+                None,
+            )
+            erros = [
+                (item.id, erro)
+                for item, erro in zip(lote, resultados)
+                if not isinstance(erro, CircuitOpenError)
+            ]
+
+            self.registrar_resultados(erros)
+
+            enviados += sum(1 for _, erro in erros if erro is None)
+            com_erro += sum(1 for _, erro in erros if erro is not None)
+
+            if interrompido is not None:
+                logger.warning(
+                    "Fila local (%s): envio interrompido, %s enviados, %s com erro",
+                    tipo,
+                    enviados,
+                    com_erro,
+                )
+                raise interrompido
+
+            ultimo_id = lote[-1].id
+
+        if enviados or com_erro:
+            logger.info(
+                "Fila local (%s): %s enviados, %s com erro", tipo, enviados, com_erro
+            )
+
+        return enviados, com_erro
+
+
+def drenar_leituras(
+    outbox: Outbox,
+    tx: Tx,
+    erros_desde: Optional[datetime] = None,
+    concorrencia: int = 8,
+):
+    """
+    Envia as leituras pendentes da fila utilizando o envio em lote da API
+    """
+
+    def enviar(itens: List[ItemOutbox]):
+        try:
+            resultados = tx.leitura.nova_leituras_em_lote(
+                [LeiturasPost.model_validate(item.payload) for item in itens],
+                concorrencia=concorrencia,
+            )
+        except CircuitOpenError as exc:
+            return [exc] * len(itens)
+
+        erros: List[ResultadoEnvio] = []
+
+        for resultado in resultados:
+            if not resultado.enviada:
+                erros.append(CircuitOpenError(resultado.mensagem or ""))
+            elif resultado.incerto:
+                # A API pode já ter registrado a leitura, reenviar a contaria
+                # duas vezes
+                logger.warning(
+                    "Leitura %s pode já ter sido registrada pela API e não será "
+                    "reenviada: %s",
+                    resultado.leitura.codigo,
+                    resultado.mensagem,
+                )
+                erros.append(None)
+            elif resultado.sucesso:
+                erros.append(None)
+            else:
+                erros.append(resultado.mensagem or "Erro desconhecido")
+
+        return erros
+
+    return outbox.drenar(TIPO_LEITURA, enviar, erros_desde=erros_desde)
+
+
+def _erro_apontamento(codigo_layout: str, exc: Exception) -> Optional[str]:
+    if "já está finalizado" in str(exc):
+        logger.warning(f"O plano {codigo_layout} já está finalizado.")
+        return None
+
+    logger.error(f"Erro ao apontar plano {codigo_layout}: {exc}")
+    return str(exc)
+
+
+def drenar_apontamentos(
+    outbox: Outbox,
+    tx: Tx,
+    erros_desde: Optional[datetime] = None,
+    concorrencia: int = 4,
+):
+    """
+    Envia os apontamentos de plano de corte pendentes da fila, com até
+    `concorrencia` planos sendo apontados ao mesmo tempo.
+
+    O payload de cada apontamento contém `codigo_layout` e `tipo_apontamento`.
+    """
+
+    def apontar(item: ItemOutbox) -> ResultadoEnvio:
+        codigo_layout = item.payload["codigo_layout"]
+
+        try:
+            tx.plano_de_corte.apontar(codigo_layout=codigo_layout)
+        except CircuitOpenError as exc:
+            return exc
+        except Exception as exc:
+            return _erro_apontamento(codigo_layout, exc)
+
+        if item.payload["tipo_apontamento"] != "INICIO_E_FIM":
+            return None
+
+        time.sleep(1)
+
+        try:
+            tx.plano_de_corte.apontar(codigo_layout=codigo_layout)
+        except CircuitOpenError as exc:
+            # O início já foi apontado. Se o item for reenviado por inteiro, o
+            # `/apontar` alternaria o estado do plano novamente
+            outbox.atualizar_payload(
+                item.id, {**item.payload, "tipo_apontamento": "INICIO_OU_FIM"}
+            )
+            return exc
+        except Exception as exc:
+            return _erro_apontamento(codigo_layout, exc)
+
+        return None
+
+    def enviar(itens: List[ItemOutbox]):
+        resultados: List[ResultadoEnvio] = [None] * len(itens)
+
+        with ThreadPoolExecutor(max_workers=concorrencia) as executor:
+            futuros = {
+                executor.submit(apontar, item): indice
+                for indice, item in enumerate(itens)
+            }
+
+            for futuro in as_completed(futuros):
+                resultados[futuros[futuro]] = futuro.result()
+
+        return resultados
+
+    return outbox.drenar(TIPO_APONTAMENTO, enviar, erros_desde=erros_desde)
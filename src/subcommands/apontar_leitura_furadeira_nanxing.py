@@ -1,22 +1,64 @@
 import csv
 import logging
-import time
 from argparse import Namespace
 from pathlib import Path
 from datetime import datetime, timedelta
+from typing import Optional
 import traceback
 
-import httpx
-
+from src.indice_linhas import IndiceLinhas, caminho_indice_padrao, chave_arquivo
+from src.leitor_incremental import CheckpointLeitura, LeitorIncremental
+from src.observador import cria_observador
+from src.outbox import TIPO_LEITURA, Outbox, drenar_leituras
+from src.tx.exceptions import CircuitOpenError
 from src.tx.modules.leituras.types import LeiturasPost
 from src.tx.tx import Tx
 
 logger = logging.getLogger("src.subcommands.apontar_leitura_furadeira_nanxing")
 
+NOME_CHECKPOINT = "_CHECKPOINT_TEMPOX.json"
+
+
+def cria_leitor(diretorio: Path, arquivo_checkpoint: Optional[Path] = None):
+    """
+    Leitor dos WorkRecord_*.csv, que a máquina grava em UTF-16 (ou preenchidos
+    com bytes nulos) e continua acrescentando linhas ao longo do dia
+    """
+
+    return LeitorIncremental(
+        CheckpointLeitura(arquivo_checkpoint or diretorio / NOME_CHECKPOINT),
+        encoding="utf-8",
+        erros="ignore",
+        remover_nulos=True,
+    )
+
+
+def ler_linhas_processadas(caminho_processado: Path):
+    """
+    Linhas do arquivo _PROCESSADO_TEMPOX, sem o cabeçalho. Usado somente para
+    importar o histórico para o índice de linhas processadas
+    """
+
+    if not caminho_processado.exists():
+        return []
+
+    with caminho_processado.open(
+        "r", newline="", encoding="utf-8", errors="ignore"
+    ) as f_in:
+        return list(csv.reader(f_in))[1:]
 
-def reapontar_leituras_com_erro(diretorio: Path, tx: Tx, id_recurso: int, quantidade_dias_reapontamento: int):
+
+def reapontar_leituras_com_erro(
+    diretorio: Path,
+    tx: Tx,
+    id_recurso: int,
+    quantidade_dias_reapontamento: int,
+    indice: Optional[IndiceLinhas] = None,
+):
     logger.info("Iniciando tentativa de reapontamento de arquivos com erro...")
 
+    indice = indice or IndiceLinhas(caminho_indice_padrao(diretorio))
+
     data_limite = datetime.now() - timedelta(days=quantidade_dias_reapontamento)
 
     arquivos_com_erro = [
@@ -28,6 +70,7 @@ def reapontar_leituras_com_erro(diretorio: Path, tx: Tx, id_recurso: int, quanti
         caminho_processado = caminho_com_erro.with_name(
             caminho_com_erro.stem.replace("_COM_ERRO", "_PROCESSADO_TEMPOX") + ".csv"
         )
+        chave = chave_arquivo(diretorio, caminho_processado)
 
         try:
             with caminho_com_erro.open("r", encoding="utf-8", errors="ignore") as f_in:
@@ -41,22 +84,17 @@ def reapontar_leituras_com_erro(diretorio: Path, tx: Tx, id_recurso: int, quanti
             header = linhas[0]
             linhas = linhas[1:]
 
-            linhas_ja_processadas = set()
-            if caminho_processado.exists():
-                with caminho_processado.open("r", newline="", encoding="utf-8", errors="ignore") as f_in:
-                    reader = csv.reader(f_in)
-                    existentes = list(reader)
-                    if existentes:
-                        linhas_ja_processadas.update(tuple(row) for row in existentes[1:])
+            indice.importa(chave, lambda: ler_linhas_processadas(caminho_processado))
 
             novas_linhas_ok = []
+            linhas_a_enviar = []
 
             for linha in linhas:
                 if (
                     not linha
                     or len(linha) < 2
                     or linha[0].strip().startswith("ERRO:")
-                    or tuple(linha) in linhas_ja_processadas
+                    or indice.contem(chave, linha)
                 ):
                     continue
 
@@ -76,33 +114,33 @@ def reapontar_leituras_com_erro(diretorio: Path, tx: Tx, id_recurso: int, quanti
                         leitura_manual=False,
                     )
 
-                    try:
-                        tx.leitura.nova_leitura(
-                            id_recurso=leitura.id_recurso,
-                            codigo=leitura.codigo,
-                            qtd=leitura.qtd,
-                            leitura_manual=leitura.leitura_manual,
-                        )
-                    except httpx.HTTPStatusError as e:
-                        if e.response.status_code == 401:
-                            logger.warning("Token expirado. Reautenticando...")
-                            tx.login(tx.user, tx.password)
-                            tx.leitura.nova_leitura(
-                                id_recurso=leitura.id_recurso,
-                                codigo=leitura.codigo,
-                                qtd=leitura.qtd,
-                                leitura_manual=leitura.leitura_manual,
-                            )
-                        else:
-                            raise
-
-                    novas_linhas_ok.append(linha)
-                    logger.info(f"Linha reapontada com sucesso: {linha}")
+                    linhas_a_enviar.append((linha, leitura))
 
                 except Exception as e:
                     logger.error(f"Falha ao reapontar linha {linha}: {e}")
                     continue  # mantém no arquivo de erro
 
+            resultados = tx.leitura.nova_leituras_em_lote(
+                [leitura for _, leitura in linhas_a_enviar]
+            )
+
+            for (linha, _), resultado in zip(linhas_a_enviar, resultados):
+                if resultado.incerto:
+                    # A API pode já ter registrado a leitura, reenviar a contaria
+                    # duas vezes
+                    logger.warning(
+                        f"Leitura da linha {linha} pode já ter sido registrada "
+                        f"pela API e não será reenviada: {resultado.mensagem}"
+                    )
+                elif not resultado.sucesso:
+                    logger.error(
+                        f"Falha ao reapontar linha {linha}: {resultado.mensagem}"
+                    )
+                    continue  # mantém no arquivo de erro
+
+                novas_linhas_ok.append(linha)
+                logger.info(f"Linha reapontada com sucesso: {linha}")
+
             # Anexa as reapontadas com sucesso ao arquivo processado
             if novas_linhas_ok:
                 modo_abertura = "a" if caminho_processado.exists() else "w"
@@ -112,51 +150,139 @@ def reapontar_leituras_com_erro(diretorio: Path, tx: Tx, id_recurso: int, quanti
                         writer.writerow(header)
                     writer.writerows(novas_linhas_ok)
 
+                indice.adiciona(chave, novas_linhas_ok)
+
                 # Atualiza arquivo de erro com apenas as linhas que ainda falharam
-                linhas_restantes = [linha for linha in linhas if linha not in novas_linhas_ok]
+                reapontadas = {tuple(linha) for linha in novas_linhas_ok}
+                linhas_restantes = [
+                    linha for linha in linhas if tuple(linha) not in reapontadas
+                ]
                 with caminho_com_erro.open("w", newline="", encoding="utf-8") as f_out:
                     writer = csv.writer(f_out)
                     writer.writerow(header)
                     writer.writerows(linhas_restantes)
 
+        except CircuitOpenError as erro:
+            logger.warning(f"Reapontamento interrompido: {erro}")
+            return
         except Exception as erro:
             logger.error(f"Erro ao reapontar arquivo {caminho_com_erro.name}: {erro}")
 
+
+def processar_com_outbox(
+    diretorio: Path,
+    outbox: Outbox,
+    tx: Tx,
+    id_recurso: int,
+    quantidade_dias_reapontamento: int,
+    leitor: Optional[LeitorIncremental] = None,
+):
+    """
+    Enfileira as leituras dos arquivos da máquina na fila local e envia as
+    pendentes. Substitui os arquivos _PROCESSADO_TEMPOX e _COM_ERRO.
+    """
+
+    leitor = leitor or cria_leitor(diretorio)
+
+    arquivos_csv = [
+        p
+        for p in diretorio.glob("*.csv")
+        if "_PROCESSADO_TEMPOX" not in p.stem and "_COM_ERRO" not in p.stem
+    ]
+
+    for csv_entrada in arquivos_csv:
+        leitura_arquivo = leitor.ler(csv_entrada)
+        if not leitura_arquivo.linhas:
+            continue
+
+        logger.info(
+            f"Enfileirando {len(leitura_arquivo.linhas)} novas linhas do arquivo: "
+            f"{csv_entrada.name}"
+        )
+
+        linhas = list(csv.reader(leitura_arquivo.linhas))
+
+        itens = []
+        for linha in linhas:
+            if not linha or len(linha) < 2 or linha[0].strip().startswith("ERRO:"):
+                continue
+
+            ord = Path(linha[1]).stem
+            if not ord:
+                logger.warning(f"ORD inválida na linha: {linha}")
+                continue
+
+            leitura = LeiturasPost(
+                id_recurso=id_recurso,
+                codigo=ord,
+                qtd=1,
+                leitura_manual=False,
+            )
+
+            # A própria linha da máquina identifica a leitura
+            chave = f"{csv_entrada.name}|{','.join(linha)}"
+            itens.append((chave, leitura.model_dump()))
+
+        novas = outbox.enfileirar_varios(TIPO_LEITURA, itens)
+        logger.info(f"{novas} novas leituras enfileiradas de {csv_entrada.name}")
+
+        # As leituras já estão na fila local. O arquivo continua sendo gravado
+        # pela máquina, então só a posição lida é registrada
+        leitor.confirmar(leitura_arquivo)
+
+    drenar_leituras(
+        outbox,
+        tx,
+        erros_desde=datetime.now() - timedelta(days=quantidade_dias_reapontamento),
+    )
+
+
 def apontar_leitura_furadeira_nanxing_subcommand(parsed_args: Namespace):
     logger.info("Iniciando processo de apontamento de leituras no MES...")
 
-    tx = Tx(
-        base_url=parsed_args.host,
-        user=parsed_args.user,
-        password=parsed_args.password,
-        default_timeout=parsed_args.timeout,
-    )
+    tx = Tx.from_args(parsed_args)
 
     diretorio = Path(parsed_args.caminho_arquivo)
     logger.info(f"Diretório configurado: {diretorio.resolve()}")
 
-    def tentar_enviar_leitura(leitura: LeiturasPost):
-        try:
-            tx.leitura.nova_leitura(
-                id_recurso=leitura.id_recurso,
-                codigo=leitura.codigo,
-                qtd=leitura.qtd,
-                leitura_manual=leitura.leitura_manual,
-            )
-        except httpx.HTTPStatusError as e:
-            if e.response.status_code == 401:
-                logger.warning("Token expirado. Realizando novo login...")
-                tx.login(tx.user, tx.password)
-                tx.leitura.nova_leitura(
-                    id_recurso=leitura.id_recurso,
-                    codigo=leitura.codigo,
-                    qtd=leitura.qtd,
-                    leitura_manual=leitura.leitura_manual,
-                )
-            else:
-                raise
+    outbox = Outbox(parsed_args.outbox) if parsed_args.outbox else None
+    leitor = cria_leitor(diretorio, parsed_args.arquivo_checkpoint)
+    indice = (
+        IndiceLinhas(parsed_args.arquivo_indice or caminho_indice_padrao(diretorio))
+        if outbox is None
+        else None
+    )
+
+    # Acorda o ciclo assim que a máquina gravar um WorkRecord_*.csv
+    observador = cria_observador(
+        parsed_args.observador,
+        [diretorio],
+        ["*.csv"],
+        ignorar=["_PROCESSADO_TEMPOX", "_COM_ERRO"],
+        debounce=parsed_args.debounce,
+        intervalo_polling=parsed_args.intervalo_polling,
+    )
 
     while True:
+        if outbox is not None:
+            try:
+                processar_com_outbox(
+                    diretorio=diretorio,
+                    outbox=outbox,
+                    tx=tx,
+                    id_recurso=parsed_args.id_recurso,
+                    quantidade_dias_reapontamento=parsed_args.dias_reapontamento,
+                    leitor=leitor,
+                )
+            except CircuitOpenError as erro:
+                logger.warning(f"{erro} Aguardando próximo ciclo...")
+            except Exception as erro:
+                logger.error(f"Erro no processamento: {erro}\n{traceback.format_exc()}")
+
+            logger.info("Aguardando próximo ciclo (até 30 segundos)...")
+            observador.aguardar(30)
+            continue
+
         try:
             logger.info("=== Novo ciclo de apontamento ===")
             logger.info("Listando todos os arquivos .csv encontrados no diretório:")
@@ -179,32 +305,45 @@ def apontar_leitura_furadeira_nanxing_subcommand(parsed_args: Namespace):
                 nome_com_erro = csv_entrada.stem + "_COM_ERRO.csv"
                 caminho_com_erro = csv_entrada.with_name(nome_com_erro)
                 caminho_processado = csv_entrada.with_name(csv_entrada.stem + "_PROCESSADO_TEMPOX.csv")
+                chave = chave_arquivo(diretorio, caminho_processado)
 
                 linhas_ok = []
 
-                with csv_entrada.open("r", encoding="utf-8", errors="ignore") as f_in:
-                    linhas_brutas = f_in.read().replace('\x00', '')  # remove bytes nulos
-                    logger.info(f"Tamanho do conteúdo após limpeza: {len(linhas_brutas)} bytes")
-                    reader = csv.reader(linhas_brutas.splitlines())
-                    linhas = list(reader)
-                    header = linhas[0]
-                    linhas = linhas[1:]  # remove cabeçalho
-
-                # Carrega linhas já processadas (caso arquivo exista)
-                linhas_ja_processadas = set()
-                if caminho_processado.exists():
-                    with caminho_processado.open("r", newline="", encoding="utf-8", errors="ignore") as f_in:
-                        reader = csv.reader(f_in)
-                        linhas_existentes = list(reader)
-                        if linhas_existentes:
-                            linhas_ja_processadas.update(tuple(row) for row in linhas_existentes[1:])  # ignora cabeçalho
+                # Lê somente as linhas acrescentadas desde o último ciclo
+                leitura_arquivo = leitor.ler(csv_entrada)
+                logger.info(f"{len(leitura_arquivo.linhas)} novas linhas no arquivo")
+
+                if not leitura_arquivo.linhas:
+                    continue
+
+                header = next(csv.reader([leitura_arquivo.cabecalho or ""]), [])
+                linhas = list(csv.reader(leitura_arquivo.linhas))
+
+                # O histórico do arquivo de processados só é lido na primeira vez
+                indice.importa(
+                    chave, lambda: ler_linhas_processadas(caminho_processado)
+                )
+
+                def registrar_erro(linha, erro):
+                    logger.error(f"Erro ao processar linha {linha}: {erro}")
+                    escrever_cabecalho = not caminho_com_erro.exists()
+                    with caminho_com_erro.open(
+                        "a", newline="", encoding="utf-8"
+                    ) as f_out:
+                        writer = csv.writer(f_out)
+                        if escrever_cabecalho:
+                            writer.writerow(header)
+                        writer.writerow(linha)
+                        writer.writerow([f"ERRO: {str(erro)}"])
+
+                linhas_a_enviar = []
 
                 for linha in linhas:
                     if (
                         not linha
                         or len(linha) < 2
                         or linha[0].strip().startswith("ERRO:")
-                        or tuple(linha) in linhas_ja_processadas
+                        or indice.contem(chave, linha)
                     ):
                         continue  # ignora erro, linha vazia ou já processada
 
@@ -229,23 +368,35 @@ def apontar_leitura_furadeira_nanxing_subcommand(parsed_args: Namespace):
                             leitura_manual=False,
                         )
 
-                        tentar_enviar_leitura(leitura)
-
-                        linhas_ok.append(linha)
-                        logger.info(f"Linha processada com sucesso: {linha}")
+                        linhas_a_enviar.append((linha, leitura))
 
                     except Exception as e:
-                        logger.error(f"Erro ao processar linha {linha}: {e}")
-                        escrever_cabecalho = not caminho_com_erro.exists()
-                        with caminho_com_erro.open("a", newline="", encoding="utf-8") as f_out:
-                            writer = csv.writer(f_out)
-                            if escrever_cabecalho:
-                                writer.writerow(header)
-                            writer.writerow(linha)
-                            writer.writerow([f"ERRO: {str(e)}"])
+                        registrar_erro(linha, e)
+
+                # Envia todas as leituras do arquivo de uma só vez
+                resultados = tx.leitura.nova_leituras_em_lote(
+                    [leitura for _, leitura in linhas_a_enviar]
+                )
+
+                for (linha, _), resultado in zip(linhas_a_enviar, resultados):
+                    if resultado.incerto:
+                        # A API pode já ter registrado a leitura, reenviar a contaria
+                        # duas vezes
+                        logger.warning(
+                            f"Leitura da linha {linha} pode já ter sido registrada "
+                            f"pela API e não será reenviada: {resultado.mensagem}"
+                        )
+                    elif not resultado.sucesso:
+                        registrar_erro(linha, resultado.mensagem)
+                        continue
+
+                    linhas_ok.append(linha)
+                    logger.info(f"Linha processada com sucesso: {linha}")
 
                 # Anexa somente as novas linhas OK ao arquivo de processados
-                novas_linhas_ok = [linha for linha in linhas_ok if tuple(linha) not in linhas_ja_processadas]
+                novas_linhas_ok = [
+                    linha for linha in linhas_ok if not indice.contem(chave, linha)
+                ]
                 modo_abertura = "a" if caminho_processado.exists() else "w"
                 with caminho_processado.open(modo_abertura, newline="", encoding="utf-8") as f_out:
                     writer = csv.writer(f_out)
@@ -253,9 +404,15 @@ def apontar_leitura_furadeira_nanxing_subcommand(parsed_args: Namespace):
                         writer.writerow(header)
                     writer.writerows(novas_linhas_ok)
 
-                # Remove o arquivo original apenas se todas as linhas foram tratadas
-                csv_entrada.unlink()
+                indice.adiciona(chave, novas_linhas_ok)
+
+                # Registra a posição lida apenas se todas as linhas foram tratadas.
+                # O arquivo não é removido, a máquina continua gravando nele
+                leitor.confirmar(leitura_arquivo)
 
+        except CircuitOpenError as erro:
+            # As linhas ainda não enviadas serão lidas novamente no próximo ciclo
+            logger.warning(f"{erro} Aguardando próximo ciclo...")
         except Exception as erro:
             logger.error(f"Erro no processamento: {erro}\n{traceback.format_exc()}")
 
@@ -263,8 +420,9 @@ def apontar_leitura_furadeira_nanxing_subcommand(parsed_args: Namespace):
             diretorio=diretorio,
             tx=tx,
             id_recurso=parsed_args.id_recurso,
-            quantidade_dias_reapontamento=parsed_args.dias_reapontamento
+            quantidade_dias_reapontamento=parsed_args.dias_reapontamento,
+            indice=indice,
         )
 
-        logger.info("Aguardando próximo ciclo (30 segundos)...")
-        time.sleep(30)
+        logger.info("Aguardando próximo ciclo (até 30 segundos)...")
+        observador.aguardar(30)
@@ -1,17 +1,54 @@
 import csv
 import logging
-import time
+import re
 from argparse import Namespace
 from pathlib import Path
 from datetime import datetime, timedelta
-
-import httpx
-
+from typing import Optional
+
+from src.indice_linhas import (
+    IndiceLinhas,
+    LinhasPorArquivo,
+    caminho_indice_padrao,
+    chave_arquivo,
+)
+from src.leitor_incremental import CheckpointLeitura, LeitorIncremental
+from src.observador import cria_observador
+from src.outbox import TIPO_LEITURA, Outbox, drenar_leituras
+from src.tx.exceptions import CircuitOpenError
 from src.tx.modules.leituras.types import LeiturasPost
 from src.tx.tx import Tx
 
 logger = logging.getLogger("src.subcommands.apontar_leitura_furadeira_scm_pratika")
 
+NOME_CHECKPOINT = "_CHECKPOINT_TEMPOX.json"
+
+# Nome do arquivo no fim do caminho do programa, com separadores do Windows
+_NOME_ARQUIVO = re.compile(r"[^\\/]*$")
+
+
+def cria_leitor(diretorio: Path, arquivo_checkpoint: Optional[Path] = None):
+    """
+    Leitor dos .pro, que a máquina continua acrescentando ao longo do dia
+    """
+
+    return LeitorIncremental(
+        CheckpointLeitura(arquivo_checkpoint or diretorio / NOME_CHECKPOINT),
+        encoding="latin1",
+    )
+
+
+def extrair_ord(campo: str) -> str:
+    """
+    Extrai o código da ordem do caminho do programa, por exemplo
+    `D:\\Programas\\ORD0001.pgmx` -> `ORD0001`
+    """
+
+    nome = _NOME_ARQUIVO.search(campo.strip().strip('"')).group()
+    ponto = nome.rfind(".")
+
+    return nome[:ponto] if 0 < ponto < len(nome) - 1 else nome
+
 
 def obter_pasta_ano_mais_recente(diretorio: Path) -> Path:
     subpastas_ano = [p for p in diretorio.iterdir() if p.is_dir() and p.name.isdigit()]
@@ -32,22 +69,39 @@ def carregar_linhas_processadas(arquivo_processado: Path):
         return set(normalizar_linha(row) for row in reader)
 
 
-def carregar_todas_linhas_com_erro(pasta_ano: Path):
-    linhas_com_erro = set()
-    for arquivo in pasta_ano.glob("*_COM_ERRO.pro"):
-        with arquivo.open("r", newline="", encoding="latin1") as f:
-            reader = csv.reader(f)
-            linhas_com_erro.update(normalizar_linha(row) for row in reader)
+def ler_linhas_com_erro(arquivo: Path):
+    with arquivo.open("r", newline="", encoding="latin1") as f:
+        reader = csv.reader(f)
+        return [normalizar_linha(row) for row in reader]
+
+
+def carregar_todas_linhas_com_erro(
+    pasta_ano: Path, linhas_com_erro: Optional[LinhasPorArquivo] = None
+) -> LinhasPorArquivo:
+    """
+    Atualiza as linhas de todos os _COM_ERRO.pro da pasta. Com o conjunto do
+    ciclo anterior, somente os arquivos alterados desde então são lidos
+    """
+
+    if linhas_com_erro is None:
+        linhas_com_erro = LinhasPorArquivo(ler_linhas_com_erro)
+
+    linhas_com_erro.atualiza(pasta_ano.glob("*_COM_ERRO.pro"))
+
     return linhas_com_erro
 
+
 def reapontar_leituras_com_erro_pratika(
     diretorio: Path,
     tx: Tx,
     id_recurso: int,
     quantidade_dias_reapontamento: int,
+    indice: Optional[IndiceLinhas] = None,
 ):
     logger.info("Iniciando tentativa de reapontamento de arquivos .pro com erro...")
 
+    indice = indice or IndiceLinhas(caminho_indice_padrao(diretorio))
+
     data_limite = datetime.now() - timedelta(days=quantidade_dias_reapontamento)
 
     try:
@@ -65,8 +119,9 @@ def reapontar_leituras_com_erro_pratika(
         caminho_processado = caminho_com_erro.with_name(
             caminho_com_erro.stem.replace("_COM_ERRO", "_PROCESSADO_TEMPOX") + ".pro"
         )
+        chave = chave_arquivo(diretorio, caminho_processado)
 
-        linhas_processadas = carregar_linhas_processadas(caminho_processado)
+        indice.importa(chave, lambda: carregar_linhas_processadas(caminho_processado))
 
         try:
             with caminho_com_erro.open("r", newline="", encoding="latin1") as f_in:
@@ -78,16 +133,16 @@ def reapontar_leituras_com_erro_pratika(
 
             novas_linhas_ok = []
             linhas_falha = []
+            linhas_a_enviar = []
 
             for linha in linhas:
                 linha_normalizada = normalizar_linha(linha)
 
-                if linha_normalizada in linhas_processadas:
+                if indice.contem(chave, linha_normalizada):
                     continue
 
                 try:
-                    tratando_ord = linha[1].strip().strip('"')
-                    ord = Path(tratando_ord.split("\\")[-1]).stem
+                    ord = extrair_ord(linha[1])
 
                     if not ord:
                         logger.warning(f"ORD inválida na linha: {linha}")
@@ -103,33 +158,34 @@ def reapontar_leituras_com_erro_pratika(
                         leitura_manual=False,
                     )
 
-                    try:
-                        tx.leitura.nova_leitura(
-                            id_recurso=leitura.id_recurso,
-                            codigo=leitura.codigo,
-                            qtd=leitura.qtd,
-                            leitura_manual=leitura.leitura_manual,
-                        )
-                    except httpx.HTTPStatusError as e:
-                        if e.response.status_code == 401:
-                            logger.warning("Token expirado. Reautenticando...")
-                            tx.login(tx.user, tx.password)
-                            tx.leitura.nova_leitura(
-                                id_recurso=leitura.id_recurso,
-                                codigo=leitura.codigo,
-                                qtd=leitura.qtd,
-                                leitura_manual=leitura.leitura_manual,
-                            )
-                        else:
-                            raise
-
-                    novas_linhas_ok.append(linha_normalizada)
-                    logger.info(f"Linha reapontada com sucesso: {linha}")
+                    linhas_a_enviar.append((linha, leitura))
 
                 except Exception as e:
                     logger.error(f"Erro ao reapontar linha {linha}: {e}")
                     linhas_falha.append(linha_normalizada)
 
+            resultados = tx.leitura.nova_leituras_em_lote(
+                [leitura for _, leitura in linhas_a_enviar]
+            )
+
+            for (linha, _), resultado in zip(linhas_a_enviar, resultados):
+                if resultado.incerto:
+                    # A API pode já ter registrado a leitura, reenviar a contaria
+                    # duas vezes
+                    logger.warning(
+                        f"Leitura da linha {linha} pode já ter sido registrada "
+                        f"pela API e não será reenviada: {resultado.mensagem}"
+                    )
+                elif not resultado.sucesso:
+                    logger.error(
+                        f"Erro ao reapontar linha {linha}: {resultado.mensagem}"
+                    )
+                    linhas_falha.append(normalizar_linha(linha))
+                    continue
+
+                novas_linhas_ok.append(normalizar_linha(linha))
+                logger.info(f"Linha reapontada com sucesso: {linha}")
+
             # Atualiza arquivos
             if novas_linhas_ok:
                 modo = "a" if caminho_processado.exists() else "w"
@@ -137,50 +193,137 @@ def reapontar_leituras_com_erro_pratika(
                     writer = csv.writer(f_out)
                     writer.writerows(novas_linhas_ok)
 
+                indice.adiciona(chave, novas_linhas_ok)
+
             with caminho_com_erro.open("w", newline="", encoding="latin1") as f_out:
                 writer = csv.writer(f_out)
                 writer.writerows(linhas_falha)
 
+        except CircuitOpenError as erro:
+            logger.warning(f"Reapontamento interrompido: {erro}")
+            return
         except Exception as erro:
             logger.error(f"Erro ao reapontar arquivo {caminho_com_erro.name}: {erro}")
 
+
+def processar_com_outbox(
+    diretorio: Path,
+    outbox: Outbox,
+    tx: Tx,
+    id_recurso: int,
+    quantidade_dias_reapontamento: int,
+    leitor: Optional[LeitorIncremental] = None,
+):
+    """
+    Enfileira as leituras dos arquivos .pro na fila local e envia as pendentes.
+    Substitui os arquivos _PROCESSADO_TEMPOX e _COM_ERRO.
+    """
+
+    leitor = leitor or cria_leitor(diretorio)
+    pasta_ano = obter_pasta_ano_mais_recente(diretorio)
+
+    arquivos_pro_validos = [
+        p
+        for p in pasta_ano.glob("*.pro")
+        if "_COM_ERRO" not in p.stem and "_PROCESSADO_TEMPOX" not in p.stem
+    ]
+
+    for arquivo_pro in sorted(arquivos_pro_validos, key=lambda p: p.stat().st_mtime):
+        # Somente as linhas acrescentadas desde a última leitura
+        leitura_arquivo = leitor.ler(arquivo_pro)
+        if not leitura_arquivo.linhas:
+            continue
+
+        itens = []
+        for linha in csv.reader(leitura_arquivo.linhas):
+            linha_normalizada = normalizar_linha(linha)
+
+            try:
+                ord = extrair_ord(linha[1])
+            except IndexError:
+                logger.warning(f"Linha inválida: {linha}")
+                continue
+
+            if not ord:
+                logger.warning(f"ORD inválida na linha: {linha}")
+                continue
+
+            leitura = LeiturasPost(
+                id_recurso=id_recurso,
+                codigo=ord,
+                qtd=1,
+                leitura_manual=False,
+            )
+
+            # A própria linha da máquina identifica a leitura
+            chave = f"{arquivo_pro.name}|{','.join(linha_normalizada)}"
+            itens.append((chave, leitura.model_dump()))
+
+        novas = outbox.enfileirar_varios(TIPO_LEITURA, itens)
+        if novas:
+            logger.info(f"{novas} novas leituras enfileiradas de {arquivo_pro.name}")
+
+        leitor.confirmar(leitura_arquivo)
+
+    drenar_leituras(
+        outbox,
+        tx,
+        erros_desde=datetime.now() - timedelta(days=quantidade_dias_reapontamento),
+    )
+
+
 def apontar_leitura_furadeira_scm_pratika_subcommand(parsed_args: Namespace):
     logger.info("Iniciando processo de apontamento de leituras no MES...")
 
-    tx = Tx(
-        base_url=parsed_args.host,
-        user=parsed_args.user,
-        password=parsed_args.password,
-        default_timeout=parsed_args.timeout,
-    )
+    tx = Tx.from_args(parsed_args)
 
     diretorio = Path(parsed_args.caminho_arquivo)
 
-    def enviar_leitura(leitura: LeiturasPost):
-        try:
-            tx.leitura.nova_leitura(
-                id_recurso=leitura.id_recurso,
-                codigo=leitura.codigo,
-                qtd=leitura.qtd,
-                leitura_manual=leitura.leitura_manual,
-            )
-        except httpx.HTTPStatusError as e:
-            if e.response.status_code == 401:
-                logger.warning("Token expirado. Realizando novo login...")
-                tx.login(tx.user, tx.password)
-                tx.leitura.nova_leitura(
-                    id_recurso=leitura.id_recurso,
-                    codigo=leitura.codigo,
-                    qtd=leitura.qtd,
-                    leitura_manual=leitura.leitura_manual,
-                )
-            else:
-                raise
+    outbox = Outbox(parsed_args.outbox) if parsed_args.outbox else None
+    leitor = cria_leitor(diretorio, parsed_args.arquivo_checkpoint)
+    indice = (
+        IndiceLinhas(parsed_args.arquivo_indice or caminho_indice_padrao(diretorio))
+        if outbox is None
+        else None
+    )
+    # Mantido entre os ciclos, relendo somente os _COM_ERRO alterados
+    linhas_com_erro = LinhasPorArquivo(ler_linhas_com_erro)
+
+    # Os .pro ficam nas subpastas de cada ano
+    observador = cria_observador(
+        parsed_args.observador,
+        [diretorio],
+        ["*.pro"],
+        ignorar=["_PROCESSADO_TEMPOX", "_COM_ERRO"],
+        recursivo=True,
+        debounce=parsed_args.debounce,
+        intervalo_polling=parsed_args.intervalo_polling,
+    )
 
     while True:
+        if outbox is not None:
+            try:
+                processar_com_outbox(
+                    diretorio=diretorio,
+                    outbox=outbox,
+                    tx=tx,
+                    id_recurso=parsed_args.id_recurso,
+                    quantidade_dias_reapontamento=parsed_args.dias_reapontamento,
+                    leitor=leitor,
+                )
+            except CircuitOpenError as erro:
+                logger.warning(f"{erro} Aguardando próximo ciclo...")
+            except Exception as erro:
+                logger.error(f"Erro no processamento: {erro}")
+
+            logger.info("Aguardando próximo ciclo (até 30 segundos)...")
+            observador.aguardar(30)
+            continue
+
         try:
             pasta_ano = obter_pasta_ano_mais_recente(diretorio)
-            linhas_com_erro_globais = carregar_todas_linhas_com_erro(pasta_ano)
+            # Carregadas somente se algum arquivo tiver linhas novas
+            linhas_com_erro_globais = None
 
             arquivos_pro_validos = [
                 p for p in pasta_ano.glob("*.pro")
@@ -189,27 +332,49 @@ def apontar_leitura_furadeira_scm_pratika_subcommand(parsed_args: Namespace):
 
             if not arquivos_pro_validos:
                 logger.info("Nenhum arquivo .pro válido para processar.")
-                time.sleep(30)
+                observador.aguardar(30)
                 continue
 
             for csv_entrada in sorted(arquivos_pro_validos, key=lambda p: p.stat().st_mtime):
                 caminho_processado = csv_entrada.with_name(csv_entrada.stem + "_PROCESSADO_TEMPOX.pro")
+                chave = chave_arquivo(diretorio, caminho_processado)
                 caminho_com_erro = csv_entrada.with_name(csv_entrada.stem + "_COM_ERRO.pro")
 
-                linhas_processadas = carregar_linhas_processadas(caminho_processado)
+                # Lê somente as linhas acrescentadas desde o último ciclo
+                leitura_arquivo = leitor.ler(csv_entrada)
+                if not leitura_arquivo.linhas:
+                    continue
+
+                if linhas_com_erro_globais is None:
+                    linhas_com_erro_globais = carregar_todas_linhas_com_erro(
+                        pasta_ano, linhas_com_erro
+                    )
+
+                # O histórico do arquivo de processados só é lido na primeira vez
+                indice.importa(
+                    chave, lambda: carregar_linhas_processadas(caminho_processado)
+                )
+                linhas = list(csv.reader(leitura_arquivo.linhas))
 
-                with csv_entrada.open("r", newline="", encoding="latin1") as f_in:
-                    reader = csv.reader(f_in)
-                    linhas = list(reader)[1:]  # Ignora cabeçalho
+                def registrar_erro(linha, erro):
+                    logger.error(f"Erro ao processar linha {linha}: {erro}")
+                    with caminho_com_erro.open(
+                        "a", newline="", encoding="latin1"
+                    ) as f_out:
+                        writer_arquivo_com_erro = csv.writer(f_out)
+                        writer_arquivo_com_erro.writerow(normalizar_linha(linha))
+
+                linhas_a_enviar = []
 
                 for linha in linhas:
                     linha_normalizada = normalizar_linha(linha)
-                    if linha_normalizada in linhas_processadas or linha_normalizada in linhas_com_erro_globais:
+                    if linha_normalizada in linhas_com_erro_globais or indice.contem(
+                        chave, linha_normalizada
+                    ):
                         continue
 
                     try:
-                        tratando_ord = linha[1].strip().strip('"')
-                        ord = Path(tratando_ord.split("\\")[-1]).stem
+                        ord = extrair_ord(linha[1])
 
                         if not ord:
                             logger.warning(f"ORD inválida na linha: {linha}")
@@ -224,19 +389,47 @@ def apontar_leitura_furadeira_scm_pratika_subcommand(parsed_args: Namespace):
                             leitura_manual=False,
                         )
 
-                        enviar_leitura(leitura)
-
-                        with caminho_processado.open("a", newline="", encoding="latin1") as f_out:
-                            writer_arquivo_processado = csv.writer(f_out)
-                            writer_arquivo_processado.writerow(linha_normalizada)
-                            logger.info(f"Linha processada com sucesso: {linha}")
+                        linhas_a_enviar.append((linha, leitura))
 
                     except Exception as e:
-                        logger.error(f"Erro ao processar linha {linha}: {e}")
-                        with caminho_com_erro.open("a", newline="", encoding="latin1") as f_out:
-                            writer_arquivo_com_erro = csv.writer(f_out)
-                            writer_arquivo_com_erro.writerow(linha_normalizada)
+                        registrar_erro(linha, e)
+
+                # Envia todas as leituras novas do arquivo de uma só vez
+                resultados = tx.leitura.nova_leituras_em_lote(
+                    [leitura for _, leitura in linhas_a_enviar]
+                )
+
+                linhas_ok = []
+                for (linha, _), resultado in zip(linhas_a_enviar, resultados):
+                    if resultado.incerto:
+                        # A API pode já ter registrado a leitura, reenviar a contaria
+                        # duas vezes
+                        logger.warning(
+                            f"Leitura da linha {linha} pode já ter sido registrada "
+                            f"pela API e não será reenviada: {resultado.mensagem}"
+                        )
+                    elif not resultado.sucesso:
+                        registrar_erro(linha, resultado.mensagem)
+                        continue
+
+                    linhas_ok.append(normalizar_linha(linha))
+                    logger.info(f"Linha processada com sucesso: {linha}")
+
+                if linhas_ok:
+                    with caminho_processado.open(
+                        "a", newline="", encoding="latin1"
+                    ) as f_out:
+                        writer_arquivo_processado = csv.writer(f_out)
+                        writer_arquivo_processado.writerows(linhas_ok)
+
+                    indice.adiciona(chave, linhas_ok)
+
+                # Só avança a leitura depois que as linhas foram tratadas
+                leitor.confirmar(leitura_arquivo)
 
+        except CircuitOpenError as erro:
+            # As linhas ainda não enviadas serão lidas novamente no próximo ciclo
+            logger.warning(f"{erro} Aguardando próximo ciclo...")
         except Exception as erro:
             logger.error(f"Erro no processamento: {erro}")
         reapontar_leituras_com_erro_pratika(
@@ -244,7 +437,8 @@ def apontar_leitura_furadeira_scm_pratika_subcommand(parsed_args: Namespace):
             tx=tx,
             id_recurso=parsed_args.id_recurso,
             quantidade_dias_reapontamento=parsed_args.dias_reapontamento,
+            indice=indice,
         )
     
-        logger.info("Aguardando próximo ciclo (30 segundos)...")
-        time.sleep(30)
+        logger.info("Aguardando próximo ciclo (até 30 segundos)...")
+        observador.aguardar(30)
@@ -2,8 +2,6 @@ import logging
 import time
 from argparse import Namespace
 
-from httpx import Timeout
-
 from src.tx.tx import Tx
 
 logger = logging.getLogger("src.subcommands.apontar_plano_de_corte")
@@ -12,12 +10,7 @@ logger = logging.getLogger("src.subcommands.apontar_plano_de_corte")
 def apontar_plano_de_corte_subcommand(parsed_args: Namespace):
     logger.info("Iniciando apontamento dos planos no MES...")
 
-    tx = Tx(
-        base_url=parsed_args.host,
-        user=parsed_args.user,
-        password=parsed_args.password,
-        default_timeout=Timeout(parsed_args.timeout),
-    )
+    tx = Tx.from_args(parsed_args)
 
     tx.plano_de_corte.apontar(
         codigo_layout=parsed_args.cod_layout,
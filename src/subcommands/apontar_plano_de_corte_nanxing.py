@@ -4,11 +4,12 @@ from pathlib import Path
 import time
 import xml.etree.ElementTree as ET
 from argparse import Namespace
-import httpx
-from httpx import Timeout
 from datetime import datetime, timedelta
 
+from src.apontamento_plano import aponta_plano, caminho_marcador_inicio
 from src.arguments import parse_args
+from src.observador import cria_observador
+from src.tx.exceptions import CircuitOpenError
 from src.tx.tx import Tx
 
 logger = logging.getLogger("src.subcommands.apontar_plano_de_corte_nanxing")
@@ -59,29 +60,19 @@ def processar_cycle(cycle, layouts_apontados, tx, tipo_apontamento, caminho_past
 
             logger.info(f"Apontando plano de corte com layout: {primeira_linha}")
 
-            def apontar():
-                try:
-                    tx.plano_de_corte.apontar(codigo_layout=primeira_linha)
-                except httpx.HTTPStatusError as e:
-                    if e.response.status_code == 401:
-                        logger.warning("Token expirado. Realizando novo login...")
-                        tx.login(tx.user, tx.password)
-                        tx.plano_de_corte.apontar(codigo_layout=primeira_linha)
-                    else:
-                        raise
-
-            # Aponta INÍCIO
-            apontar()
-            time.sleep(2)
-
-            # Aponta FIM se necessário
-            if tipo_apontamento == "INICIO_E_FIM":
-                logger.info(f"Apontando fim do plano de corte: {primeira_linha}")
-                apontar()
+            aponta_plano(
+                tx,
+                primeira_linha,
+                tipo_apontamento,
+                marcador_inicio=caminho_marcador_inicio(caminho_pasta_tx, plate_id),
+            )
 
             logger.info(f"Apontamento do plano {primeira_linha} realizado com sucesso.")
             layouts_apontados.add(plate_id)
             os.rename(caminho_arquivo_tx, caminho_arquivo_apontado)
+        except CircuitOpenError:
+            # Mantém o arquivo para ser apontado quando a API voltar
+            raise
         except Exception as e:
             erro_msg = str(e)
             if "já está finalizado" in erro_msg:
@@ -134,30 +125,22 @@ def processar_sem_cycle(caminho_arquivo_tx_apontar_sem_cycle, layouts_apontados,
 
             logger.info(f"Apontando plano de corte (sem cycle) com layout: {primeira_linha}")
 
-            def apontar():
-                try:
-                    tx.plano_de_corte.apontar(codigo_layout=primeira_linha)
-                except httpx.HTTPStatusError as e:
-                    if e.response.status_code == 401:
-                        logger.warning("Token expirado. Realizando novo login...")
-                        tx.login(tx.user, tx.password)
-                        tx.plano_de_corte.apontar(codigo_layout=primeira_linha)
-                    else:
-                        raise
-
-            # Aponta INÍCIO
-            apontar()
-            time.sleep(2)
-
-            # Aponta FIM se necessário
-            if tipo_apontamento == "INICIO_E_FIM":
-                logger.info(f"Apontando fim do plano de corte (sem cycle): {primeira_linha}")
-                apontar()
+            aponta_plano(
+                tx,
+                primeira_linha,
+                tipo_apontamento,
+                marcador_inicio=caminho_marcador_inicio(
+                    caminho_arquivo_tx_apontar_sem_cycle, plate_id
+                ),
+            )
 
             logger.info(f"Apontamento do plano {primeira_linha} realizado com sucesso.")
             layouts_apontados.add(plate_id)
             os.rename(caminho_arquivo_tx, caminho_arquivo_apontado)
 
+        except CircuitOpenError:
+            # Mantém o arquivo para ser apontado quando a API voltar
+            raise
         except Exception as e:
             logger.error(f"Erro ao processar {caminho_arquivo_tx}: {e}")
             try:
@@ -213,28 +196,19 @@ def reapontar_planos_com_erro_nanxing(
 
                 logger.info(f"Reapontando plano de corte: {primeira_linha}")
 
-                def apontar():
-                    try:
-                        tx.plano_de_corte.apontar(codigo_layout=primeira_linha)
-                    except httpx.HTTPStatusError as e:
-                        if e.response.status_code == 401:
-                            logger.warning("Token expirado. Reautenticando...")
-                            tx.login(tx.user, tx.password)
-                            tx.plano_de_corte.apontar(codigo_layout=primeira_linha)
-                        else:
-                            raise
-
-                # Aponta INÍCIO
-                apontar()
-                time.sleep(2)
-
-                if tipo_apontamento == "INICIO_E_FIM":
-                    logger.info(f"Reapontando fim do plano de corte: {primeira_linha}")
-                    apontar()
+                aponta_plano(
+                    tx,
+                    primeira_linha,
+                    tipo_apontamento,
+                    marcador_inicio=caminho_marcador_inicio(pasta, plate_id),
+                )
 
                 logger.info(f"Reapontamento do plano {primeira_linha} concluído com sucesso.")
                 os.rename(arquivo_erro, caminho_apontado)
 
+            except CircuitOpenError as e:
+                logger.warning(f"Reapontamento interrompido: {e}")
+                return
             except Exception as e:
                 logger.error(f"Erro ao reapontar {arquivo_erro.name}: {e}")
                 try:
@@ -246,12 +220,7 @@ def reapontar_planos_com_erro_nanxing(
 
 def apontar_plano_de_corte_nanxing_subcommand(parsed_args: Namespace):
     logger.info("Iniciando apontamento dos planos no MES...")
-    tx = Tx(
-        base_url=parsed_args.host,
-        user=parsed_args.user,
-        password=parsed_args.password,
-        default_timeout=Timeout(parsed_args.timeout),
-    )
+    tx = Tx.from_args(parsed_args)
 
     caminho_xml = parsed_args.caminho_arquivo
     tipo_apontamento = parsed_args.tipo_apontamento
@@ -260,6 +229,19 @@ def apontar_plano_de_corte_nanxing_subcommand(parsed_args: Namespace):
     layouts_apontados = set()
     ultimo_plate_em_processo = None
 
+    # Acorda o ciclo quando o NClist.xml ou um .tx sem registro da máquina mudar
+    observador = cria_observador(
+        parsed_args.observador,
+        [
+            Path(caminho_xml).parent,
+            *([Path(caminho_arquivo_tx_apontar_sem_cycle)] if caminho_arquivo_tx_apontar_sem_cycle else []),
+        ],
+        [Path(caminho_xml).name, "*.tx"],
+        ignorar=["_APONTADO", "_COM_ERRO"],
+        debounce=parsed_args.debounce,
+        intervalo_polling=parsed_args.intervalo_polling,
+    )
+
     while True:
         reapontar_planos_com_erro_nanxing(
             caminhos=[
@@ -271,15 +253,19 @@ def apontar_plano_de_corte_nanxing_subcommand(parsed_args: Namespace):
             dias_reapontamento=parsed_args.dias_reapontamento,
         )
 
-        logger.info("Aguardando 20 segundos.")
-        time.sleep(20)
+        logger.info("Aguardando alterações (até 20 segundos).")
+        observador.aguardar(20)
 
-        processar_sem_cycle(
-            caminho_arquivo_tx_apontar_sem_cycle,
-            layouts_apontados,
-            tx,
-            tipo_apontamento
-        )
+        try:
+            processar_sem_cycle(
+                caminho_arquivo_tx_apontar_sem_cycle,
+                layouts_apontados,
+                tx,
+                tipo_apontamento
+            )
+        except CircuitOpenError as e:
+            logger.warning(f"{e} Aguardando próximo ciclo...")
+            continue
 
         if not os.path.exists(caminho_xml):
             logger.warning(f"Arquivo {caminho_xml} não encontrado. Aguardando 10 segundos...")
@@ -296,21 +282,25 @@ def apontar_plano_de_corte_nanxing_subcommand(parsed_args: Namespace):
 
         plate_id_atual = None
 
-        for cycle in root.findall(".//Cycle"):
-            plate_id, panel_state = extrair_dados_cycle(cycle)
-
-            if panel_state == "2":
-                plate_id_atual = plate_id
-
-            # Processa normalmente se estiver como 4
-            processar_cycle(cycle, layouts_apontados, tx, tipo_apontamento, caminho_arquivo)
-
-        # Aponta o anterior se ele estava em processo e foi trocado por outro
-        if ultimo_plate_em_processo and ultimo_plate_em_processo != plate_id_atual:
-            logger.warning(f"PlateID anterior {ultimo_plate_em_processo} não foi finalizado. Apontando mesmo assim.")
-            ciclo_falso = ET.Element("Cycle")
-            ET.SubElement(ciclo_falso, "Field", Name="PlateID", Value=f"{ultimo_plate_em_processo}.nc")
-            ET.SubElement(ciclo_falso, "Field", Name="PanelState", Value="4")
-            processar_cycle(ciclo_falso, layouts_apontados, tx, tipo_apontamento, caminho_arquivo)
+        try:
+            for cycle in root.findall(".//Cycle"):
+                plate_id, panel_state = extrair_dados_cycle(cycle)
+
+                if panel_state == "2":
+                    plate_id_atual = plate_id
+
+                # Processa normalmente se estiver como 4
+                processar_cycle(cycle, layouts_apontados, tx, tipo_apontamento, caminho_arquivo)
+
+            # Aponta o anterior se ele estava em processo e foi trocado por outro
+            if ultimo_plate_em_processo and ultimo_plate_em_processo != plate_id_atual:
+                logger.warning(f"PlateID anterior {ultimo_plate_em_processo} não foi finalizado. Apontando mesmo assim.")
+                ciclo_falso = ET.Element("Cycle")
+                ET.SubElement(ciclo_falso, "Field", Name="PlateID", Value=f"{ultimo_plate_em_processo}.nc")
+                ET.SubElement(ciclo_falso, "Field", Name="PanelState", Value="4")
+                processar_cycle(ciclo_falso, layouts_apontados, tx, tipo_apontamento, caminho_arquivo)
+        except CircuitOpenError as e:
+            logger.warning(f"{e} Aguardando próximo ciclo...")
+            continue
 
         ultimo_plate_em_processo = plate_id_atual
@@ -1,12 +1,12 @@
 import logging
 import os
-import time
 from argparse import Namespace
 from pathlib import Path
 
-from httpx import Timeout
-import httpx
-
+from src.apontamento_plano import aponta_plano, caminho_marcador_inicio
+from src.observador import cria_observador
+from src.outbox import TIPO_APONTAMENTO, Outbox, drenar_apontamentos
+from src.tx.exceptions import CircuitOpenError
 from src.tx.tx import Tx
 
 logger = logging.getLogger("src.subcommands.apontar_plano_de_corte_scm")
@@ -51,28 +51,20 @@ def reapontar_planos_com_erro_scm(
 
             logger.info(f"Reapontando plano SCM: {primeira_linha}")
 
-            def apontar():
-                try:
-                    tx.plano_de_corte.apontar(codigo_layout=primeira_linha)
-                except httpx.HTTPStatusError as e:
-                    if e.response.status_code == 401:
-                        logger.warning("Token expirado. Reautenticando...")
-                        tx.login(tx.user, tx.password)
-                        tx.plano_de_corte.apontar(codigo_layout=primeira_linha)
-                    else:
-                        raise
-
-            # Aponta INÍCIO
-            apontar()
-            time.sleep(1)
-
-            if tipo_apontamento == "INICIO_E_FIM":
-                logger.info(f"Reapontando FIM do plano SCM: {primeira_linha}")
-                apontar()
+            aponta_plano(
+                tx,
+                primeira_linha,
+                tipo_apontamento,
+                marcador_inicio=caminho_marcador_inicio(caminho_pasta, nome_base),
+                espera=1,
+            )
 
             logger.info(f"Reapontamento do plano {primeira_linha} concluído com sucesso.")
             os.rename(arquivo_erro, caminho_apontado)
 
+        except CircuitOpenError as e:
+            logger.warning(f"Reapontamento interrompido: {e}")
+            return
         except Exception as e:
             logger.error(f"Erro ao reapontar {arquivo_erro.name}: {e}")
             try:
@@ -83,39 +75,101 @@ def reapontar_planos_com_erro_scm(
                 logger.error(f"Erro ao escrever erro no arquivo {arquivo_erro.name}: {erro_arquivo}")
 
 
+def processar_com_outbox(
+    caminho_pasta: Path,
+    outbox: Outbox,
+    tx: Tx,
+    tipo_apontamento: str,
+    dias_reapontamento: int,
+):
+    """
+    Enfileira o apontamento de cada arquivo .tx na fila local e envia os
+    pendentes. Substitui a renomeação para _APONTADO e _COM_ERRO.
+    """
+
+    itens = []
+
+    for arquivo in sorted(caminho_pasta.glob("*.tx")):
+        if arquivo.stem.endswith(("_APONTADO", "_COM_ERRO")):
+            continue
+
+        if outbox.contem(TIPO_APONTAMENTO, arquivo.name):
+            continue
+
+        with open(arquivo, "r", encoding="utf-8") as f:
+            primeira_linha = f.readline().strip()
+
+        if not primeira_linha:
+            logger.warning(f"{arquivo} está vazio. Ignorando...")
+            continue
+
+        logger.info(f"Enfileirando apontamento do plano SCM: {primeira_linha}")
+        itens.append(
+            (
+                arquivo.name,
+                {"codigo_layout": primeira_linha, "tipo_apontamento": tipo_apontamento},
+            )
+        )
+
+    outbox.enfileirar_varios(TIPO_APONTAMENTO, itens)
+
+    drenar_apontamentos(
+        outbox,
+        tx,
+        erros_desde=datetime.now() - timedelta(days=dias_reapontamento),
+    )
+
+
 def apontar_plano_de_corte_scm_subcommand(parsed_args: Namespace):
     logger.info("Iniciando apontamento dos planos SCM...")
 
-    tx = Tx(
-        base_url=parsed_args.host,
-        user=parsed_args.user,
-        password=parsed_args.password,
-        default_timeout=Timeout(parsed_args.timeout),
-    )
+    tx = Tx.from_args(parsed_args)
 
     caminho_pasta = Path(parsed_args.caminho_arquivo).resolve()
     tipo_apontamento = parsed_args.tipo_apontamento.upper()
 
-    def apontar(layout: str):
-        try:
-            tx.plano_de_corte.apontar(codigo_layout=layout)
-        except httpx.HTTPStatusError as e:
-            if e.response.status_code == 401:
-                logger.warning("Token expirado. Realizando novo login...")
-                tx.login(tx.user, tx.password)
-                tx.plano_de_corte.apontar(codigo_layout=layout)
-            else:
-                raise
+    outbox = Outbox(parsed_args.outbox) if parsed_args.outbox else None
+
+    observador = cria_observador(
+        parsed_args.observador,
+        [caminho_pasta],
+        ["*.tx"],
+        ignorar=["_APONTADO", "_COM_ERRO"],
+        debounce=parsed_args.debounce,
+        intervalo_polling=parsed_args.intervalo_polling,
+    )
 
     while True:
+        if outbox is not None:
+            logger.info("Aguardando novos arquivos .tx (até 30 segundos)...")
+            observador.aguardar(30)
+
+            if not caminho_pasta.is_dir():
+                logger.warning(f"Pasta {caminho_pasta} não encontrada ou não é diretório.")
+                continue
+
+            try:
+                processar_com_outbox(
+                    caminho_pasta=caminho_pasta,
+                    outbox=outbox,
+                    tx=tx,
+                    tipo_apontamento=tipo_apontamento,
+                    dias_reapontamento=parsed_args.dias_reapontamento,
+                )
+            except CircuitOpenError as erro:
+                logger.warning(f"{erro} Aguardando próximo ciclo...")
+            except Exception as erro:
+                logger.error(f"Erro no processamento: {erro}")
+            continue
+
         reapontar_planos_com_erro_scm(
             caminho_pasta=caminho_pasta,
             tx=tx,
             tipo_apontamento=tipo_apontamento,
             dias_reapontamento=parsed_args.dias_reapontamento,
         )
-        logger.info("Aguardando 30 segundos...")
-        time.sleep(30)
+        logger.info("Aguardando novos arquivos .tx (até 30 segundos)...")
+        observador.aguardar(30)
 
         if not caminho_pasta.exists() or not caminho_pasta.is_dir():
             logger.warning(f"Pasta {caminho_pasta} não encontrada ou não é diretório.")
@@ -153,16 +207,21 @@ def apontar_plano_de_corte_scm_subcommand(parsed_args: Namespace):
                     continue
 
                 logger.info(f"Apontando plano SCM: {primeira_linha}")
-                apontar(primeira_linha)
-
-                if tipo_apontamento == "INICIO_E_FIM":
-                    time.sleep(1)
-                    logger.info(f"Apontando fim do plano de corte: {primeira_linha}")
-                    apontar(primeira_linha)
+                aponta_plano(
+                    tx,
+                    primeira_linha,
+                    tipo_apontamento,
+                    marcador_inicio=caminho_marcador_inicio(caminho_pasta, nome_base),
+                    espera=1,
+                )
 
                 logger.info(f"Apontamento do plano {primeira_linha} realizado com sucesso.")
                 os.rename(arquivo, caminho_apontado)
 
+            except CircuitOpenError as e:
+                # Os arquivos restantes serão apontados quando a API voltar
+                logger.warning(f"{e} Aguardando próximo ciclo...")
+                break
             except Exception as e:
                 logger.error(f"Erro ao apontar plano {arquivo.name}: {e}")
                 try:
@@ -1,22 +1,34 @@
 import csv
+import json
 import logging
 from argparse import Namespace
+from collections import Counter
+from functools import lru_cache
 from io import TextIOWrapper
-from typing import List
+from typing import Dict, Iterator, List, Tuple, Type, TypeVar
 import sys
-from httpx import Timeout
-from pydantic import ValidationError
+from pydantic import BaseModel, TypeAdapter, ValidationError
 
 from src.tx.modules.cliente.types import (
     NovaOrdemParams,
-    NovaOrdemRoteiroEIdUnico,
+    OrdemColunar,
     NovoIdUnicoParams,
     NovoRoteiroParams,
 )
+from src.ordenacao_externa import ArquivoJsonLinhas, agrupa, ordena_em_disco
+from src.tx.exceptions import MesApiError
 from src.tx.tx import Tx
 
 logger = logging.getLogger("src.subcommands.nova_ordem")
 
+# Quantidade máxima de ids de ordens não encontradas listadas no erro
+MAX_ORFAOS_LISTADOS = 20
+
+# Quantidade de linhas do csv validadas de uma vez
+LINHAS_POR_VALIDACAO = 10_000
+
+Modelo = TypeVar("Modelo", bound=BaseModel)
+
 max_int = sys.maxsize
 while True:
     try:
@@ -33,6 +45,109 @@ def detect_dialect(text: str):
     return dialect
 
 
+def _le_csv(arquivo: TextIOWrapper) -> Iterator[Tuple[int, Dict[str, str]]]:
+    first_line = arquivo.readline()
+    arquivo.seek(0)
+
+    arquivo_csv = csv.DictReader(arquivo, dialect=detect_dialect(first_line))
+
+    assert (
+        arquivo_csv.fieldnames
+    ), f"Não foi possível detectar os nomes das colunas no arquivo: {arquivo}"
+
+    arquivo_csv.fieldnames = [field.lower() for field in arquivo_csv.fieldnames]
+
+    for row in arquivo_csv:
+        yield arquivo_csv.line_num, row
+
+
+@lru_cache(maxsize=None)
+def _validador_lista(modelo: Type[BaseModel]) -> TypeAdapter:
+    return TypeAdapter(List[modelo])  # type: ignore[valid-type]
+
+
+def _valida_bloco(
+    arquivo: TextIOWrapper,
+    modelo: Type[Modelo],
+    bloco: List[Tuple[int, Dict[str, str]]],
+) -> List[Modelo]:
+    try:
+        return _validador_lista(modelo).validate_python([row for _, row in bloco])
+    except ValidationError as exc:
+        # Reporta somente a primeira linha inválida, com os erros dela
+        line_num, row = bloco[exc.errors()[0]["loc"][0]]
+
+        try:
+            modelo.model_validate(row)
+        except ValidationError as exc_linha:
+            exc = exc_linha
+
+        raise Exception(
+            f"Erro ao validar layout na linha {line_num} "
+            f"do arquivo {arquivo}\n\n"
+            f"Input: {row}\n\n"
+            f"{exc}"
+        ) from exc
+
+
+def _valida(arquivo: TextIOWrapper, modelo: Type[Modelo]) -> Iterator[Modelo]:
+    """
+    Valida as linhas do csv em blocos, uma única vez, diretamente no modelo
+    enviado para a API
+    """
+
+    bloco: List[Tuple[int, Dict[str, str]]] = []
+
+    for line_num, row in _le_csv(arquivo):
+        bloco.append((line_num, row))
+
+        if len(bloco) >= LINHAS_POR_VALIDACAO:
+            yield from _valida_bloco(arquivo, modelo, bloco)
+            bloco = []
+
+    if bloco:
+        yield from _valida_bloco(arquivo, modelo, bloco)
+
+
+def _le_ordens(arquivo: TextIOWrapper) -> Iterator[NovaOrdemParams]:
+    # Os roteiros e ids únicos são acrescentados na junção
+    return _valida(arquivo, NovaOrdemParams)
+
+
+def _levanta_orfaos(roteiros_orfaos: Counter, ids_unicos_orfaos: Counter):
+    """
+    Reúne em um único erro todos os roteiros e ids únicos cuja ordem não está
+    no arquivo de ordens
+    """
+
+    if not roteiros_orfaos and not ids_unicos_orfaos:
+        return
+
+    mensagens = []
+
+    for descricao, orfaos in (
+        ("roteiros", roteiros_orfaos),
+        ("ids únicos", ids_unicos_orfaos),
+    ):
+        if not orfaos:
+            continue
+
+        ids = ", ".join(
+            str(id_ordem) for id_ordem in sorted(orfaos)[:MAX_ORFAOS_LISTADOS]
+        )
+
+        if len(orfaos) > MAX_ORFAOS_LISTADOS:
+            ids += ", ..."
+
+        mensagens.append(
+            f"{sum(orfaos.values())} {descricao} de {len(orfaos)} ordens: {ids}"
+        )
+
+    raise Exception(
+        "Ordens não encontradas no arquivo de ordens:\n" + "\n".join(mensagens)
+    )
+
+
 def parse_files(parsed_args: Namespace):
     ordens_file = parsed_args.ordens_file
     assert isinstance(ordens_file, TextIOWrapper)
@@ -46,144 +161,209 @@ def parse_files(parsed_args: Namespace):
     # Processando CSV das ORDENS
     logger.info("Processando csv das ordens: %s", ordens_file)
 
-    first_line = ordens_file.readline()
-    ordens_file.seek(0)
+    ordens_roteiros_e_id_unicos: List[OrdemColunar] = [
+        OrdemColunar(ordem) for ordem in _le_ordens(ordens_file)
+    ]
 
-    ordens_file_csv = csv.DictReader(ordens_file, dialect=detect_dialect(first_line))
+    # Índice das ordens pelo id. Se o id se repetir, os roteiros e ids únicos
+    # ficam na primeira ordem do arquivo
+    ordens_por_id: Dict[int, OrdemColunar] = {}
 
-    assert (
-        ordens_file_csv.fieldnames
-    ), f"Não foi possível detectar os nomes das colunas no arquivo: {ordens_file}"
+    for ordem in ordens_roteiros_e_id_unicos:
+        ordens_por_id.setdefault(ordem.id_ordem, ordem)
 
-    lowercase_field_names = [field.lower() for field in ordens_file_csv.fieldnames]
-    ordens_file_csv.fieldnames = lowercase_field_names
+    # Processando CSV dos ROTEIROS
+    logger.info("Processando csv dos roteiros: %s", roteiros_file)
 
-    ordens_roteiros_e_id_unicos: List[NovaOrdemRoteiroEIdUnico] = []
+    roteiros_orfaos: Counter = Counter()
 
-    for row in ordens_file_csv:
-        try:
-            NovaOrdemParams.model_validate(row)
-        except ValidationError as exc:
-            raise Exception(
-                f"Erro ao validar layout na linha {ordens_file_csv.line_num} "
-                f"do arquivo {ordens_file}\n\n"
-                f"Input: {row}\n\n"
-                f"{exc}"
-            ) from exc
-
-        ordens_roteiros_e_id_unicos.append(
-            NovaOrdemRoteiroEIdUnico.model_validate(
-                {
-                    **row,
-                    "roteiros": [],
-                    "ids_unicos": [],
-                }
-            )
-        )
+    for roteiro in _valida(roteiros_file, NovoRoteiroParams):
+        ordem = ordens_por_id.get(roteiro.id_ordem)
 
-    # Processando CSV dos ROTEIROS
-    logger.info("Processando csv dos roteiros: %s", roteiros_file)
+        if ordem is None:
+            roteiros_orfaos[roteiro.id_ordem] += 1
+        else:
+            ordem.adiciona_roteiro(roteiro)
 
-    first_line = roteiros_file.readline()
-    roteiros_file.seek(0)
+    # Processando CSV dos IDS ÚNICOS
+    logger.info("Processando csv dos ids únicos: %s", ids_unicos_file)
 
-    roteiros_file_csv = csv.DictReader(
-        roteiros_file, dialect=detect_dialect(first_line)
-    )
+    ids_unicos_orfaos: Counter = Counter()
 
-    assert (
-        roteiros_file_csv.fieldnames
-    ), f"Não foi possível detectar os nomes das colunas no arquivo: {roteiros_file}"
+    for id_unico in _valida(ids_unicos_file, NovoIdUnicoParams):
+        ordem = ordens_por_id.get(id_unico.id_ordem)
 
-    lowercase_field_names = [field.lower() for field in roteiros_file_csv.fieldnames]
-    roteiros_file_csv.fieldnames = lowercase_field_names
+        if ordem is None:
+            ids_unicos_orfaos[id_unico.id_ordem] += 1
+        else:
+            ordem.ids_unicos.append(id_unico.id_unico_peca)
 
-    for row in roteiros_file_csv:
-        try:
-            roteiro = NovoRoteiroParams.model_validate(row)
-        except ValidationError as exc:
-            raise Exception(
-                f"Erro ao validar layout na linha {roteiros_file_csv.line_num} "
-                f"do arquivo {roteiros_file}\n\n"
-                f"Input: {row}\n\n"
-                f"{exc}"
-            ) from exc
-
-        ordem = next(
+    _levanta_orfaos(roteiros_orfaos, ids_unicos_orfaos)
+
+    return ordens_roteiros_e_id_unicos
+
+
+def parse_files_em_disco(parsed_args: Namespace) -> ArquivoJsonLinhas:
+    """
+    Mesmo resultado de `parse_files`, mas com memória limitada: os três
+    arquivos são ordenados por `id_ordem` em disco e unidos em uma única
+    passada. As ordens são enviadas na ordem do `id_ordem`.
+    """
+
+    linhas_por_bloco = parsed_args.linhas_por_bloco
+    resultado = ArquivoJsonLinhas()
+
+    try:
+        logger.info("Ordenando csv das ordens: %s", parsed_args.ordens_file)
+
+        ordens = ordena_em_disco(
             (
-                ordem
-                for ordem in ordens_roteiros_e_id_unicos
-                if ordem.id_ordem == roteiro.id_ordem
+                (
+                    ordem.id_ordem,
+                    json.dumps(ordem.model_dump()),
+                )
+                for ordem in _le_ordens(parsed_args.ordens_file)
             ),
-            None,
+            resultado.diretorio,
+            "ordens",
+            linhas_por_bloco,
         )
 
-        if not ordem:
-            raise Exception(
-                f"Ordem {roteiro.id_ordem} não encontrada no arquivo de ordens"
+        logger.info("Ordenando csv dos roteiros: %s", parsed_args.roteiros_file)
+
+        roteiros = agrupa(
+            ordena_em_disco(
+                (
+                    (roteiro.id_ordem, json.dumps(roteiro.model_dump()))
+                    for roteiro in _valida(parsed_args.roteiros_file, NovoRoteiroParams)
+                ),
+                resultado.diretorio,
+                "roteiros",
+                linhas_por_bloco,
             )
+        )
 
-        ordem.roteiros.append(roteiro)
+        logger.info("Ordenando csv dos ids únicos: %s", parsed_args.ids_unicos_file)
+
+        ids_unicos = agrupa(
+            ordena_em_disco(
+                (
+                    (id_unico.id_ordem, json.dumps(id_unico.model_dump()))
+                    for id_unico in _valida(
+                        parsed_args.ids_unicos_file, NovoIdUnicoParams
+                    )
+                ),
+                resultado.diretorio,
+                "ids-unicos",
+                linhas_por_bloco,
+            )
+        )
 
-    # Processando CSV dos IDS ÚNICOS
-    logger.info("Processando csv dos ids únicos: %s", ids_unicos_file)
+        roteiros_orfaos: Counter = Counter()
+        ids_unicos_orfaos: Counter = Counter()
 
-    first_line = ids_unicos_file.readline()
-    ids_unicos_file.seek(0)
+        roteiro = next(roteiros, None)
+        id_unico = next(ids_unicos, None)
 
-    ids_unicos_file_csv = csv.DictReader(
-        ids_unicos_file, dialect=detect_dialect(first_line)
-    )
+        for id_ordem, linhas in agrupa(ordens):
+            while roteiro is not None and roteiro[0] < id_ordem:
+                roteiros_orfaos[roteiro[0]] += len(roteiro[1])
+                roteiro = next(roteiros, None)
 
-    assert (
-        ids_unicos_file_csv.fieldnames
-    ), f"Não foi possível detectar os nomes das colunas no arquivo: {ids_unicos_file}"
+            while id_unico is not None and id_unico[0] < id_ordem:
+                ids_unicos_orfaos[id_unico[0]] += len(id_unico[1])
+                id_unico = next(ids_unicos, None)
 
-    lowercase_field_names = [field.lower() for field in ids_unicos_file_csv.fieldnames]
-    ids_unicos_file_csv.fieldnames = lowercase_field_names
+            roteiros_da_ordem: List[str] = []
+            ids_unicos_da_ordem: List[str] = []
 
-    for row in ids_unicos_file_csv:
-        try:
-            id_unico = NovoIdUnicoParams.model_validate(row)
-        except ValidationError as exc:
-            raise Exception(
-                f"Erro ao validar layout na linha {ids_unicos_file_csv.line_num} "
-                f"do arquivo {ids_unicos_file}\n\n"
-                f"Input: {row}\n\n"
-                f"{exc}"
-            ) from exc
-
-        ordem = next(
-            (
-                ordem
-                for ordem in ordens_roteiros_e_id_unicos
-                if ordem.id_ordem == id_unico.id_ordem
-            ),
-            None,
-        )
+            if roteiro is not None and roteiro[0] == id_ordem:
+                roteiros_da_ordem = roteiro[1]
+                roteiro = next(roteiros, None)
 
-        if not ordem:
-            raise Exception(
-                f"Ordem {id_unico.id_ordem} não encontrada no arquivo de ordens"
-            )
+            if id_unico is not None and id_unico[0] == id_ordem:
+                ids_unicos_da_ordem = id_unico[1]
+                id_unico = next(ids_unicos, None)
 
-        ordem.ids_unicos.append(id_unico)
+            for indice, linha in enumerate(linhas):
+                # Como em `parse_files`, somente a primeira ordem com o mesmo id
+                # recebe os roteiros e ids únicos
+                if indice:
+                    roteiros_da_ordem = ids_unicos_da_ordem = []
 
-    return ordens_roteiros_e_id_unicos
+                # A ordem já está serializada, só os roteiros e ids únicos são
+                # acrescentados ao final do objeto
+                resultado.adiciona(
+                    f"{linha[:-1]}, "
+                    f'"roteiros": [{", ".join(roteiros_da_ordem)}], '
+                    f'"ids_unicos": [{", ".join(ids_unicos_da_ordem)}]}}'
+                )
 
+        while roteiro is not None:
+            roteiros_orfaos[roteiro[0]] += len(roteiro[1])
+            roteiro = next(roteiros, None)
 
-def nova_ordem_subcommand(parsed_args: Namespace):
-    logger.info("Iniciando envio de ordens...")
+        while id_unico is not None:
+            ids_unicos_orfaos[id_unico[0]] += len(id_unico[1])
+            id_unico = next(ids_unicos, None)
+
+        resultado.finaliza()
+
+        _levanta_orfaos(roteiros_orfaos, ids_unicos_orfaos)
+    except BaseException:
+        resultado.close()
+        raise
+
+    return resultado
+
+
+def envia_ordens(parsed_args: Namespace, ordens):
+    tx = Tx.from_args(parsed_args)
+
+    if not parsed_args.ordens_por_envio:
+        tx.cliente.nova_ordem(ordens)
+        return
 
-    ordens_roteiros_e_id_unicos = parse_files(parsed_args)
+    resultado = tx.cliente.nova_ordem_em_lotes(
+        ordens,
+        tamanho_lote=parsed_args.ordens_por_envio,
+        concorrencia=parsed_args.envios_simultaneos,
+    )
+
+    if parsed_args.arquivo_resultado:
+        resultado.salvar(parsed_args.arquivo_resultado)
 
-    tx = Tx(
-        base_url=parsed_args.host,
-        user=parsed_args.user,
-        password=parsed_args.password,
-        default_timeout=Timeout(parsed_args.timeout),
+    total = (
+        len(resultado.aceitas) + len(resultado.rejeitadas) + len(resultado.incertas)
     )
 
-    tx.cliente.nova_ordem(ordens_roteiros_e_id_unicos)
+    if resultado.incertas:
+        logger.warning(
+            "%s de %s ordens podem ter sido gravadas pela API apesar da falha. "
+            "Verifique-as antes de enviá-las novamente: %s",
+            len(resultado.incertas),
+            total,
+            ", ".join(str(id_ordem) for id_ordem in resultado.incertas),
+        )
+
+    if resultado.rejeitadas or resultado.incertas:
+        raise MesApiError(
+            f"{len(resultado.rejeitadas) + len(resultado.incertas)} de {total} "
+            "ordens não foram confirmadas pela API: "
+            + ", ".join(
+                str(id_ordem)
+                for id_ordem in [*resultado.rejeitadas, *resultado.incertas]
+            )
+        )
+
+
+def nova_ordem_subcommand(parsed_args: Namespace):
+    logger.info("Iniciando envio de ordens...")
+
+    if parsed_args.ordenacao_em_disco:
+        with parse_files_em_disco(parsed_args) as ordens:
+            envia_ordens(parsed_args, ordens)
+    else:
+        envia_ordens(parsed_args, parse_files(parsed_args))
 
     logger.info("Ordens enviadas com sucesso!")
@@ -1,21 +1,14 @@
-import base64
 import logging
-import os
 from argparse import Namespace
-from math import isnan
-from typing import Any, List, Optional
-
-from httpx import Timeout
-from pandas import read_csv
-from pydantic import (
-    BaseModel,
-    BeforeValidator,
-    ConfigDict,
-    ValidationError,
-    model_validator,
-)
-from typing_extensions import Annotated
+from enum import Enum
+from typing import Any, Dict, List, Set, Tuple
+
+from pandas import DataFrame, Series, read_csv, to_numeric
 
+from src.ardis import LeitorOtimizacao
+from src.figuras import CacheFiguras, CarregadorFiguras
+from src.tx.modules.plano_de_corte.manifesto import ManifestoProjeto
+from src.tx.modules.plano_de_corte.partes import ProgressoEnvio
 from src.tx.modules.plano_de_corte.types import (
     PlanoDeCorteCreateModel,
     PlanoDeCortePecasCreateModel,
@@ -26,169 +19,266 @@ from src.tx.tx import Tx
 logger = logging.getLogger("src.subcommands.novo_plano_de_corte")
 
 
-def coerce_nan_to_none(x: Any) -> Any:
-    try:
-        if isnan(x):
-            return None
-    except TypeError as exc:
-        raise ValueError(f"Erro ao converter {x} para None") from exc
+# Tipo esperado de cada coluna dos arquivos csv
+COLUNAS_PECAS: Dict[str, Any] = {
+    "id_ordem": int,
+    "id_unico_peca": int,
+    "codigo_layout": str,
+    "qtd_cortada_no_layout": int,
+    "tempo_corte_segundos": float,
+    "id_retrabalho": int,
+    # Se `recorte` for true, a peça será considerada como recorte
+    # nesse caso `id_ordem` e `id_unico_peca` podem ser None
+    "recorte": bool,
+}
+COLUNAS_PECAS_OPCIONAIS = {"id_ordem", "id_unico_peca", "id_retrabalho"}
+
+COLUNAS_PLANOS: Dict[str, Any] = {
+    "codigo_layout": str,
+    "descricao_material": str,
+    "id_recurso": int,
+    "mm_comp_linear": float,
+    "mm_comprimento": float,
+    "mm_largura": float,
+    "nome_projeto": str,
+    "perc_aproveitamento": float,
+    "perc_sobras": float,
+    "tipo": TipoMateriaPrima,
+    "codigo_lote": str,
+    "qtd_chapas": int,
+    "tempo_estimado_seg": float,
+    "qtd_separacao_manual": int,
+    "qtd_separacao_automatica": int,
+}
+
+_BOOLEANOS = {
+    "0": False,
+    "0.0": False,
+    "false": False,
+    "f": False,
+    "n": False,
+    "no": False,
+    "off": False,
+    "1": True,
+    "1.0": True,
+    "true": True,
+    "t": True,
+    "y": True,
+    "yes": True,
+    "on": True,
+}
+
+# Quantidade máxima de erros listados na mensagem de erro
+_MAX_ERROS = 20
+
+
+def _converte_coluna(valores: Series, tipo: Any):
+    """
+    Converte a coluna para o tipo esperado. Retorna os valores convertidos e
+    uma máscara das linhas com valor inválido
+    """
+
+    vazio = valores.isna()
+
+    if tipo is str:
+        return valores, Series(False, index=valores.index)
+
+    if tipo is bool:
+        convertido = valores.astype(str).str.strip().str.lower().map(_BOOLEANOS)
+        return convertido, convertido.isna() & ~vazio
+
+    if isinstance(tipo, type) and issubclass(tipo, Enum):
+        convertido = valores.map({membro.value: membro for membro in tipo})
+        return convertido, convertido.isna() & ~vazio
+
+    numeros = to_numeric(valores, errors="coerce")
+    invalido = numeros.isna() & ~vazio
+
+    if tipo is int:
+        invalido |= numeros.notna() & (numeros % 1 != 0)
+        return numeros.mask(invalido).astype("Int64"), invalido
+
+    return numeros.astype(float), invalido
+
+
+def _converte_colunas(
+    df: DataFrame, colunas: Dict[str, Any], opcionais: Set[str], nome_arquivo: str
+):
+    """
+    Converte todas as colunas do arquivo de uma vez, reunindo os erros de todas
+    as linhas em vez de parar no primeiro
+    """
+
+    ausentes = [coluna for coluna in colunas if coluna not in df.columns]
+
+    if ausentes:
+        raise Exception(
+            f"Colunas obrigatórias ausentes no arquivo {nome_arquivo}: "
+            f"{', '.join(ausentes)}"
+        )
 
-    return x
+    convertido = DataFrame(index=df.index)
+    erros: List[Tuple[int, str]] = []
 
+    for coluna, tipo in colunas.items():
+        valores, invalido = _converte_coluna(df[coluna], tipo)
 
-class PlanoDeCortePecasCsvModel(BaseModel):
-    # https://docs.pydantic.dev/latest/api/config/#pydantic.config.ConfigDict.coerce_numbers_to_str
-    model_config = ConfigDict(coerce_numbers_to_str=True)
+        for idx in df.index[invalido]:
+            erros.append((idx, f"valor inválido em {coluna}: {df.at[idx, coluna]!r}"))
 
-    id_ordem: Annotated[Optional[int], BeforeValidator(coerce_nan_to_none)]
-    id_unico_peca: Annotated[Optional[int], BeforeValidator(coerce_nan_to_none)]
-    codigo_layout: str
-    qtd_cortada_no_layout: int
-    tempo_corte_segundos: float
-    id_retrabalho: Annotated[Optional[int], BeforeValidator(coerce_nan_to_none)]
+        if coluna not in opcionais:
+            for idx in df.index[df[coluna].isna()]:
+                erros.append((idx, f"{coluna} não informado"))
 
-    # Se `recorte` for true, a peça será considerada como recorte
-    # nesse caso `id_ordem` e `id_unico_peca` podem ser None
-    recorte: bool
-
-    @model_validator(mode="after")
-    def verifica_recorte(self):
-        if self.recorte:
-            if self.id_ordem is not None or self.id_unico_peca is not None:
-                raise ValueError(
-                    "Peça de recorte não deve ter id_ordem ou id_unico_peca"
-                )
-
-        return self
-
-
-class PlanoDeCorteCsvModel(BaseModel):
-    # https://docs.pydantic.dev/latest/api/config/#pydantic.config.ConfigDict.coerce_numbers_to_str
-    model_config = ConfigDict(coerce_numbers_to_str=True)
-
-    codigo_layout: str
-    descricao_material: str
-    id_recurso: int
-    mm_comp_linear: float
-    mm_comprimento: float
-    mm_largura: float
-    nome_projeto: str
-    perc_aproveitamento: float
-    perc_sobras: float
-    tipo: TipoMateriaPrima
-    codigo_lote: str
-    qtd_chapas: int
-    tempo_estimado_seg: float
-    qtd_separacao_manual: int
-    qtd_separacao_automatica: int
-
-
-def get_figure_for_layout(parsed_args: Namespace, plano: PlanoDeCorteCsvModel):
-    figure_path = os.path.join(
-        str(parsed_args.figures_directory)
-        .strip('"')
-        .strip("'"),  # Remove ' and/or " from figures_directory
-        f"{plano.codigo_layout}.png",
+        convertido[coluna] = valores
+
+    return convertido, erros
+
+
+def _levanta_erros(erros: List[Tuple[int, str]], descricao: str, nome_arquivo: str):
+    if not erros:
+        return
+
+    # A primeira linha do arquivo é o cabeçalho
+    linhas = [f"linha {idx + 2}: {mensagem}" for idx, mensagem in sorted(erros)]
+
+    if len(linhas) > _MAX_ERROS:
+        linhas = linhas[:_MAX_ERROS] + [f"... e mais {len(linhas) - _MAX_ERROS} erros"]
+
+    raise Exception(
+        f"Erro ao validar {descricao} no arquivo {nome_arquivo}:\n" + "\n".join(linhas)
+    )
+
+
+def _registros(df: DataFrame) -> List[Dict[str, Any]]:
+    # Troca NaN/NA por None e os tipos do numpy pelos tipos do Python
+    return df.astype(object).where(df.notna(), None).to_dict("records")
+
+
+def carregador_de_figuras(parsed_args: Namespace):
+    return CarregadorFiguras(
+        parsed_args.figures_directory,
+        max_bytes=parsed_args.max_bytes_figura,
+        cache=CacheFiguras(parsed_args.cache_figuras)
+        if parsed_args.cache_figuras
+        else None,
+    )
+
+
+def parse_pecas(parsed_args: Namespace):
+    """
+    Lê o arquivo de peças e retorna, por layout, as peças que não são recorte e
+    a quantidade de recortes
+    """
+
+    nome_arquivo = parsed_args.parts_file.name
+
+    parts_df = read_csv(
+        parsed_args.parts_file,
+        sep=parsed_args.sep,
+        dtype={"codigo_layout": str},
+    )
+
+    logger.debug("Parts: %s", parts_df)
+
+    pecas_df, erros = _converte_colunas(
+        parts_df, COLUNAS_PECAS, COLUNAS_PECAS_OPCIONAIS, nome_arquivo
+    )
+
+    recorte = pecas_df["recorte"].fillna(False).astype(bool)
+
+    recorte_com_ids = recorte & (
+        pecas_df["id_ordem"].notna() | pecas_df["id_unico_peca"].notna()
     )
+    for idx in pecas_df.index[recorte_com_ids]:
+        erros.append((idx, "Peça de recorte não deve ter id_ordem ou id_unico_peca"))
+
+    _levanta_erros(erros, "peças", nome_arquivo)
+
+    qtd_recortes = pecas_df[recorte].groupby("codigo_layout").size().to_dict()
+
+    pecas = pecas_df[~recorte]
+    colunas_create = list(PlanoDeCortePecasCreateModel.model_fields)
 
-    if not os.path.exists(figure_path):
-        logger.warning('O arquivo "%s" não foi encontrado', figure_path)
+    # Agrupa as peças por layout em uma única passada, mantendo a ordem do
+    # arquivo. As peças já foram validadas coluna a coluna
+    pecas_por_layout: Dict[str, List[PlanoDeCortePecasCreateModel]] = {}
 
-        return None
+    for codigo_layout, registro in zip(
+        pecas["codigo_layout"], _registros(pecas[colunas_create])
+    ):
+        pecas_por_layout.setdefault(codigo_layout, []).append(
+            PlanoDeCortePecasCreateModel.model_construct(**registro)
+        )
+
+    logger.info("Arquivo %s lido com sucesso", nome_arquivo)
 
-    with open(figure_path, "rb") as figure_img:
-        return base64.b64encode(figure_img.read()).decode("utf-8")
+    return pecas_por_layout, qtd_recortes
 
 
 def parse_files(parsed_args: Namespace):
     logger.info("Lendo arquivos csv...")
 
+    pecas_por_layout, qtd_recortes = parse_pecas(parsed_args)
+
+    nome_arquivo = parsed_args.layouts_file.name
+
     layouts_df = read_csv(
         parsed_args.layouts_file,
         sep=parsed_args.sep,
-        converters={"codigo_layout": str, "codigo_lote": str},
-    )
-    parts_df = read_csv(
-        parsed_args.parts_file, sep=parsed_args.sep, converters={"codigo_layout": str}
+        dtype={coluna: str for coluna, tipo in COLUNAS_PLANOS.items() if tipo is str},
     )
 
     logger.debug("Layouts: %s", layouts_df)
-    logger.debug("Parts: %s", parts_df)
 
-    pecas: List[PlanoDeCortePecasCsvModel] = []
+    planos_df, erros = _converte_colunas(
+        layouts_df, COLUNAS_PLANOS, set(), nome_arquivo
+    )
+
+    _levanta_erros(erros, "layouts", nome_arquivo)
+
+    # Todas as figuras são carregadas em paralelo antes de montar os planos
+    figuras = carregador_de_figuras(parsed_args).carrega_todas(
+        planos_df["codigo_layout"]
+    )
+
     planos: List[PlanoDeCorteCreateModel] = []
 
-    for idx, row in parts_df.iterrows():
-        try:
-            peca = PlanoDeCortePecasCsvModel.model_validate(row.to_dict())
-            pecas.append(peca)
+    # As colunas já foram validadas e convertidas, então os planos são montados
+    # sem validar novamente cada campo
+    for registro in _registros(planos_df):
+        codigo_layout = registro["codigo_layout"]
 
-        except ValidationError as exc:
-            raise Exception(
-                f"Erro ao validar peça na linha {idx}: {row.to_dict()}"
-            ) from exc
+        plano = PlanoDeCorteCreateModel.model_construct(
+            **registro,
+            qtd_recortes=qtd_recortes.get(codigo_layout, 0),
+            figure=figuras[codigo_layout],
+            pecas=pecas_por_layout.get(codigo_layout, []),
+        )
 
-    logger.info("Arquivo %s lido com sucesso", parsed_args.parts_file.name)
+        planos.append(plano)
 
-    for idx, row in layouts_df.iterrows():
-        try:
-            row = PlanoDeCorteCsvModel.model_validate(row.to_dict())
+    logger.info("Arquivo %s lido com sucesso", nome_arquivo)
 
-        except ValidationError as exc:
-            raise Exception(
-                f"Erro ao validar layout na linha {idx}: {row.to_dict()}"
-            ) from exc
+    return planos
 
-        # Pode incluir recorte, que não devem ser tratados como peças
-        todas_as_pecas_desse_plano = [
-            peca for peca in pecas if peca.codigo_layout == row.codigo_layout
-        ]
 
-        # Conta quantas peças são recortes
-        qtd_recortes = len(
-            [peca for peca in todas_as_pecas_desse_plano if peca.recorte]
-        )
+def parse_otimizacao(parsed_args: Namespace):
+    logger.info("Lendo arquivo de otimização...")
 
-        # Mantem somente as peças que não são recortes
-        pecas_desse_plano = [
-            peca for peca in todas_as_pecas_desse_plano if not peca.recorte
-        ]
-
-        figure = get_figure_for_layout(parsed_args, row)
-
-        plano = PlanoDeCorteCreateModel(
-            codigo_layout=row.codigo_layout,
-            codigo_lote=row.codigo_lote,
-            descricao_material=row.descricao_material,
-            id_recurso=row.id_recurso,
-            mm_comp_linear=row.mm_comp_linear,
-            mm_comprimento=row.mm_comprimento,
-            mm_largura=row.mm_largura,
-            nome_projeto=row.nome_projeto,
-            perc_aproveitamento=row.perc_aproveitamento,
-            perc_sobras=row.perc_sobras,
-            qtd_chapas=row.qtd_chapas,
-            qtd_separacao_manual=row.qtd_separacao_manual,
-            qtd_separacao_automatica=row.qtd_separacao_automatica,
-            tempo_estimado_seg=row.tempo_estimado_seg,
-            tipo=row.tipo,
-            qtd_recortes=qtd_recortes,
-            figure=figure,
-            pecas=[
-                PlanoDeCortePecasCreateModel(
-                    qtd_cortada_no_layout=peca.qtd_cortada_no_layout,
-                    id_unico_peca=peca.id_unico_peca,
-                    id_ordem=peca.id_ordem,
-                    tempo_corte_segundos=peca.tempo_corte_segundos,
-                    id_retrabalho=peca.id_retrabalho,
-                )
-                for peca in pecas_desse_plano
-            ],
-        )
+    planos = LeitorOtimizacao(
+        id_recurso=parsed_args.id_recurso,
+        formato_codigo_layout=parsed_args.formato_codigo_layout,
+        campo_id_ordem=parsed_args.campo_id_ordem,
+        campo_id_unico_peca=parsed_args.campo_id_unico_peca,
+    ).le(parsed_args.otimizacao_file)
 
-        planos.append(plano)
+    figuras = carregador_de_figuras(parsed_args).carrega_todas(
+        [plano.codigo_layout for plano in planos]
+    )
 
-    logger.info("Arquivo %s lido com sucesso", parsed_args.layouts_file.name)
+    for plano in planos:
+        plano.figure = figuras[plano.codigo_layout]
 
     return planos
 
@@ -196,16 +286,45 @@ def parse_files(parsed_args: Namespace):
 def novo_plano_de_corte_subcommand(parsed_args: Namespace):
     logger.info("Iniciando envio de arquivos para o MES")
 
-    tx = Tx(
-        base_url=parsed_args.host,
-        user=parsed_args.user,
-        password=parsed_args.password,
-        default_timeout=Timeout(parsed_args.timeout),
-    )
+    tx = Tx.from_args(parsed_args)
 
     # Carrega os arquivos
-    planos = parse_files(parsed_args)
+    if parsed_args.otimizacao_file is not None:
+        planos = parse_otimizacao(parsed_args)
+    else:
+        planos = parse_files(parsed_args)
+
+    manifesto = None
+
+    if parsed_args.manifesto:
+        manifesto = ManifestoProjeto(parsed_args.manifesto)
+        planos, inalterados = manifesto.diferenca(planos)
+
+        if inalterados:
+            logger.info(
+                "%s planos sem alteração desde o último envio foram ignorados: %s",
+                len(inalterados),
+                ", ".join(plano.codigo_layout for plano in inalterados),
+            )
+
+        if not planos:
+            logger.info("Nenhum plano novo ou alterado para enviar.")
+            return
+
+        logger.info("Enviando %s planos novos ou alterados", len(planos))
+
+    if parsed_args.planos_por_envio or parsed_args.bytes_por_envio:
+        tx.plano_de_corte.novo_projeto_em_partes(
+            planos,
+            max_planos=parsed_args.planos_por_envio,
+            max_bytes=parsed_args.bytes_por_envio,
+            concorrencia=parsed_args.envios_simultaneos,
+            progresso=ProgressoEnvio(parsed_args.arquivo_progresso),
+        )
+    else:
+        tx.plano_de_corte.novo_projeto(planos)
 
-    tx.plano_de_corte.novo_projeto(planos)
+    if manifesto is not None:
+        manifesto.registrar(planos)
 
     logger.info("Envio finalizado!")
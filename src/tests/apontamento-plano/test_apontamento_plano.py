@@ -0,0 +1,72 @@
+from types import SimpleNamespace
+
+import pytest
+
+from src import apontamento_plano
+from src.apontamento_plano import aponta_plano, caminho_marcador_inicio
+from src.subcommands.apontar_plano_de_corte_nanxing import processar_sem_cycle
+from src.tx.exceptions import CircuitOpenError
+
+
+@pytest.fixture(autouse=True)
+def sem_espera(monkeypatch):
+    monkeypatch.setattr(apontamento_plano.time, "sleep", lambda segundos: None)
+
+
+def cria_tx(falhas):
+    apontados = []
+
+    def apontar(codigo_layout):
+        if falhas and falhas[0] == len(apontados):
+            falhas.pop(0)
+            raise CircuitOpenError("A API do MES está indisponível")
+
+        apontados.append(codigo_layout)
+
+    return SimpleNamespace(plano_de_corte=SimpleNamespace(apontar=apontar)), apontados
+
+
+def test_circuit_breaker_no_fim_aponta_somente_o_fim_depois(tmp_path):
+    # O segundo `/apontar` (fim) encontra o circuit breaker aberto
+    tx, apontados = cria_tx([1])
+    marcador = caminho_marcador_inicio(tmp_path, "PLATE1")
+
+    with pytest.raises(CircuitOpenError):
+        aponta_plano(tx, "PLAN0001", "INICIO_E_FIM", marcador_inicio=marcador)
+
+    assert apontados == ["PLAN0001"]
+    assert marcador.exists()
+
+    aponta_plano(tx, "PLAN0001", "INICIO_E_FIM", marcador_inicio=marcador)
+
+    # O início não é apontado novamente
+    assert apontados == ["PLAN0001", "PLAN0001"]
+    assert not marcador.exists()
+
+
+def test_circuit_breaker_no_inicio_nao_cria_marcador(tmp_path):
+    tx, apontados = cria_tx([0])
+    marcador = caminho_marcador_inicio(tmp_path, "PLATE1")
+
+    with pytest.raises(CircuitOpenError):
+        aponta_plano(tx, "PLAN0001", "INICIO_E_FIM", marcador_inicio=marcador)
+
+    assert apontados == []
+    assert not marcador.exists()
+
+
+def test_processar_sem_cycle_retoma_pelo_fim(tmp_path):
+    (tmp_path / "PLATE1.tx").write_text("PLAN0001\n", encoding="utf-8")
+    tx, apontados = cria_tx([1])
+
+    with pytest.raises(CircuitOpenError):
+        processar_sem_cycle(str(tmp_path), set(), tx, "INICIO_E_FIM")
+
+    assert (tmp_path / "PLATE1.tx").exists()
+
+    processar_sem_cycle(str(tmp_path), set(), tx, "INICIO_E_FIM")
+
+    assert apontados == ["PLAN0001", "PLAN0001"]
+    assert sorted(arquivo.name for arquivo in tmp_path.iterdir()) == [
+        "PLATE1_APONTADO.tx"
+    ]
@@ -0,0 +1,47 @@
+import asyncio
+import re
+
+import httpx
+import pytest
+from pytest_httpx import HTTPXMock
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def mock_post_apontar(httpx_mock: HTTPXMock):
+    layouts_apontados = []
+
+    def post_apontar(request: httpx.Request):
+        assert request.headers["Authorization"].startswith("Bearer ")
+
+        layouts_apontados.append(request.url.path.split("/")[-2])
+
+        return httpx.Response(
+            200,
+            json={"sucesso": True, "mensagem": "Ok", "metadata": None, "retorno": None},
+        )
+
+    httpx_mock.add_callback(
+        post_apontar,
+        url=re.compile(r".*/plano-de-corte/.*/apontar"),
+    )
+
+    return layouts_apontados
+
+
+@pytest.mark.anyio
+async def test_aponta_planos_em_paralelo(mock_login_sucess, mock_post_apontar):
+    from src.tx.tx import AsyncTx
+
+    codigos = ["PLAN0001", "PLAN0002", "PLAN0003"]
+
+    async with AsyncTx("http://192.168.3.15:6543/", "admin", "qwe123") as tx:
+        await asyncio.gather(
+            *(tx.plano_de_corte.apontar(codigo_layout=codigo) for codigo in codigos)
+        )
+
+    assert sorted(mock_post_apontar) == codigos
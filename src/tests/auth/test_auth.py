@@ -0,0 +1,54 @@
+import re
+
+import pytest
+from pytest_httpx import HTTPXMock
+
+
+@pytest.fixture
+def mock_post_apontar_token_expirado(httpx_mock: HTTPXMock):
+    url = re.compile(r".*/plano-de-corte/PLAN0001/apontar")
+
+    httpx_mock.add_response(url=url, status_code=401, json={"mensagem": "expirado"})
+    httpx_mock.add_response(
+        url=url,
+        status_code=200,
+        json={"sucesso": True, "mensagem": "Ok", "metadata": None, "retorno": None},
+    )
+
+    return True
+
+
+def test_reautentica_e_repete_requisicao_em_401(
+    httpx_mock: HTTPXMock, mock_login_sucess, mock_post_apontar_token_expirado
+):
+    from src.arguments import parse_args
+    from src.main import main
+
+    args = [
+        "--host",
+        "http://192.168.3.15:6543/",
+        "--user",
+        "admin",
+        "--password",
+        "qwe123",
+        "apontar-plano-de-corte",
+        "--cod-layout",
+        "PLAN0001",
+        "--tipo-apontamento",
+        "INICIO_OU_FIM",
+    ]
+
+    main(parse_args(args))
+
+    requests = httpx_mock.get_requests()
+
+    assert [request.url.path for request in requests] == [
+        "/auth/login",
+        "/plano-de-corte/PLAN0001/apontar",
+        "/auth/login",
+        "/plano-de-corte/PLAN0001/apontar",
+    ]
+    assert "Authorization" not in requests[0].headers
+    assert requests[-1].headers["Authorization"] == (
+        "Bearer fc174dab-6b0e-4705-bcd4-975760776572"
+    )
@@ -0,0 +1,79 @@
+import os
+import re
+import sys
+
+import pytest
+from pytest_httpx import HTTPXMock
+
+from src.tx.utils.token_cache import CacheToken
+
+URL_APONTAR = re.compile(r".*/plano-de-corte/PLAN0001/apontar")
+
+RESPOSTA_OK = {"sucesso": True, "mensagem": "Ok", "metadata": None, "retorno": None}
+
+
+def cria_tx(cache_token):
+    from src.tx.tx import Tx
+
+    return Tx("http://192.168.3.15:6543/", "admin", "qwe123", cache_token=cache_token)
+
+
+def test_reutiliza_token_em_cache(httpx_mock: HTTPXMock, mock_login_sucess, tmp_path):
+    cache_token = CacheToken(tmp_path / "token.json")
+
+    cria_tx(cache_token).close()
+
+    httpx_mock.add_response(url=URL_APONTAR, json=RESPOSTA_OK)
+
+    tx = cria_tx(cache_token)
+    tx.plano_de_corte.apontar("PLAN0001")
+    tx.close()
+
+    assert [request.url.path for request in httpx_mock.get_requests()] == [
+        "/auth/login",
+        "/plano-de-corte/PLAN0001/apontar",
+    ]
+
+
+def test_token_em_cache_recusado_faz_novo_login(
+    httpx_mock: HTTPXMock, mock_login_sucess, tmp_path
+):
+    cache_token = CacheToken(tmp_path / "token.json")
+
+    cria_tx(cache_token).close()
+
+    httpx_mock.add_response(url=URL_APONTAR, status_code=401)
+    httpx_mock.add_response(url=URL_APONTAR, json=RESPOSTA_OK)
+
+    tx = cria_tx(cache_token)
+    tx.plano_de_corte.apontar("PLAN0001")
+    tx.close()
+
+    assert [request.url.path for request in httpx_mock.get_requests()] == [
+        "/auth/login",
+        "/plano-de-corte/PLAN0001/apontar",
+        "/auth/login",
+        "/plano-de-corte/PLAN0001/apontar",
+    ]
+
+
+def test_salva_cache_sem_deixar_arquivos_temporarios(
+    httpx_mock: HTTPXMock, mock_login_sucess, tmp_path
+):
+    caminho = tmp_path / "token.json"
+
+    cria_tx(CacheToken(caminho)).close()
+
+    assert [arquivo.name for arquivo in tmp_path.iterdir()] == ["token.json"]
+    assert CacheToken(caminho).carregar("http://192.168.3.15:6543/", "admin")
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="permissões POSIX")
+def test_cache_somente_para_o_usuario(
+    httpx_mock: HTTPXMock, mock_login_sucess, tmp_path
+):
+    caminho = tmp_path / "token.json"
+
+    cria_tx(CacheToken(caminho)).close()
+
+    assert os.stat(caminho).st_mode & 0o777 == 0o600
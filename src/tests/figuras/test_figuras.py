@@ -0,0 +1,64 @@
+import base64
+import os
+import shutil
+from pathlib import Path
+
+from src import figuras
+from src.figuras import CacheFiguras, CarregadorFiguras
+
+figures_folder = Path(__file__).parent.parent / "novo-plano-de-corte/arquivos/figures"
+
+
+def test_carrega_figuras_em_paralelo(tmp_path):
+    carregador = CarregadorFiguras(figures_folder)
+
+    figuras = carregador.carrega_todas(["PLAN0001", "PLAN0002", "PLAN9999"])
+
+    assert figuras["PLAN0001"] == base64.b64encode(
+        (figures_folder / "PLAN0001.png").read_bytes()
+    ).decode("utf-8")
+    assert figuras["PLAN0002"] is not None
+    assert figuras["PLAN9999"] is None
+
+
+def test_sem_reducao_nao_usa_cache(tmp_path):
+    cache = CacheFiguras(tmp_path / "cache")
+    carregador = CarregadorFiguras(figures_folder, cache=cache)
+
+    assert carregador.carrega("PLAN0001") is not None
+    assert list((tmp_path / "cache").iterdir()) == []
+
+
+def test_reutiliza_figura_reduzida_sem_ler_o_png(tmp_path, monkeypatch):
+    diretorio = tmp_path / "figuras"
+    diretorio.mkdir()
+    figura = diretorio / "PLAN0001.png"
+    shutil.copy(figures_folder / "PLAN0001.png", figura)
+
+    leituras = []
+    le = CarregadorFiguras._le
+
+    def le_contando(figure_path):
+        leituras.append(figure_path)
+        return le(figure_path)
+
+    monkeypatch.setattr(figuras, "_pillow_disponivel", lambda: True)
+    monkeypatch.setattr(figuras, "reduz_png", lambda conteudo, max_bytes: b"PNG")
+    monkeypatch.setattr(CarregadorFiguras, "_le", staticmethod(le_contando))
+
+    carregador = CarregadorFiguras(
+        diretorio, max_bytes=10, cache=CacheFiguras(tmp_path / "cache")
+    )
+
+    assert base64.b64decode(carregador.carrega("PLAN0001")) == b"PNG"
+    assert len(leituras) == 1
+
+    # Um acerto no cache não abre o PNG
+    assert base64.b64decode(carregador.carrega("PLAN0001")) == b"PNG"
+    assert len(leituras) == 1
+
+    # A figura alterada é lida e reduzida novamente
+    os.utime(figura, ns=(0, 0))
+
+    assert base64.b64decode(carregador.carrega("PLAN0001")) == b"PNG"
+    assert len(leituras) == 2
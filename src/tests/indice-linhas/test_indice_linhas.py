@@ -0,0 +1,119 @@
+import os
+import sys
+
+from src.indice_linhas import (
+    FiltroBloom,
+    IndiceLinhas,
+    LinhasPorArquivo,
+    caminho_indice_padrao,
+    chave_arquivo,
+    digest_linha,
+)
+
+
+def test_filtro_bloom_nao_tem_falsos_negativos():
+    filtro = FiltroBloom(10_000)
+
+    for digest in range(-5_000, 5_000):
+        filtro.adiciona(digest * 7919)
+
+    assert all(digest * 7919 in filtro for digest in range(-5_000, 5_000))
+
+
+def test_digest_depende_do_arquivo_e_dos_campos():
+    assert digest_linha("a.csv", ["1", "2"]) == digest_linha("a.csv", ("1", "2"))
+    assert digest_linha("a.csv", ["1", "2"]) != digest_linha("b.csv", ["1", "2"])
+    assert digest_linha("a.csv", ["1", "2"]) != digest_linha("a.csv", ["12"])
+
+
+def test_indice_persiste_linhas_processadas(tmp_path):
+    with IndiceLinhas(tmp_path / "indice.db") as indice:
+        indice.adiciona("a.csv", [["08:00", "ORD1.mpr"]])
+
+        assert indice.contem("a.csv", ["08:00", "ORD1.mpr"])
+        assert not indice.contem("a.csv", ["08:01", "ORD2.mpr"])
+        assert not indice.contem("b.csv", ["08:00", "ORD1.mpr"])
+
+    with IndiceLinhas(tmp_path / "indice.db") as indice:
+        assert indice.contem("a.csv", ["08:00", "ORD1.mpr"])
+
+
+def test_arquivos_de_mesmo_nome_em_pastas_diferentes(tmp_path):
+    janeiro = chave_arquivo(tmp_path, tmp_path / "2024" / "01" / "maq_PROCESSADO.pro")
+    fevereiro = chave_arquivo(tmp_path, tmp_path / "2024" / "02" / "maq_PROCESSADO.pro")
+
+    assert janeiro == "2024/01/maq_PROCESSADO.pro"
+
+    with IndiceLinhas(tmp_path / "indice.db") as indice:
+        indice.adiciona(janeiro, [["08:00", "ORD1.mpr"]])
+        indice.importa(fevereiro, lambda: [])
+
+        assert indice.contem(janeiro, ["08:00", "ORD1.mpr"])
+        assert not indice.contem(fevereiro, ["08:00", "ORD1.mpr"])
+
+
+def test_indice_padrao_fica_fora_do_diretorio_monitorado(tmp_path, monkeypatch):
+    dados = tmp_path / "dados"
+    monkeypatch.setenv(
+        "LOCALAPPDATA" if sys.platform == "win32" else "XDG_DATA_HOME", str(dados)
+    )
+
+    caminho = caminho_indice_padrao(tmp_path / "maquina1")
+
+    assert dados in caminho.parents
+    assert caminho == caminho_indice_padrao(tmp_path / "maquina1")
+    assert caminho != caminho_indice_padrao(tmp_path / "maquina2")
+
+
+def test_importa_arquivo_de_processados_uma_vez(tmp_path):
+    leituras = []
+
+    def ler_linhas():
+        leituras.append(1)
+        return [["08:00", "ORD1.mpr"], ["08:01", "ORD2.mpr"]]
+
+    with IndiceLinhas(tmp_path / "indice.db") as indice:
+        indice.importa("a.csv", ler_linhas)
+        indice.importa("a.csv", ler_linhas)
+
+        assert indice.contem("a.csv", ["08:01", "ORD2.mpr"])
+
+    with IndiceLinhas(tmp_path / "indice.db") as indice:
+        indice.importa("a.csv", ler_linhas)
+
+    assert len(leituras) == 1
+
+
+def test_linhas_por_arquivo_rele_somente_arquivos_alterados(tmp_path):
+    lidos = []
+
+    def ler_linhas(arquivo):
+        lidos.append(arquivo.name)
+        return [linha.split(",") for linha in arquivo.read_text().splitlines()]
+
+    a = tmp_path / "a_COM_ERRO.pro"
+    b = tmp_path / "b_COM_ERRO.pro"
+    a.write_text("08:00,ORD1\n")
+    b.write_text("08:00,ORD1\n08:01,ORD2\n")
+
+    linhas = LinhasPorArquivo(ler_linhas)
+    linhas.atualiza([a, b])
+    linhas.atualiza([a, b])
+
+    assert sorted(lidos) == ["a_COM_ERRO.pro", "b_COM_ERRO.pro"]
+    assert ["08:01", "ORD2"] in linhas
+
+    b.write_text("08:00,ORD1\n")
+    os.utime(b, ns=(0, 0))
+    linhas.atualiza([a, b])
+
+    assert lidos[-1] == "b_COM_ERRO.pro"
+    assert ["08:01", "ORD2"] not in linhas
+    assert ["08:00", "ORD1"] in linhas
+
+    # A linha continua presente enquanto algum arquivo a contiver
+    b.unlink()
+    linhas.atualiza([a])
+
+    assert ["08:00", "ORD1"] in linhas
+    assert len(linhas) == 1
@@ -0,0 +1,84 @@
+import os
+
+from src.leitor_incremental import CheckpointLeitura, LeitorIncremental
+
+
+def _leitor(tmp_path, **kwargs):
+    return LeitorIncremental(
+        CheckpointLeitura(tmp_path / "_CHECKPOINT_TEMPOX.json"), **kwargs
+    )
+
+
+def test_le_somente_linhas_acrescentadas(tmp_path):
+    arquivo = tmp_path / "WorkRecord_1.csv"
+    arquivo.write_bytes(b"codigo;qtd\nORD1;1\n")
+
+    leitor = _leitor(tmp_path)
+    leitura = leitor.ler(arquivo)
+
+    assert leitura.cabecalho == "codigo;qtd"
+    assert leitura.linhas == ["ORD1;1"]
+
+    leitor.confirmar(leitura)
+
+    with open(arquivo, "ab") as f:
+        f.write(b"ORD2;1\nORD3;")
+
+    # Um novo leitor continua do checkpoint gravado em disco
+    leitor = _leitor(tmp_path)
+    leitura = leitor.ler(arquivo)
+
+    assert leitura.cabecalho == "codigo;qtd"
+    # A última linha ainda não terminou de ser gravada
+    assert leitura.linhas == ["ORD2;1"]
+
+    leitor.confirmar(leitura)
+
+    with open(arquivo, "ab") as f:
+        f.write(b"1\n")
+
+    assert leitor.ler(arquivo).linhas == ["ORD3;1"]
+
+
+def test_sem_confirmar_le_as_mesmas_linhas(tmp_path):
+    arquivo = tmp_path / "WorkRecord_1.csv"
+    arquivo.write_bytes(b"codigo;qtd\nORD1;1\n")
+
+    leitor = _leitor(tmp_path)
+    leitor.ler(arquivo)
+
+    assert leitor.ler(arquivo).linhas == ["ORD1;1"]
+
+
+def test_arquivo_em_utf16_com_remocao_de_nulos(tmp_path):
+    arquivo = tmp_path / "WorkRecord_1.csv"
+    arquivo.write_bytes("codigo;qtd\r\nORD1;1\r\n".encode("utf-16"))
+
+    leitor = _leitor(tmp_path, erros="ignore", remover_nulos=True)
+    leitura = leitor.ler(arquivo)
+    leitor.confirmar(leitura)
+
+    assert leitura.cabecalho == "codigo;qtd"
+    assert leitura.linhas == ["ORD1;1"]
+
+    with open(arquivo, "ab") as f:
+        f.write("ORD2;1\r\n".encode("utf-16-le"))
+
+    leitura = leitor.ler(arquivo)
+
+    assert leitura.cabecalho == "codigo;qtd"
+    assert leitura.linhas == ["ORD2;1"]
+
+
+def test_arquivo_substituido_e_lido_do_inicio(tmp_path):
+    arquivo = tmp_path / "WorkRecord_1.csv"
+    arquivo.write_bytes(b"codigo;qtd\nORD1;1\nORD2;1\n")
+
+    leitor = _leitor(tmp_path)
+    leitor.confirmar(leitor.ler(arquivo))
+
+    novo = tmp_path / "novo.csv"
+    novo.write_bytes(b"codigo;qtd\nORD9;1\n")
+    os.replace(novo, arquivo)
+
+    assert leitor.ler(arquivo).linhas == ["ORD9;1"]
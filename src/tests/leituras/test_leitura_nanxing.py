@@ -0,0 +1,34 @@
+from types import SimpleNamespace
+
+from src.outbox import ENVIADO, TIPO_LEITURA, Outbox
+from src.subcommands.apontar_leitura_furadeira_nanxing import processar_com_outbox
+from src.tx.modules.leituras.types import ResultadoLeitura
+
+
+def test_envia_somente_linhas_novas_do_work_record(tmp_path):
+    arquivo = tmp_path / "WorkRecord_1.csv"
+    arquivo.write_bytes("Hora,Programa\r\n08:00,ORD0001.mpr\r\n".encode("utf-16"))
+
+    enviadas = []
+
+    def nova_leituras_em_lote(leituras, **kwargs):
+        enviadas.extend(leitura.codigo for leitura in leituras)
+        return [ResultadoLeitura(leitura=leitura, sucesso=True) for leitura in leituras]
+
+    tx = SimpleNamespace(
+        leitura=SimpleNamespace(nova_leituras_em_lote=nova_leituras_em_lote)
+    )
+    outbox = Outbox(tmp_path / "outbox.db")
+
+    processar_com_outbox(tmp_path, outbox, tx, 1, 5)
+
+    with open(arquivo, "ab") as f:
+        f.write("08:01,ORD0002.mpr\r\n".encode("utf-16-le"))
+
+    processar_com_outbox(tmp_path, outbox, tx, 1, 5)
+
+    assert enviadas == ["ORD0001", "ORD0002"]
+    assert outbox.contar(TIPO_LEITURA, ENVIADO) == 2
+    assert arquivo.exists()
+
+    outbox.close()
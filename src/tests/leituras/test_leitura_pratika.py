@@ -0,0 +1,45 @@
+from types import SimpleNamespace
+
+from src.outbox import ENVIADO, TIPO_LEITURA, Outbox
+from src.subcommands.apontar_leitura_furadeira_scm_pratika import (
+    extrair_ord,
+    processar_com_outbox,
+)
+from src.tx.modules.leituras.types import ResultadoLeitura
+
+
+def test_extrair_ord():
+    assert extrair_ord('"D:\\Programas\\ORD0001.pgmx"') == "ORD0001"
+    assert extrair_ord(" ORD0002.pgmx ") == "ORD0002"
+    assert extrair_ord("D:\\Programas\\") == ""
+
+
+def test_envia_somente_linhas_novas_do_pro(tmp_path):
+    pasta_ano = tmp_path / "2025"
+    pasta_ano.mkdir()
+    arquivo_pro = pasta_ano / "20250101.pro"
+    arquivo_pro.write_bytes(b"Data,Programa\r\n08:00,D:\\Programas\\ORD0001.pgmx\r\n")
+
+    enviadas = []
+
+    def nova_leituras_em_lote(leituras, **kwargs):
+        enviadas.extend(leitura.codigo for leitura in leituras)
+        return [ResultadoLeitura(leitura=leitura, sucesso=True) for leitura in leituras]
+
+    tx = SimpleNamespace(
+        leitura=SimpleNamespace(nova_leituras_em_lote=nova_leituras_em_lote)
+    )
+    outbox = Outbox(tmp_path / "outbox.db")
+
+    processar_com_outbox(tmp_path, outbox, tx, 1, 5)
+
+    with open(arquivo_pro, "ab") as f:
+        f.write(b"08:01,D:\\Programas\\ORD0002.pgmx\r\n08:02,D:\\Progr")
+
+    processar_com_outbox(tmp_path, outbox, tx, 1, 5)
+
+    assert enviadas == ["ORD0001", "ORD0002"]
+    assert outbox.contar(TIPO_LEITURA, ENVIADO) == 2
+    assert arquivo_pro.exists()
+
+    outbox.close()
@@ -0,0 +1,161 @@
+import json
+import re
+
+import httpx
+import pytest
+from pytest_httpx import HTTPXMock
+
+from src.tx.modules.leituras.types import LeiturasPost
+
+
+@pytest.fixture
+def leituras():
+    return [
+        LeiturasPost(id_recurso=1, codigo=codigo, qtd=1, leitura_manual=False)
+        for codigo in ["ORD0001", "ORD0002", "ORD0003"]
+    ]
+
+
+@pytest.fixture
+def tx(mock_login_sucess):
+    from src.tx.tx import Tx
+
+    return Tx("http://192.168.3.15:6543/", "admin", "qwe123")
+
+
+def test_envia_leituras_em_uma_requisicao(httpx_mock: HTTPXMock, tx, leituras):
+    def post_leituras_lote(request: httpx.Request):
+        body = json.loads(request.content)
+
+        assert [leitura["codigo"] for leitura in body["leituras"]] == [
+            "ORD0001",
+            "ORD0002",
+            "ORD0003",
+        ]
+
+        return httpx.Response(
+            200,
+            json={
+                "sucesso": True,
+                "mensagem": "Ok",
+                "metadata": None,
+                "retorno": [
+                    {"sucesso": True, "mensagem": None},
+                    {"sucesso": False, "mensagem": "Ordem não encontrada"},
+                    {"sucesso": True, "mensagem": None},
+                ],
+            },
+        )
+
+    httpx_mock.add_callback(post_leituras_lote, url=re.compile(r".*/leituras/lote"))
+
+    resultados = tx.leitura.nova_leituras_em_lote(leituras)
+
+    assert [resultado.sucesso for resultado in resultados] == [True, False, True]
+    assert resultados[1].leitura.codigo == "ORD0002"
+    assert resultados[1].mensagem == "Ordem não encontrada"
+
+
+def test_envia_individualmente_sem_rota_de_lote(httpx_mock: HTTPXMock, tx, leituras):
+    httpx_mock.add_response(url=re.compile(r".*/leituras/lote"), status_code=404)
+
+    def post_leitura(request: httpx.Request):
+        if json.loads(request.content)["codigo"] == "ORD0002":
+            return httpx.Response(422, json={"mensagem": "Ordem não encontrada"})
+
+        return httpx.Response(
+            200,
+            json={"sucesso": True, "mensagem": "Ok", "metadata": None, "retorno": None},
+        )
+
+    httpx_mock.add_callback(post_leitura, url=re.compile(r".*/leituras$"))
+
+    resultados = tx.leitura.nova_leituras_em_lote(leituras)
+
+    assert [resultado.sucesso for resultado in resultados] == [True, False, True]
+    assert "Ordem não encontrada" in resultados[1].mensagem
+
+    # A rota de lote não é consultada novamente
+    tx.leitura.nova_leituras_em_lote(leituras[:1])
+
+    lote_requests = [
+        request
+        for request in httpx_mock.get_requests()
+        if request.url.path.endswith("/lote")
+    ]
+    assert len(lote_requests) == 1
+
+
+def test_lote_com_timeout_de_leitura_fica_incerto(httpx_mock: HTTPXMock, tx, leituras):
+    httpx_mock.add_exception(
+        httpx.ReadTimeout("timeout"), url=re.compile(r".*/leituras/lote")
+    )
+
+    resultados = tx.leitura.nova_leituras_em_lote(leituras)
+
+    # A API pode ter gravado o lote, então nada é reenviado
+    assert all(not r.sucesso and r.incerto for r in resultados)
+    assert len(httpx_mock.get_requests(url=re.compile(r".*/leituras/lote"))) == 1
+
+
+@pytest.mark.parametrize(
+    "resposta, incerto",
+    [
+        pytest.param({"status_code": 500}, True, id="500"),
+        pytest.param({"status_code": 502}, True, id="502"),
+        pytest.param(
+            {"status_code": 503, "headers": {"Retry-After": "0"}},
+            False,
+            id="503-retry-after",
+        ),
+        pytest.param({"status_code": 403}, False, id="403"),
+    ],
+)
+def test_lote_com_erro_do_servidor_fica_incerto(
+    httpx_mock: HTTPXMock, tx, leituras, resposta, incerto
+):
+    httpx_mock.add_response(url=re.compile(r".*/leituras/lote"), **resposta)
+
+    resultados = tx.leitura.nova_leituras_em_lote(leituras)
+
+    # Um 5xx pode ter chegado depois de a API gravar o lote
+    assert all(not r.sucesso and r.incerto == incerto for r in resultados)
+    assert not httpx_mock.get_requests(url=re.compile(r".*/leituras$"))
+
+
+def test_circuit_breaker_aberto_mantem_leituras_ja_enviadas(
+    httpx_mock: HTTPXMock, mock_login_sucess, leituras
+):
+    from src.tx.tx import Tx
+    from src.tx.utils.retry import CircuitBreaker, PoliticaRetry
+
+    tx = Tx(
+        "http://192.168.3.15:6543/",
+        "admin",
+        "qwe123",
+        politica_retry=PoliticaRetry(max_tentativas=1),
+        circuit_breaker=CircuitBreaker(limite_falhas=1, tempo_aberto=60),
+    )
+
+    httpx_mock.add_response(url=re.compile(r".*/leituras/lote"), status_code=404)
+
+    def post_leitura(request: httpx.Request):
+        if json.loads(request.content)["codigo"] == "ORD0002":
+            return httpx.Response(
+                503, headers={"Retry-After": "0"}, json={"mensagem": "Indisponível"}
+            )
+
+        return httpx.Response(
+            200,
+            json={"sucesso": True, "mensagem": "Ok", "metadata": None, "retorno": None},
+        )
+
+    httpx_mock.add_callback(post_leitura, url=re.compile(r".*/leituras$"))
+
+    resultados = tx.leitura.nova_leituras_em_lote(leituras, concorrencia=1)
+
+    assert [r.sucesso for r in resultados] == [True, False, False]
+    assert not any(r.incerto for r in resultados)
+    # A terceira leitura não chegou a ser enviada
+    assert [r.enviada for r in resultados] == [True, True, False]
+    assert len(httpx_mock.get_requests(url=re.compile(r".*/leituras$"))) == 2
@@ -0,0 +1,113 @@
+import json
+
+import httpx
+import pytest
+from pytest_httpx import HTTPXMock
+
+from src.tx.modules.cliente import Cliente
+
+URL = "http://192.168.3.15:6543/cliente/ordem"
+
+
+def ordens(*ids):
+    return [
+        {"id_ordem": id_ordem, "roteiros": [], "ids_unicos": []} for id_ordem in ids
+    ]
+
+
+def ids_enviados(request: httpx.Request):
+    return [ordem["id_ordem"] for ordem in json.loads(request.read())["ordens"]]
+
+
+def test_isola_ordens_recusadas(httpx_mock: HTTPXMock, tmp_path):
+    def post_cliente_ordem(request: httpx.Request):
+        if 3 in ids_enviados(request):
+            return httpx.Response(400, json={"detail": "Ordem 3 inválida"})
+
+        return httpx.Response(
+            200,
+            json={"sucesso": True, "mensagem": "Ok", "metadata": None, "retorno": None},
+        )
+
+    httpx_mock.add_callback(post_cliente_ordem, url=URL)
+
+    with httpx.Client(base_url="http://192.168.3.15:6543") as client:
+        resultado = Cliente(client).nova_ordem_em_lotes(
+            ordens(1, 2, 3, 4, 5), tamanho_lote=4, concorrencia=2
+        )
+
+    assert sorted(resultado.aceitas) == [1, 2, 4, 5]
+    assert list(resultado.rejeitadas) == [3]
+
+    resultado.salvar(tmp_path / "resultado.json")
+
+    salvo = json.loads((tmp_path / "resultado.json").read_text())
+
+    assert sorted(salvo["aceitas"]) == [1, 2, 4, 5]
+    assert [ordem["id_ordem"] for ordem in salvo["rejeitadas"]] == [3]
+
+
+def test_reenvia_lote_com_falha(httpx_mock: HTTPXMock):
+    httpx_mock.add_response(url=URL, status_code=404)
+    httpx_mock.add_response(
+        url=URL,
+        json={"sucesso": True, "mensagem": "Ok", "metadata": None, "retorno": None},
+    )
+
+    with httpx.Client(base_url="http://192.168.3.15:6543") as client:
+        resultado = Cliente(client).nova_ordem_em_lotes(
+            ordens(1, 2), tamanho_lote=2, concorrencia=1
+        )
+
+    assert resultado.aceitas == [1, 2]
+    assert not resultado.rejeitadas
+    assert len(httpx_mock.get_requests()) == 2
+
+
+@pytest.mark.parametrize(
+    "falha",
+    [
+        pytest.param({"status_code": 500}, id="500"),
+        pytest.param({"exception": httpx.ReadTimeout("timeout")}, id="read-timeout"),
+    ],
+)
+def test_nao_reenvia_lote_que_pode_ter_sido_gravado(
+    httpx_mock: HTTPXMock, tmp_path, falha
+):
+    if "exception" in falha:
+        httpx_mock.add_exception(falha["exception"], url=URL)
+    else:
+        httpx_mock.add_response(url=URL, **falha)
+
+    with httpx.Client(base_url="http://192.168.3.15:6543") as client:
+        resultado = Cliente(client).nova_ordem_em_lotes(
+            ordens(1, 2), tamanho_lote=2, concorrencia=1
+        )
+
+    assert len(httpx_mock.get_requests()) == 1
+    assert not resultado.aceitas
+    assert not resultado.rejeitadas
+    assert sorted(resultado.incertas) == [1, 2]
+
+    resultado.salvar(tmp_path / "resultado.json")
+
+    salvo = json.loads((tmp_path / "resultado.json").read_text())
+
+    assert [ordem["id_ordem"] for ordem in salvo["incertas"]] == [1, 2]
+
+
+def test_reenvia_lote_nao_processado(httpx_mock: HTTPXMock):
+    httpx_mock.add_response(url=URL, status_code=429)
+    httpx_mock.add_response(
+        url=URL,
+        json={"sucesso": True, "mensagem": "Ok", "metadata": None, "retorno": None},
+    )
+
+    with httpx.Client(base_url="http://192.168.3.15:6543") as client:
+        resultado = Cliente(client).nova_ordem_em_lotes(
+            ordens(1, 2), tamanho_lote=2, concorrencia=1
+        )
+
+    assert resultado.aceitas == [1, 2]
+    assert not resultado.incertas
+    assert len(httpx_mock.get_requests()) == 2
@@ -0,0 +1,78 @@
+import json
+from argparse import Namespace
+from pathlib import Path
+
+import pytest
+
+from src.subcommands.nova_ordem import parse_files, parse_files_em_disco
+
+current_dir = Path(__file__).parent
+
+
+def argumentos(ordens, roteiros, ids_unicos, linhas_por_bloco=2):
+    return Namespace(
+        ordens_file=open(ordens),
+        roteiros_file=open(roteiros),
+        ids_unicos_file=open(ids_unicos),
+        linhas_por_bloco=linhas_por_bloco,
+    )
+
+
+def test_juncao_em_disco_igual_a_em_memoria():
+    files_folder = current_dir / "arquivos"
+    arquivos = (
+        files_folder / "ordens.csv",
+        files_folder / "roteiros.csv",
+        files_folder / "ids-unicos.csv",
+    )
+
+    em_memoria = [ordem.model_dump() for ordem in parse_files(argumentos(*arquivos))]
+
+    # Blocos de 2 linhas forçam a intercalação de vários blocos em disco
+    with parse_files_em_disco(argumentos(*arquivos)) as em_disco:
+        assert len(em_disco) == 2
+        assert json.dumps(list(em_disco)) == json.dumps(em_memoria)
+
+
+@pytest.mark.parametrize("funcao", [parse_files, parse_files_em_disco])
+def test_lista_todas_as_ordens_nao_encontradas(tmp_path, funcao):
+    ordens = tmp_path / "ordens.csv"
+    roteiros = tmp_path / "roteiros.csv"
+    ids_unicos = tmp_path / "ids-unicos.csv"
+
+    ordens.write_text(
+        "id_ordem;item_codigo;item_mascara;quantidade_ordem\n1002;ITEM1002;MASC1002;1\n"
+    )
+    roteiros.write_text(
+        "id_ordem;sequencia_operacao;codigo_operacao;id_setor\n"
+        "1001;10;BOR1;2\n"
+        "1002;10;BOR1;2\n"
+        "1003;10;BOR1;2\n"
+        "1003;20;BOR2;2\n"
+    )
+    ids_unicos.write_text("id_ordem;id_unico_peca\n1004;1\n1002;2\n")
+
+    with pytest.raises(Exception) as exc_info:
+        funcao(argumentos(ordens, roteiros, ids_unicos))
+
+    mensagem = str(exc_info.value)
+
+    assert "3 roteiros de 2 ordens: 1001, 1003" in mensagem
+    assert "1 ids únicos de 1 ordens: 1004" in mensagem
+
+
+def test_informa_linha_invalida(tmp_path):
+    ordens = tmp_path / "ordens.csv"
+    vazio = tmp_path / "vazio.csv"
+
+    ordens.write_text(
+        "id_ordem;item_codigo;item_mascara;quantidade_ordem\n"
+        "1001;ITEM1001;MASC1001;1\n"
+        "1002;ITEM1002;MASC1002;um\n"
+    )
+    vazio.write_text("id_ordem;id_unico_peca\n")
+
+    with pytest.raises(Exception, match="linha 3") as exc_info:
+        parse_files(argumentos(ordens, vazio, vazio))
+
+    assert "quantidade_ordem" in str(exc_info.value)
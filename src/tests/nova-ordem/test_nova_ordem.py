@@ -1,3 +1,4 @@
+import gzip
 import re
 from pathlib import Path
 
@@ -14,7 +15,7 @@ def mock_post_cliente_ordem(httpx_mock: HTTPXMock):
         valid_request_content = (current_dir / "valid_request_content.json").read_text()
 
         assert (
-            request.content.decode("utf-8") == valid_request_content
+            request.read().decode("utf-8") == valid_request_content
         ), "Request content is not as expected. "
 
         return httpx.Response(
@@ -55,3 +56,65 @@ def test_envia_nova_ordem(mock_login_sucess, mock_post_cliente_ordem):
     parsed_args = parse_args(args)
 
     main(parsed_args)
+
+
+def test_envia_nova_ordem_comprimida(httpx_mock: HTTPXMock, mock_login_sucess):
+    from src.arguments import parse_args
+    from src.main import main
+
+    httpx_mock.add_response(
+        url=re.compile(r".*/cliente/ordem"),
+        json={"sucesso": True, "mensagem": "Ok", "metadata": None, "retorno": None},
+    )
+
+    files_folder = current_dir / "arquivos"
+
+    args = [
+        "--host",
+        "http://192.168.3.15:6543/",
+        "--user",
+        "admin",
+        "--password",
+        "qwe123",
+        "--compressao",
+        "gzip",
+        "nova-ordem",
+        "--ordens-file",
+        str(files_folder / "ordens.csv"),
+        "--roteiros-file",
+        str(files_folder / "roteiros.csv"),
+        "--ids-unicos-file",
+        str(files_folder / "ids-unicos.csv"),
+    ]
+
+    main(parse_args(args))
+
+    request = httpx_mock.get_requests(url=re.compile(r".*/cliente/ordem"))[0]
+
+    assert request.headers["Content-Encoding"] == "gzip"
+    assert gzip.decompress(request.read()).decode("utf-8") == (
+        (current_dir / "valid_request_content.json").read_text()
+    )
+
+
+def test_envia_sem_compressao_quando_recusada(httpx_mock: HTTPXMock):
+    from src.tx.utils.compressao import CompressorCorpo
+    from src.tx.utils.corpo_json import CorpoJson
+
+    url = "http://192.168.3.15:6543/cliente/ordem"
+
+    httpx_mock.add_response(url=url, status_code=415)
+    httpx_mock.add_response(url=url, status_code=200)
+
+    compressor = CompressorCorpo("gzip")
+
+    with httpx.Client() as client:
+        response = compressor.post(client, url, CorpoJson("ordens", []))
+
+    assert response.status_code == 200
+    assert compressor.compressao is None
+
+    requests = httpx_mock.get_requests()
+
+    assert requests[0].headers["Content-Encoding"] == "gzip"
+    assert "Content-Encoding" not in requests[1].headers
@@ -0,0 +1,110 @@
+import json
+import re
+
+import httpx
+import pytest
+from pytest_httpx import HTTPXMock
+
+from src.tx.exceptions import MesApiError
+from src.tx.modules.plano_de_corte.partes import ProgressoEnvio, divide_em_partes
+from src.tx.modules.plano_de_corte.types import PlanoDeCorteCreateModel
+
+URL_PROJETO = re.compile(r".*/plano-de-corte/projeto")
+
+
+def cria_plano(codigo_layout: str):
+    return PlanoDeCorteCreateModel(
+        codigo_layout=codigo_layout,
+        descricao_material="MDF",
+        id_recurso=1,
+        mm_comp_linear=14920,
+        mm_comprimento=2750,
+        mm_largura=1850,
+        nome_projeto="PROJETO001",
+        perc_aproveitamento=26.6,
+        perc_sobras=70.4,
+        tipo="chapa",
+        codigo_lote="LOTE001",
+        qtd_chapas=1,
+        tempo_estimado_seg=181.4,
+        qtd_recortes=0,
+        qtd_separacao_automatica=0,
+        qtd_separacao_manual=0,
+    )
+
+
+def test_divide_em_partes_pelo_tamanho_do_json():
+    planos = [cria_plano(f"PLAN{i:04d}") for i in range(1, 6)]
+    tamanho_plano = len(planos[0].model_dump_json())
+
+    partes = divide_em_partes(planos, max_bytes=tamanho_plano * 2)
+
+    assert [len(parte.planos) for parte in partes] == [2, 2, 1]
+    assert [parte.tamanho for parte in partes] == [
+        tamanho_plano * 2,
+        tamanho_plano * 2,
+        tamanho_plano,
+    ]
+    assert json.loads(b"".join(partes[0].body)) == {
+        "planos": [plano.model_dump(mode="json") for plano in planos[:2]]
+    }
+
+    # O hash depende somente do conteúdo da parte
+    assert [parte.hash for parte in divide_em_partes(planos, max_planos=2)] == [
+        parte.hash for parte in partes
+    ]
+    assert len({parte.hash for parte in partes}) == 3
+
+
+def test_retoma_envio_a_partir_das_partes_pendentes(
+    httpx_mock: HTTPXMock, mock_login_sucess, tmp_path
+):
+    from src.tx.tx import Tx
+
+    recebidos = []
+    falhas = []
+
+    def post_projeto(request: httpx.Request):
+        codigos = [
+            plano["codigo_layout"] for plano in json.loads(request.read())["planos"]
+        ]
+        recebidos.append(codigos)
+
+        # A parte com o PLAN0003 falha somente na primeira vez
+        if "PLAN0003" in codigos and not falhas:
+            falhas.append(codigos)
+            return httpx.Response(400, json={"mensagem": "Layout inválido"})
+
+        return httpx.Response(
+            200,
+            json={"sucesso": True, "mensagem": "Ok", "metadata": None, "retorno": None},
+        )
+
+    httpx_mock.add_callback(post_projeto, url=URL_PROJETO)
+
+    planos = [cria_plano(f"PLAN{i:04d}") for i in range(1, 6)]
+    arquivo_progresso = tmp_path / "progresso.json"
+
+    tx = Tx("http://192.168.3.15:6543/", "admin", "qwe123")
+
+    with pytest.raises(MesApiError):
+        tx.plano_de_corte.novo_projeto_em_partes(
+            planos, max_planos=2, progresso=ProgressoEnvio(arquivo_progresso)
+        )
+
+    assert sorted(recebidos) == [
+        ["PLAN0001", "PLAN0002"],
+        ["PLAN0003", "PLAN0004"],
+        ["PLAN0005"],
+    ]
+    assert arquivo_progresso.exists()
+
+    recebidos.clear()
+
+    tx.plano_de_corte.novo_projeto_em_partes(
+        planos, max_planos=2, progresso=ProgressoEnvio(arquivo_progresso)
+    )
+    tx.close()
+
+    assert recebidos == [["PLAN0003", "PLAN0004"]]
+    assert not arquivo_progresso.exists()
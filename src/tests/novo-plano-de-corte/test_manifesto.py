@@ -0,0 +1,75 @@
+import json
+import re
+
+from pytest_httpx import HTTPXMock
+
+URL_PROJETO = re.compile(r".*/plano-de-corte/projeto")
+
+CABECALHO_PLANOS = (
+    "codigo_layout,qtd_chapas,perc_aproveitamento,perc_sobras,tempo_estimado_seg,"
+    "descricao_material,id_recurso,mm_comprimento,mm_largura,mm_comp_linear,"
+    "nome_projeto,codigo_lote,tipo,qtd_separacao_manual,qtd_separacao_automatica"
+)
+CABECALHO_PECAS = (
+    "id_ordem,id_unico_peca,codigo_layout,qtd_cortada_no_layout,"
+    "tempo_corte_segundos,recorte,id_retrabalho"
+)
+
+
+def envia(tmp_path, pecas):
+    from src.arguments import parse_args
+    from src.main import main
+
+    layouts_file = tmp_path / "planos.csv"
+    parts_file = tmp_path / "pecas.csv"
+
+    layouts_file.write_text(
+        "\n".join(
+            [
+                CABECALHO_PLANOS,
+                "PLAN0001,1,26.6,70.4,181.4,MDF,1,2750,1850,14920,P,L,chapa,0,1",
+                "PLAN0002,1,26.6,70.4,181.4,MDF,1,2750,1850,14920,P,L,chapa,0,1",
+            ]
+        )
+    )
+    parts_file.write_text("\n".join([CABECALHO_PECAS, *pecas]))
+
+    args = [
+        "--host",
+        "http://192.168.3.15:6543/",
+        "--user",
+        "admin",
+        "--password",
+        "qwe123",
+        "novo-plano-de-corte",
+        "--layouts-file",
+        str(layouts_file),
+        "--parts-file",
+        str(parts_file),
+        "--figures-directory",
+        str(tmp_path),
+        "--manifesto",
+        str(tmp_path / "manifesto.json"),
+    ]
+
+    main(parse_args(args))
+
+
+def test_envia_somente_planos_novos_ou_alterados(
+    httpx_mock: HTTPXMock, mock_login_sucess, tmp_path
+):
+    httpx_mock.add_response(
+        url=URL_PROJETO,
+        json={"sucesso": True, "mensagem": "Ok", "metadata": None, "retorno": None},
+    )
+
+    envia(tmp_path, ["10001,,PLAN0001,1,10.5,0,", "10002,,PLAN0002,1,10.5,0,"])
+    envia(tmp_path, ["10001,,PLAN0001,1,10.5,0,", "10002,,PLAN0002,2,10.5,0,"])
+    envia(tmp_path, ["10001,,PLAN0001,1,10.5,0,", "10002,,PLAN0002,2,10.5,0,"])
+
+    enviados = [
+        [plano["codigo_layout"] for plano in json.loads(request.read())["planos"]]
+        for request in httpx_mock.get_requests(url=URL_PROJETO)
+    ]
+
+    assert enviados == [["PLAN0001", "PLAN0002"], ["PLAN0002"]]
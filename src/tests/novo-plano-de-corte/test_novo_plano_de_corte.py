@@ -14,7 +14,7 @@ def mock_post_plano_de_corte(httpx_mock: HTTPXMock):
         valid_request_content = (current_dir / "valid_request_content.json").read_text()
 
         assert (
-            request.content.decode("utf-8") == valid_request_content
+            request.read().decode("utf-8") == valid_request_content
         ), "Request content is not as expected. "
 
         return httpx.Response(
@@ -0,0 +1,126 @@
+import pytest
+
+from src.ardis import LeitorOtimizacao, le_secoes
+from src.tx.modules.plano_de_corte.types import TipoMateriaPrima
+
+OTIMIZACAO = """[PROJECT]
+Name=4432_SEC_MDP_BRAN_15_2
+[PROJECT]
+
+[MAT-1]
+MAT=CHAPA MDP BP 2F 15 MM BRAN
+[MAT-1]
+
+[ISTK-1]
+L=739
+B=340
+REF=LATERAL
+MATNR=1
+EXT01=146221376
+EXT02=ORD9004609
+EXT21=146221376
+[ISTK-1]
+
+[ISTK-2]
+L=500
+B=300
+REF=Sobras
+MATNR=1
+[ISTK-2]
+
+[LAYSTK-1]
+STKNR=1
+AANT=2
+LayPartCutTime=56.5
+
+STKNR=2
+AANT=1
+LayPartCutTime=0
+[LAYSTK-1]
+
+[ISTD-1]
+L=2750
+B=1850
+MATNR=1
+BEM=900707;11089168;BP 2F;BRAN;MDP
+[ISTD-1]
+
+[LAYOUTS-1]
+STDNR=1
+L=2750
+B=1850
+AANT=3
+NETTOPP=4000000
+VERLOPP=100000
+BOORDOPP=200000
+BRUTOPP=5000000
+WERKTIJD=293.5
+SNLL1=16500
+SNLD2=990
+LayRemark1=4432
+LayRemark4=193
+[LAYOUTS-1]
+"""
+
+
+@pytest.fixture
+def arquivo_otimizacao(tmp_path):
+    caminho = tmp_path / "otimizacao.R41"
+    caminho.write_bytes(OTIMIZACAO.replace("\n", "\r\n").encode("latin1"))
+
+    return caminho
+
+
+def test_le_secoes_com_varios_registros(arquivo_otimizacao):
+    secoes = {
+        (nome, indice): registros
+        for nome, indice, registros in le_secoes(arquivo_otimizacao)
+    }
+
+    assert secoes[("PROJECT", None)] == [{"Name": "4432_SEC_MDP_BRAN_15_2"}]
+    assert [registro["STKNR"] for registro in secoes[("LAYSTK", 1)]] == ["1", "2"]
+
+
+def test_monta_planos_a_partir_da_otimizacao(arquivo_otimizacao):
+    (plano,) = LeitorOtimizacao(id_recurso=2).le(arquivo_otimizacao)
+
+    assert plano.codigo_layout == "4432I193L1-"
+    assert plano.descricao_material == "CHAPA MDP BP 2F 15 MM BRAN"
+    assert plano.nome_projeto == "4432_SEC_MDP_BRAN_15_2"
+    assert plano.codigo_lote == "4432"
+    assert plano.id_recurso == 2
+    assert plano.qtd_chapas == 3
+    assert plano.mm_comprimento == 2750
+    assert plano.mm_largura == 1850
+    assert plano.mm_comp_linear == 17490
+    assert plano.perc_aproveitamento == 80
+    assert plano.perc_sobras == pytest.approx(14)
+    assert plano.tempo_estimado_seg == 293.5
+    assert plano.tipo == TipoMateriaPrima.chapa
+    assert plano.qtd_recortes == 1
+
+    (peca,) = plano.pecas
+
+    assert peca.id_ordem == 9004609
+    assert peca.id_unico_peca == 146221376
+    assert peca.qtd_cortada_no_layout == 2
+    assert peca.tempo_corte_segundos == 56.5
+
+
+def test_otimizacao_exige_id_recurso(arquivo_otimizacao):
+    from src.arguments import parse_args
+
+    with pytest.raises(SystemExit):
+        parse_args(
+            [
+                "--host",
+                "http://192.168.3.15:6543/",
+                "--user",
+                "admin",
+                "--password",
+                "qwe123",
+                "novo-plano-de-corte",
+                "--otimizacao-file",
+                str(arquivo_otimizacao),
+            ]
+        )
@@ -0,0 +1,94 @@
+from argparse import Namespace
+
+import pytest
+
+CABECALHO_PLANOS = (
+    "codigo_layout,qtd_chapas,perc_aproveitamento,perc_sobras,tempo_estimado_seg,"
+    "descricao_material,id_recurso,mm_comprimento,mm_largura,mm_comp_linear,"
+    "nome_projeto,codigo_lote,tipo,qtd_separacao_manual,qtd_separacao_automatica"
+)
+CABECALHO_PECAS = (
+    "id_ordem,id_unico_peca,codigo_layout,qtd_cortada_no_layout,"
+    "tempo_corte_segundos,recorte,id_retrabalho"
+)
+
+
+def cria_args(tmp_path, planos, pecas):
+    layouts_file = tmp_path / "planos.csv"
+    parts_file = tmp_path / "pecas.csv"
+
+    layouts_file.write_text("\n".join([CABECALHO_PLANOS, *planos]) + "\n")
+    parts_file.write_text("\n".join([CABECALHO_PECAS, *pecas]) + "\n")
+
+    return Namespace(
+        layouts_file=layouts_file,
+        parts_file=parts_file,
+        sep=",",
+        figures_directory=tmp_path,
+        max_bytes_figura=None,
+        cache_figuras=None,
+    )
+
+
+def test_agrupa_pecas_e_recortes_por_layout(tmp_path):
+    from src.subcommands.novo_plano_de_corte import parse_files
+
+    args = cria_args(
+        tmp_path,
+        planos=[
+            "0001,1,26.6,70.4,181.4,MDF,1,2750,1850,14920,PROJETO,LOTE001,chapa,0,1",
+            "0002,1,26.6,70.4,181.4,MDF,1,2750,1850,14920,PROJETO,LOTE001,sobra,0,1",
+        ],
+        pecas=[
+            "10001,,0001,1,10.5,0,",
+            ",,0002,1,3.0,1,",
+            "10002,55,0001,2,11.5,0,7",
+            "10003,,0002,1,12.5,false,",
+        ],
+    )
+
+    planos = parse_files(args)
+
+    assert [plano.codigo_layout for plano in planos] == ["0001", "0002"]
+    assert [plano.qtd_recortes for plano in planos] == [0, 1]
+    assert [peca.model_dump() for peca in planos[0].pecas] == [
+        {
+            "qtd_cortada_no_layout": 1,
+            "id_unico_peca": None,
+            "id_ordem": 10001,
+            "id_retrabalho": None,
+            "tempo_corte_segundos": 10.5,
+        },
+        {
+            "qtd_cortada_no_layout": 2,
+            "id_unico_peca": 55,
+            "id_ordem": 10002,
+            "id_retrabalho": 7,
+            "tempo_corte_segundos": 11.5,
+        },
+    ]
+    assert [peca.id_ordem for peca in planos[1].pecas] == [10003]
+
+
+def test_informa_linhas_com_erro(tmp_path):
+    from src.subcommands.novo_plano_de_corte import parse_files
+
+    args = cria_args(
+        tmp_path,
+        planos=[
+            "0001,1,26.6,70.4,181.4,MDF,1,2750,1850,14920,PROJETO,LOTE001,chapa,0,1",
+        ],
+        pecas=[
+            "10001,,0001,1,10.5,0,",
+            "10002,,0001,um,10.5,0,",
+            "10003,,0001,1,10.5,1,",
+        ],
+    )
+
+    with pytest.raises(Exception) as exc_info:
+        parse_files(args)
+
+    mensagem = str(exc_info.value)
+
+    assert "linha 3: valor inválido em qtd_cortada_no_layout: 'um'" in mensagem
+    assert "linha 4: Peça de recorte não deve ter id_ordem ou id_unico_peca" in mensagem
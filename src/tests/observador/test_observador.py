@@ -0,0 +1,114 @@
+import threading
+import time
+
+import pytest
+
+from src.observador import (
+    ObservadorInotify,
+    ObservadorPolling,
+    cria_observador,
+    inotify_disponivel,
+)
+
+OBSERVADORES = [
+    pytest.param(ObservadorPolling, id="polling"),
+    pytest.param(
+        ObservadorInotify,
+        id="inotify",
+        marks=pytest.mark.skipif(
+            not inotify_disponivel(), reason="inotify não disponível"
+        ),
+    ),
+]
+
+
+def grava_depois(caminho, atraso, conteudo="1001\n"):
+    def grava():
+        time.sleep(atraso)
+        with open(caminho, "a") as f:
+            f.write(conteudo)
+
+    thread = threading.Thread(target=grava)
+    thread.start()
+
+    return thread
+
+
+def cria(classe, diretorio, **kwargs):
+    if classe is ObservadorPolling:
+        kwargs["intervalo"] = 0.05
+
+    return classe([diretorio], ["*.tx"], ignorar=["_APONTADO", "_COM_ERRO"], **kwargs)
+
+
+@pytest.mark.parametrize("classe", OBSERVADORES)
+def test_acorda_quando_arquivo_e_gravado(tmp_path, classe):
+    with cria(classe, tmp_path, debounce=0.2) as observador:
+        thread = grava_depois(tmp_path / "PLANO1.tx", 0.1)
+
+        inicio = time.monotonic()
+        alterados = observador.aguardar(10)
+
+        thread.join()
+
+    assert alterados == {tmp_path / "PLANO1.tx"}
+    assert time.monotonic() - inicio < 5
+
+
+@pytest.mark.parametrize("classe", OBSERVADORES)
+def test_aguarda_fim_da_gravacao(tmp_path, classe):
+    with cria(classe, tmp_path, debounce=0.4) as observador:
+        threads = [
+            grava_depois(tmp_path / "PLANO1.tx", atraso) for atraso in (0.1, 0.3)
+        ]
+
+        alterados = observador.aguardar(10)
+        tamanho = (tmp_path / "PLANO1.tx").stat().st_size
+
+        for thread in threads:
+            thread.join()
+
+    # Só retorna depois da segunda gravação
+    assert alterados == {tmp_path / "PLANO1.tx"}
+    assert tamanho == len("1001\n") * 2
+
+
+@pytest.mark.parametrize("classe", OBSERVADORES)
+def test_ignora_arquivos_do_integrador(tmp_path, classe):
+    with cria(classe, tmp_path, debounce=0.1) as observador:
+        thread = grava_depois(tmp_path / "PLANO1_APONTADO.tx", 0.05)
+
+        alterados = observador.aguardar(0.5)
+
+        thread.join()
+
+    assert alterados == set()
+
+
+@pytest.mark.skipif(not inotify_disponivel(), reason="inotify não disponível")
+def test_ignora_diretorio_removido_ao_adicionar(tmp_path):
+    with ObservadorInotify([tmp_path], ["*.tx"], recursivo=True) as observador:
+        (tmp_path / "2024").mkdir()
+        (tmp_path / "2024" / "01").mkdir()
+
+        # O caminho deixa de ser um diretório enquanto é percorrido
+        arquivo = tmp_path / "arquivo"
+        arquivo.write_text("")
+        observador._adiciona(arquivo)
+
+        observador._adiciona(tmp_path / "2024")
+
+        assert tmp_path / "2024" / "01" in observador._observados.values()
+
+
+def test_intervalo_padrao_do_polling_e_curto(tmp_path):
+    with cria_observador("polling", [tmp_path], ["*.tx"]) as observador:
+        assert observador.intervalo <= observador.debounce
+
+
+def test_intervalo_do_polling(tmp_path):
+    with cria_observador(
+        "polling", [tmp_path], ["*.tx"], intervalo_polling=5.0
+    ) as observador:
+        assert isinstance(observador, ObservadorPolling)
+        assert observador.intervalo == 5.0
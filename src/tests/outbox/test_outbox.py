@@ -0,0 +1,112 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from src.outbox import (
+    ENVIADO,
+    ERRO,
+    PENDENTE,
+    TIPO_APONTAMENTO,
+    TIPO_LEITURA,
+    Outbox,
+    drenar_apontamentos,
+)
+from src.tx.exceptions import CircuitOpenError
+
+
+def test_enfileirar_ignora_chave_repetida(tmp_path):
+    outbox = Outbox(tmp_path / "outbox.db")
+
+    itens = [("arquivo.csv|1", {"codigo": "A"}), ("arquivo.csv|2", {"codigo": "B"})]
+
+    assert outbox.enfileirar_varios(TIPO_LEITURA, itens) == 2
+    assert outbox.enfileirar_varios(TIPO_LEITURA, itens) == 0
+    assert outbox.contar(TIPO_LEITURA, PENDENTE) == 2
+
+    outbox.close()
+
+
+def test_drenar_registra_enviados_e_erros(tmp_path):
+    outbox = Outbox(tmp_path / "outbox.db", espera_erro=0)
+
+    outbox.enfileirar_varios(
+        TIPO_LEITURA,
+        [("1", {"codigo": "A"}), ("2", {"codigo": "B"}), ("3", {"codigo": "C"})],
+    )
+
+    def enviar(itens):
+        return [None if item.payload["codigo"] != "B" else "Falhou" for item in itens]
+
+    assert outbox.drenar(TIPO_LEITURA, enviar, tamanho_lote=2) == (2, 1)
+    assert outbox.contar(TIPO_LEITURA, ENVIADO) == 2
+    assert outbox.contar(TIPO_LEITURA, ERRO) == 1
+
+    # Itens com erro só são reenviados dentro da janela de reapontamento
+    assert outbox.drenar(TIPO_LEITURA, enviar) == (0, 0)
+
+    reenviados = []
+    outbox.drenar(
+        TIPO_LEITURA,
+        lambda itens: reenviados.extend(itens) or [None] * len(itens),
+        erros_desde=datetime.now() - timedelta(days=1),
+    )
+
+    assert [item.chave for item in reenviados] == ["2"]
+    assert outbox.contar(TIPO_LEITURA, ERRO) == 0
+
+    outbox.close()
+
+
+def test_item_com_erro_espera_antes_de_nova_tentativa(tmp_path):
+    outbox = Outbox(tmp_path / "outbox.db")
+    desde = datetime.now() - timedelta(days=1)
+
+    outbox.enfileirar(TIPO_LEITURA, "1", {"codigo": "A"})
+
+    assert outbox.drenar(TIPO_LEITURA, lambda itens: ["Falhou"], erros_desde=desde) == (
+        0,
+        1,
+    )
+    assert outbox.pendentes(TIPO_LEITURA, erros_desde=desde) == []
+
+    outbox.espera_erro = 0
+    outbox.registrar_resultados([(1, "Falhou")])
+
+    assert [
+        item.chave for item in outbox.pendentes(TIPO_LEITURA, erros_desde=desde)
+    ] == ["1"]
+
+    outbox.close()
+
+
+def test_circuit_breaker_aberto_mantem_apontamentos_ja_enviados(tmp_path):
+    outbox = Outbox(tmp_path / "outbox.db")
+    outbox.enfileirar_varios(
+        TIPO_APONTAMENTO,
+        [
+            (codigo, {"codigo_layout": codigo, "tipo_apontamento": "INICIO_OU_FIM"})
+            for codigo in ["L1", "L2", "L3"]
+        ],
+    )
+
+    apontados = []
+
+    def apontar(codigo_layout):
+        if codigo_layout == "L2":
+            raise CircuitOpenError("A API do MES está indisponível")
+
+        apontados.append(codigo_layout)
+
+    tx = SimpleNamespace(plano_de_corte=SimpleNamespace(apontar=apontar))
+
+    with pytest.raises(CircuitOpenError):
+        drenar_apontamentos(outbox, tx)
+
+    assert sorted(apontados) == ["L1", "L3"]
+    assert outbox.contar(TIPO_APONTAMENTO, ENVIADO) == 2
+    # O plano não enviado continua pendente, sem contar como tentativa
+    [pendente] = outbox.pendentes(TIPO_APONTAMENTO)
+    assert (pendente.chave, pendente.tentativas) == ("L2", 0)
+
+    outbox.close()
@@ -0,0 +1,136 @@
+import re
+
+import httpx
+import pytest
+from pytest_httpx import HTTPXMock
+
+URL_PECAS = re.compile(r".*/plano-de-corte/pecas.*")
+
+
+def peca(id: int):
+    return {
+        "created_on": "2024-11-02T21:49:32",
+        "modified_on": "2024-11-02T21:49:32",
+        "id": id,
+        "codigo_layout": "PLAN0001",
+        "id_recurso": 1,
+        "id_unico_peca": 123,
+        "tempo_corte_segundos": None,
+        "qtd_cortada_no_layout": 1,
+        "conferido": False,
+        "data_conferencia": None,
+        "nome_projeto": "PROJETO",
+        "descricao_material": "MDF",
+        "inativo": False,
+        "pendente": True,
+        "finalizado": False,
+        "em_processo": False,
+        "inicio_apontamento": None,
+        "fim_apontamento": None,
+        "id_ordem": None,
+        "item_codigo": None,
+        "item_descricao": None,
+        "item_mascara": None,
+        "item_mascara_descricao": None,
+        "mm_comprimento": None,
+        "mm_largura": None,
+        "mm_espessura": None,
+        "quantidade_ordem": None,
+        "codigo_lote": None,
+        "kg_peso_liquido": None,
+        "kg_peso_bruto": None,
+        "cancelada": None,
+    }
+
+
+def pagina(ids, page, last_page=None):
+    return {
+        "sucesso": True,
+        "mensagem": "Ok",
+        "metadata": {"page": page, "page_size": 2, "last_page": last_page},
+        "retorno": [peca(id) for id in ids],
+    }
+
+
+@pytest.mark.parametrize("primeira", [0, 1], ids=["a-partir-de-0", "a-partir-de-1"])
+def test_busca_plano_de_corte_por_peca_percorre_todas_as_paginas(
+    httpx_mock: HTTPXMock, mock_login_sucess, primeira
+):
+    from src.tx.tx import Tx
+
+    paginas = [[1, 2], [3, 4], [5]]
+
+    def responde(request: httpx.Request):
+        # Sem `page`, o servidor retorna a primeira página
+        page = int(request.url.params.get("page", primeira))
+
+        return httpx.Response(
+            200,
+            json=pagina(
+                paginas[page - primeira], page, last_page=primeira + len(paginas) - 1
+            ),
+        )
+
+    httpx_mock.add_callback(responde, url=URL_PECAS)
+
+    tx = Tx("http://192.168.3.15:6543/", "admin", "qwe123")
+    planos = tx.plano_de_corte.pecas.busca_plano_de_corte_por_peca(123, page_size=2)
+    tx.close()
+
+    assert [plano.id for plano in planos] == [1, 2, 3, 4, 5]
+
+    requests = [r for r in httpx_mock.get_requests() if URL_PECAS.match(str(r.url))]
+
+    assert [r.url.params.get("page") for r in requests] == [
+        None,
+        str(primeira + 1),
+        str(primeira + 2),
+    ]
+    assert all(r.url.params["id_unico_peca"] == "123" for r in requests)
+
+
+def test_para_quando_o_servidor_ignora_a_paginacao(
+    httpx_mock: HTTPXMock, mock_login_sucess
+):
+    from src.tx.tx import Tx
+
+    # O servidor retorna sempre a primeira página, sem `last_page`
+    httpx_mock.add_response(url=URL_PECAS, json=pagina([1, 2], 0))
+
+    tx = Tx("http://192.168.3.15:6543/", "admin", "qwe123")
+    planos = tx.plano_de_corte.pecas.busca_plano_de_corte_por_peca(123, page_size=2)
+    tx.close()
+
+    assert [plano.id for plano in planos] == [1, 2]
+
+    requests = [r for r in httpx_mock.get_requests() if URL_PECAS.match(str(r.url))]
+
+    assert [r.url.params.get("page") for r in requests] == [None, "1"]
+
+
+def test_limita_a_quantidade_de_paginas(httpx_mock: HTTPXMock, mock_login_sucess):
+    from src.tx.modules.plano_de_corte.pecas import PlanoDeCortePecas
+    from src.tx.tx import Tx
+    from src.tx.utils.commons import paginar
+
+    def responde(request: httpx.Request):
+        page = int(request.url.params.get("page", 0))
+        resposta = pagina([page * 2 + 1, page * 2 + 2], page)
+        resposta["metadata"] = None
+
+        return httpx.Response(200, json=resposta)
+
+    httpx_mock.add_callback(responde, url=URL_PECAS)
+
+    tx = Tx("http://192.168.3.15:6543/", "admin", "qwe123")
+    itens = paginar(
+        tx.client,
+        "/plano-de-corte/pecas",
+        PlanoDeCortePecas,
+        page_size=2,
+        max_paginas=3,
+    )
+
+    assert [item.id for item in itens] == [1, 2, 3, 4, 5, 6]
+
+    tx.close()
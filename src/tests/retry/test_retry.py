@@ -0,0 +1,133 @@
+import re
+
+import httpx
+import pytest
+from pytest_httpx import HTTPXMock
+
+from src.tx.exceptions import CircuitOpenError, MesApiError
+from src.tx.utils.retry import CircuitBreaker, PoliticaRetry
+
+URL_APONTAR = re.compile(r".*/plano-de-corte/PLAN0001/apontar")
+
+RESPOSTA_OK = {"sucesso": True, "mensagem": "Ok", "metadata": None, "retorno": None}
+
+# 503 com Retry-After indica que a requisição não foi processada
+INDISPONIVEL = {"status_code": 503, "headers": {"Retry-After": "0"}}
+
+
+def cria_tx(circuit_breaker=None):
+    from src.tx.tx import Tx
+
+    return Tx(
+        "http://192.168.3.15:6543/",
+        "admin",
+        "qwe123",
+        politica_retry=PoliticaRetry(max_tentativas=3, backoff_inicial=0),
+        circuit_breaker=circuit_breaker,
+    )
+
+
+def test_repete_requisicao_com_erro_transitorio(
+    httpx_mock: HTTPXMock, mock_login_sucess
+):
+    httpx_mock.add_response(url=URL_APONTAR, **INDISPONIVEL)
+    httpx_mock.add_response(url=URL_APONTAR, status_code=200, json=RESPOSTA_OK)
+
+    cria_tx().plano_de_corte.apontar("PLAN0001")
+
+    assert len(httpx_mock.get_requests(url=URL_APONTAR)) == 2
+
+
+@pytest.mark.parametrize("status_code", [500, 502, 503, 504])
+def test_nao_repete_post_que_pode_ter_sido_processado(
+    httpx_mock: HTTPXMock, mock_login_sucess, status_code
+):
+    httpx_mock.add_response(url=URL_APONTAR, status_code=status_code)
+
+    with pytest.raises(MesApiError):
+        cria_tx().plano_de_corte.apontar("PLAN0001")
+
+    assert len(httpx_mock.get_requests(url=URL_APONTAR)) == 1
+
+
+def test_nao_repete_post_com_timeout_de_leitura(
+    httpx_mock: HTTPXMock, mock_login_sucess
+):
+    httpx_mock.add_exception(httpx.ReadTimeout("timeout"), url=URL_APONTAR)
+
+    with pytest.raises(httpx.ReadTimeout):
+        cria_tx().plano_de_corte.apontar("PLAN0001")
+
+    assert len(httpx_mock.get_requests(url=URL_APONTAR)) == 1
+
+
+def test_repete_post_que_nao_conectou(httpx_mock: HTTPXMock, mock_login_sucess):
+    httpx_mock.add_exception(httpx.ConnectError("recusada"), url=URL_APONTAR)
+    httpx_mock.add_response(url=URL_APONTAR, status_code=200, json=RESPOSTA_OK)
+
+    cria_tx().plano_de_corte.apontar("PLAN0001")
+
+    assert len(httpx_mock.get_requests(url=URL_APONTAR)) == 2
+
+
+def test_repete_corpo_enviado_em_streaming(httpx_mock: HTTPXMock, mock_login_sucess):
+    url_ordem = re.compile(r".*/cliente/ordem")
+
+    httpx_mock.add_response(url=url_ordem, status_code=401)
+    httpx_mock.add_response(url=url_ordem, **INDISPONIVEL)
+    httpx_mock.add_response(url=url_ordem, status_code=200, json=RESPOSTA_OK)
+
+    cria_tx().cliente.nova_ordem([])
+
+    requests = httpx_mock.get_requests(url=url_ordem)
+
+    assert [request.read() for request in requests] == [b'{"ordens": []}'] * 3
+
+
+def test_nao_repete_erro_permanente(httpx_mock: HTTPXMock, mock_login_sucess):
+    httpx_mock.add_response(
+        url=URL_APONTAR,
+        status_code=500,
+        json={"mensagem": "O plano PLAN0001 já está finalizado"},
+    )
+
+    with pytest.raises(MesApiError, match="já está finalizado"):
+        cria_tx().plano_de_corte.apontar("PLAN0001")
+
+    assert len(httpx_mock.get_requests(url=URL_APONTAR)) == 1
+
+
+def test_circuit_breaker_interrompe_requisicoes(
+    httpx_mock: HTTPXMock, mock_login_sucess
+):
+    httpx_mock.add_response(url=URL_APONTAR, **INDISPONIVEL)
+
+    tx = cria_tx(CircuitBreaker(limite_falhas=1, tempo_aberto=60))
+
+    with pytest.raises(MesApiError):
+        tx.plano_de_corte.apontar("PLAN0001")
+
+    with pytest.raises(CircuitOpenError):
+        tx.plano_de_corte.apontar("PLAN0001")
+
+    # Somente as tentativas da primeira chamada chegaram à API
+    assert len(httpx_mock.get_requests(url=URL_APONTAR)) == 3
+
+
+def test_keep_warm_nao_altera_circuit_breaker(httpx_mock: HTTPXMock, mock_login_sucess):
+    from src.tx.utils.retry import EXTENSAO_SEM_CIRCUIT_BREAKER
+
+    httpx_mock.add_response(url=URL_APONTAR, **INDISPONIVEL)
+    httpx_mock.add_response(method="HEAD", status_code=404)
+
+    circuit_breaker = CircuitBreaker(limite_falhas=1, tempo_aberto=60)
+    tx = cria_tx(circuit_breaker)
+
+    with pytest.raises(MesApiError):
+        tx.plano_de_corte.apontar("PLAN0001")
+
+    # A requisição do keep-warm passa mesmo com o circuito aberto, e a
+    # resposta não o fecha
+    tx.client.head("/", auth=None, extensions={EXTENSAO_SEM_CIRCUIT_BREAKER: True})
+
+    assert circuit_breaker.aberto
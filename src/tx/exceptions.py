@@ -1,3 +1,6 @@
+from typing import Optional
+
+
 class TxMesCliError(Exception):
     """Base class for exceptions in this module."""
 
@@ -14,3 +17,30 @@ class CannotLoginError(TxMesCliError):
     def __init__(self, message: str):
         self.message = message
         super().__init__(self.message)
+
+
+class MesApiError(TxMesCliError):
+    """Exception raised when the MES API returns an error.
+
+    Attributes:
+        message -- explanation of the error
+        status_code -- HTTP status returned by the API, if any
+    """
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        self.message = message
+        self.status_code = status_code
+        super().__init__(self.message)
+
+
+class CircuitOpenError(TxMesCliError):
+    """Exception raised when the MES API is considered unavailable and requests
+    are not being sent until the circuit breaker allows a new attempt.
+
+    Attributes:
+        message -- explanation of the error
+    """
+
+    def __init__(self, message: str):
+        self.message = message
+        super().__init__(self.message)
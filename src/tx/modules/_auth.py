@@ -1,13 +1,17 @@
+import asyncio
 import json
 import logging
+import threading
+import time
 from datetime import datetime
-from typing import Any, Optional
+from typing import Any, Awaitable, Callable, Optional
 
-from httpx import Client
+from httpx import AsyncClient, Auth, Client, Request, Response
 from pydantic import BaseModel
 
 from src.tx.exceptions import CannotLoginError
 from src.tx.utils.commons import SuccessResponse
+from src.tx.utils.retry import EXTENSAO_REPETIR
 
 logger = logging.getLogger("src.tx.modules._auth")
 
@@ -24,9 +28,7 @@ class LoginReturn(BaseModel):
     usuario: Optional[Any]
 
 
-def login(client: Client, user: str, password: str):
-    response = client.post("/auth/login", json={"user": user, "password": password})
-
+def _processa_resposta_login(response: Response):
     try:
         response.raise_for_status()
     except Exception as e:
@@ -43,3 +45,176 @@ def login(client: Client, user: str, password: str):
         raise e
 
     return SuccessResponse[LoginReturn](**json_response).retorno
+
+
+def login(client: Client, user: str, password: str):
+    # `auth=None` evita que o fluxo de autenticação do client seja aplicado ao
+    # login, que pode ser repetido em caso de timeout sem efeitos colaterais
+    response = client.post(
+        "/auth/login",
+        json={"user": user, "password": password},
+        auth=None,
+        extensions={EXTENSAO_REPETIR: True},
+    )
+
+    return _processa_resposta_login(response)
+
+
+async def async_login(client: AsyncClient, user: str, password: str):
+    response = await client.post(
+        "/auth/login",
+        json={"user": user, "password": password},
+        auth=None,
+        extensions={EXTENSAO_REPETIR: True},
+    )
+
+    return _processa_resposta_login(response)
+
+
+class TxAuth(Auth):
+    """
+    Fluxo de autenticação Bearer da API do MES.
+
+    O token é renovado antes de expirar, com base no `validade` retornado pelo
+    login. Caso a API ainda assim responda 401, um novo login é feito e a
+    requisição é repetida uma única vez.
+    """
+
+    def __init__(
+        self,
+        renovar: Optional[Callable[[], LoginReturn]] = None,
+        renovar_async: Optional[Callable[[], Awaitable[LoginReturn]]] = None,
+        margem_renovacao: float = 300.0,
+        renovar_em_segundo_plano: bool = False,
+    ):
+        self._renovar = renovar
+        self._renovar_async = renovar_async
+        self.margem_renovacao = margem_renovacao
+        self.renovar_em_segundo_plano = renovar_em_segundo_plano
+
+        self.key: Optional[str] = None
+        self._expira_em: Optional[float] = None
+
+        self._lock = threading.Lock()
+        self._async_lock: Optional[asyncio.Lock] = None
+        self._timer: Optional[threading.Timer] = None
+
+    def atualizar(self, login_data: LoginReturn, duracao: Optional[float] = None):
+        if not login_data.key:
+            raise CannotLoginError(
+                "Não foi possível realizar login no sistema MES. "
+                "A resposta da API não contém a chave de autenticação."
+            )
+
+        # A duração é calculada com os horários do próprio servidor, para não
+        # depender do relógio da máquina estar sincronizado com o da API
+        if duracao is None:
+            duracao = (login_data.validade - login_data.inicio).total_seconds()
+
+        self.key = login_data.key
+        self._expira_em = time.monotonic() + duracao if duracao > 0 else None
+
+        self._agendar_renovacao()
+
+    def segundos_ate_renovacao(self) -> Optional[float]:
+        if self._expira_em is None:
+            return None
+
+        return self._expira_em - self.margem_renovacao - time.monotonic()
+
+    def precisa_renovar(self):
+        if self.key is None:
+            return True
+
+        segundos = self.segundos_ate_renovacao()
+
+        return segundos is not None and segundos <= 0
+
+    def _deve_renovar(self, token_rejeitado: Optional[str]):
+        if token_rejeitado is not None:
+            # Outra requisição pode ter renovado o token enquanto esta aguardava
+            return self.key == token_rejeitado
+
+        return self.precisa_renovar()
+
+    def garantir_token(self, token_rejeitado: Optional[str] = None):
+        with self._lock:
+            if not self._deve_renovar(token_rejeitado):
+                return
+
+            assert self._renovar, "Nenhuma função de login síncrona configurada"
+
+            logger.info("Renovando credenciais de acesso à API...")
+            self.atualizar(self._renovar())
+
+    async def garantir_token_async(self, token_rejeitado: Optional[str] = None):
+        if self._async_lock is None:
+            self._async_lock = asyncio.Lock()
+
+        async with self._async_lock:
+            if not self._deve_renovar(token_rejeitado):
+                return
+
+            assert self._renovar_async, "Nenhuma função de login assíncrona configurada"
+
+            logger.info("Renovando credenciais de acesso à API...")
+            self.atualizar(await self._renovar_async())
+
+    def cancelar_renovacao(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def _agendar_renovacao(self):
+        self.cancelar_renovacao()
+
+        segundos = self.segundos_ate_renovacao()
+
+        if not self.renovar_em_segundo_plano or segundos is None:
+            return
+
+        self._timer = threading.Timer(max(segundos, 0), self._renovacao_agendada)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _renovacao_agendada(self):
+        try:
+            self.garantir_token()
+        except Exception as exc:
+            # A próxima requisição tenta novamente, ou renova ao receber 401
+            logger.error("Erro ao renovar credenciais em segundo plano: %s", exc)
+
+    def _aplicar(self, request: Request):
+        request.headers["Authorization"] = f"Bearer {self.key}"
+
+    def sync_auth_flow(self, request: Request):
+        self.garantir_token()
+
+        token = self.key
+        self._aplicar(request)
+
+        response = yield request
+
+        if response.status_code == 401:
+            logger.warning("Token expirado. Realizando novo login...")
+
+            self.garantir_token(token_rejeitado=token)
+            self._aplicar(request)
+
+            yield request
+
+    async def async_auth_flow(self, request: Request):
+        await self.garantir_token_async()
+
+        token = self.key
+        self._aplicar(request)
+
+        response = yield request
+
+        if response.status_code == 401:
+            logger.warning("Token expirado. Realizando novo login...")
+
+            await self.garantir_token_async(token_rejeitado=token)
+            self._aplicar(request)
+
+            yield request
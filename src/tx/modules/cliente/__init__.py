@@ -1,39 +1,215 @@
-import json
+import asyncio
 import logging
-from typing import List
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
 
-from httpx import Client, HTTPStatusError
+from httpx import AsyncClient, Client
 
-from src.tx.modules.cliente.types import NovaOrdemRoteiroEIdUnico
-from src.tx.utils.commons import SuccessResponse
-from src.utils import handle_http_error
+from src.tx.modules.cliente.lotes import (
+    LoteOrdens,
+    ResultadoEnvioOrdens,
+    divide_em_lotes,
+    erro_de_conteudo,
+    executa_em_paralelo,
+    reenvio_seguro,
+)
+from src.tx.modules.cliente.types import NovaOrdemRoteiroEIdUnico, OrdemColunar
+from src.tx.utils.commons import decodifica_retorno
+from src.tx.utils.compressao import CompressorCorpo
+from src.tx.utils.corpo_json import CorpoJson
+from src.utils import raise_for_api_error
 
 logger = logging.getLogger("src.tx.modules.cliente")
 
+# As ordens podem vir em formato compacto ou já serializadas, como em
+# `parse_files` e `parse_files_em_disco`
+Ordens = Iterable[Union[NovaOrdemRoteiroEIdUnico, OrdemColunar, Dict[str, Any]]]
+
+
+def _log_envio_lote(lote: LoteOrdens):
+    logger.info("Enviando lote %s de ordens (%s ordens)...", lote.indice + 1, len(lote))
+
+
+def _log_divisao_lote(lote: LoteOrdens, exc: Exception):
+    logger.warning(
+        "Lote %s de ordens recusado (%s), dividindo para isolar as ordens com erro...",
+        lote.indice + 1,
+        exc,
+    )
+
+
+def _falha_lote(
+    lote: LoteOrdens,
+    exc: Exception,
+    falhas: List[Tuple[LoteOrdens, Exception]],
+    resultado: ResultadoEnvioOrdens,
+):
+    if reenvio_seguro(exc):
+        falhas.append((lote, exc))
+        return
+
+    # Reenviar o lote poderia duplicar as ordens
+    logger.error(
+        "Erro ao enviar lote %s de ordens, que pode ter sido gravado pela API e "
+        "não será reenviado: %s",
+        lote.indice + 1,
+        exc,
+    )
+    resultado.marca_incerta(lote, exc)
+
+
+def _rejeita_falhas(
+    falhas: List[Tuple[LoteOrdens, Exception]], resultado: ResultadoEnvioOrdens
+):
+    for lote, exc in falhas:
+        logger.error("Erro ao enviar lote %s de ordens: %s", lote.indice + 1, exc)
+        resultado.rejeita(lote, exc)
+
 
 class Cliente:
-    def __init__(self, client: Client):
+    def __init__(self, client: Client, compressor: Optional[CompressorCorpo] = None):
+        self.client = client
+        self.compressor = compressor or CompressorCorpo()
+
+    def nova_ordem(self, ordens: Ordens):
+        logger.info("Enviando ordem para a API...")
+
+        # Cada ordem é serializada somente no momento do envio
+        body = CorpoJson("ordens", ordens)
+
+        response = self.compressor.post(self.client, "/cliente/ordem", body)
+
+        raise_for_api_error(response)
+
+        return decodifica_retorno(response)
+
+    def nova_ordem_em_lotes(
+        self,
+        ordens: Ordens,
+        tamanho_lote: int,
+        concorrencia: int = 4,
+        tentativas: int = 2,
+    ) -> ResultadoEnvioOrdens:
+        """
+        Envia as ordens em lotes de até `tamanho_lote` ordens, com até
+        `concorrencia` lotes sendo enviados ao mesmo tempo.
+
+        Um lote recusado pelo seu conteúdo é dividido ao meio e reenviado, até
+        isolar as ordens com erro, sem afetar as demais. Lotes que não chegaram
+        a ser processados pela API são reenviados por até `tentativas` rodadas.
+        Após um timeout de leitura ou um 5xx o lote é marcado como incerto, pois
+        a API pode já ter gravado as ordens.
+        """
+
+        resultado = ResultadoEnvioOrdens()
+        pendentes: Iterable[LoteOrdens] = divide_em_lotes(ordens, tamanho_lote)
+        falhas: List[Tuple[LoteOrdens, Exception]] = []
+
+        def envia(lote: LoteOrdens):
+            _log_envio_lote(lote)
+
+            try:
+                response = self.compressor.post(
+                    self.client, "/cliente/ordem", lote.body
+                )
+                raise_for_api_error(response)
+            except Exception as exc:
+                if not erro_de_conteudo(exc):
+                    _falha_lote(lote, exc, falhas, resultado)
+                elif len(lote) > 1:
+                    _log_divisao_lote(lote, exc)
+
+                    for metade in lote.divide():
+                        envia(metade)
+                else:
+                    resultado.rejeita(lote, exc)
+
+                return
+
+            resultado.aceita(lote)
+
+        for tentativa in range(tentativas):
+            if tentativa:
+                logger.warning("Reenviando %s lotes de ordens...", len(falhas))
+
+            falhas = []
+            executa_em_paralelo(pendentes, envia, concorrencia)
+            pendentes = [lote for lote, _ in falhas]
+
+            if not falhas:
+                break
+
+        _rejeita_falhas(falhas, resultado)
+
+        return resultado
+
+
+class AsyncCliente:
+    def __init__(
+        self, client: AsyncClient, compressor: Optional[CompressorCorpo] = None
+    ):
         self.client = client
+        self.compressor = compressor or CompressorCorpo()
 
-    def nova_ordem(self, ordens: List[NovaOrdemRoteiroEIdUnico]):
+    async def nova_ordem(self, ordens: Ordens):
         logger.info("Enviando ordem para a API...")
 
-        body = {"ordens": [ordem.model_dump() for ordem in ordens]}
+        # Cada ordem é serializada somente no momento do envio
+        body = CorpoJson("ordens", ordens)
+
+        response = await self.compressor.apost(self.client, "/cliente/ordem", body)
+
+        raise_for_api_error(response)
+
+        return decodifica_retorno(response)
+
+    async def nova_ordem_em_lotes(
+        self,
+        ordens: Ordens,
+        tamanho_lote: int,
+        concorrencia: int = 4,
+        tentativas: int = 2,
+    ) -> ResultadoEnvioOrdens:
+        resultado = ResultadoEnvioOrdens()
+        pendentes = list(divide_em_lotes(ordens, tamanho_lote))
+        falhas: List[Tuple[LoteOrdens, Exception]] = []
+
+        semaforo = asyncio.Semaphore(concorrencia)
+
+        async def envia(lote: LoteOrdens):
+            try:
+                async with semaforo:
+                    _log_envio_lote(lote)
+
+                    response = await self.compressor.apost(
+                        self.client, "/cliente/ordem", lote.body
+                    )
+
+                raise_for_api_error(response)
+            except Exception as exc:
+                if not erro_de_conteudo(exc):
+                    _falha_lote(lote, exc, falhas, resultado)
+                elif len(lote) > 1:
+                    _log_divisao_lote(lote, exc)
+
+                    await asyncio.gather(*(envia(metade) for metade in lote.divide()))
+                else:
+                    resultado.rejeita(lote, exc)
+
+                return
 
-        response = self.client.post(
-            "/cliente/ordem",
-            json=body,
-        )
+            resultado.aceita(lote)
 
-        try:
-            response.raise_for_status()
+        for tentativa in range(tentativas):
+            if tentativa:
+                logger.warning("Reenviando %s lotes de ordens...", len(falhas))
 
-        except Exception as exc:
-            message = "Erro ao enviar dados para a API"
+            falhas = []
+            await asyncio.gather(*(envia(lote) for lote in pendentes))
+            pendentes = [lote for lote, _ in falhas]
 
-            if isinstance(exc, HTTPStatusError):
-                message = handle_http_error(exc)
+            if not falhas:
+                break
 
-            raise Exception(message) from exc
+        _rejeita_falhas(falhas, resultado)
 
-        return SuccessResponse(**response.json()).retorno
+        return resultado
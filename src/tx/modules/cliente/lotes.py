@@ -0,0 +1,177 @@
+import json
+import logging
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, TypeVar
+
+from src.tx.exceptions import MesApiError
+from src.tx.utils.corpo_json import CorpoJson
+from src.tx.utils.retry import nao_processada
+
+logger = logging.getLogger("src.tx.modules.cliente.lotes")
+
+# Erros que não dependem do conteúdo do lote e não devem dividi-lo
+_STATUS_NAO_RELACIONADOS_AO_CONTEUDO = {401, 403, 404, 408, 429}
+
+Item = TypeVar("Item")
+
+
+def _id_ordem(ordem: Any) -> int:
+    return ordem["id_ordem"] if isinstance(ordem, dict) else ordem.id_ordem
+
+
+class LoteOrdens:
+    """
+    Conjunto de ordens enviadas em uma única requisição
+    """
+
+    def __init__(self, indice: int, ordens: List[Any]):
+        self.indice = indice
+        self.ordens = ordens
+
+    def __len__(self):
+        return len(self.ordens)
+
+    @property
+    def ids(self):
+        return [_id_ordem(ordem) for ordem in self.ordens]
+
+    @property
+    def body(self):
+        return CorpoJson("ordens", self.ordens)
+
+    def divide(self):
+        metade = len(self.ordens) // 2
+
+        return [
+            LoteOrdens(self.indice, self.ordens[:metade]),
+            LoteOrdens(self.indice, self.ordens[metade:]),
+        ]
+
+
+def divide_em_lotes(ordens: Iterable[Any], tamanho_lote: int) -> Iterator[LoteOrdens]:
+    lote: List[Any] = []
+    indice = 0
+
+    for ordem in ordens:
+        lote.append(ordem)
+
+        if len(lote) >= tamanho_lote:
+            yield LoteOrdens(indice, lote)
+            lote = []
+            indice += 1
+
+    if lote:
+        yield LoteOrdens(indice, lote)
+
+
+def erro_de_conteudo(exc: Exception):
+    """
+    Indica se a API recusou o lote pelo seu conteúdo, caso em que dividir o lote
+    isola as ordens inválidas. Erros de rede e do servidor já foram repetidos
+    pelo transporte e não são afetados pelo conteúdo.
+    """
+
+    return (
+        isinstance(exc, MesApiError)
+        and exc.status_code is not None
+        and 400 <= exc.status_code < 500
+        and exc.status_code not in _STATUS_NAO_RELACIONADOS_AO_CONTEUDO
+    )
+
+
+def reenvio_seguro(exc: Exception):
+    """
+    Indica se o lote pode ser reenviado sem risco de duplicar as ordens: a
+    requisição não chegou a ser processada, ou a API a recusou (4xx). Após um
+    timeout de leitura ou um 5xx a API pode já ter gravado as ordens.
+    """
+
+    if nao_processada(exc):
+        return True
+
+    return (
+        isinstance(exc, MesApiError)
+        and exc.status_code is not None
+        and 400 <= exc.status_code < 500
+    )
+
+
+class ResultadoEnvioOrdens:
+    """
+    Ordens aceitas e recusadas pela API em um envio em lotes. As ordens
+    `incertas` podem ter sido gravadas pela API apesar da falha, e não são
+    reenviadas automaticamente.
+    """
+
+    def __init__(self):
+        self.aceitas: List[int] = []
+        self.rejeitadas: Dict[int, str] = {}
+        self.incertas: Dict[int, str] = {}
+        self._lock = threading.Lock()
+
+    def aceita(self, lote: LoteOrdens):
+        with self._lock:
+            self.aceitas.extend(lote.ids)
+
+    def rejeita(self, lote: LoteOrdens, exc: Exception):
+        with self._lock:
+            for id_ordem in lote.ids:
+                self.rejeitadas[id_ordem] = str(exc)
+
+    def marca_incerta(self, lote: LoteOrdens, exc: Exception):
+        with self._lock:
+            for id_ordem in lote.ids:
+                self.incertas[id_ordem] = str(exc)
+
+    def salvar(self, caminho: Path):
+        caminho.parent.mkdir(parents=True, exist_ok=True)
+
+        temporario = caminho.with_name(caminho.name + ".tmp")
+
+        with open(temporario, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "aceitas": self.aceitas,
+                    "rejeitadas": [
+                        {"id_ordem": id_ordem, "erro": erro}
+                        for id_ordem, erro in self.rejeitadas.items()
+                    ],
+                    "incertas": [
+                        {"id_ordem": id_ordem, "erro": erro}
+                        for id_ordem, erro in self.incertas.items()
+                    ],
+                },
+                f,
+                indent=2,
+            )
+
+        os.replace(temporario, caminho)
+
+
+def executa_em_paralelo(
+    itens: Iterable[Item], funcao: Callable[[Item], None], concorrencia: int
+):
+    """
+    Executa `funcao` para cada item com até `concorrencia` execuções ao mesmo
+    tempo. Os itens são consumidos aos poucos, sem carregar todos em memória.
+    """
+
+    with ThreadPoolExecutor(max_workers=concorrencia) as executor:
+        em_andamento = set()
+
+        for item in itens:
+            if len(em_andamento) >= concorrencia * 2:
+                concluidos, em_andamento = wait(
+                    em_andamento, return_when=FIRST_COMPLETED
+                )
+
+                for future in concluidos:
+                    future.result()
+
+            em_andamento.add(executor.submit(funcao, item))
+
+        for future in em_andamento:
+            future.result()
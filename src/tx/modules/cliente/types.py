@@ -1,5 +1,7 @@
+import json
+from array import array
 from datetime import datetime
-from typing import List, Optional
+from typing import Any, Dict, Iterator, List, Optional
 
 from pydantic import BaseModel, field_serializer
 
@@ -77,3 +79,48 @@ class NovaOrdemParams(BaseModel):
 class NovaOrdemRoteiroEIdUnico(NovaOrdemParams):
     roteiros: List[NovoRoteiroParams] = []
     ids_unicos: List[NovoIdUnicoParams] = []
+
+
+class OrdemColunar:
+    """
+    Ordem com os roteiros e ids únicos guardados de forma compacta: os ids
+    únicos em um `array` de inteiros e os roteiros já serializados em JSON,
+    em vez de um objeto pydantic para cada um. O JSON gerado por
+    `partes_json` é idêntico ao de `NovaOrdemRoteiroEIdUnico`.
+    """
+
+    __slots__ = ("ordem", "roteiros", "qtd_roteiros", "ids_unicos")
+
+    def __init__(self, ordem: NovaOrdemParams):
+        self.ordem = ordem
+        self.roteiros = bytearray()
+        self.qtd_roteiros = 0
+        self.ids_unicos = array("q")
+
+    @property
+    def id_ordem(self):
+        return self.ordem.id_ordem
+
+    def adiciona_roteiro(self, roteiro: NovoRoteiroParams):
+        if self.qtd_roteiros:
+            self.roteiros += b", "
+
+        self.roteiros += json.dumps(roteiro.model_dump()).encode("utf-8")
+        self.qtd_roteiros += 1
+
+    def partes_json(self) -> Iterator[bytes]:
+        # Remove o "}" final da ordem para acrescentar roteiros e ids únicos
+        yield json.dumps(self.ordem.model_dump())[:-1].encode("utf-8")
+        yield b', "roteiros": ['
+        yield bytes(self.roteiros)
+        yield b'], "ids_unicos": ['
+
+        prefixo = f'{{"id_ordem": {self.id_ordem}, "id_unico_peca": '
+
+        yield ", ".join(
+            f"{prefixo}{id_unico_peca}}}" for id_unico_peca in self.ids_unicos
+        ).encode("utf-8")
+        yield b"]}"
+
+    def model_dump(self) -> Dict[str, Any]:
+        return json.loads(b"".join(self.partes_json()))
@@ -1,17 +1,167 @@
+import asyncio
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
 
-from httpx import Client, HTTPStatusError
+from httpx import AsyncClient, Client, HTTPStatusError, Response, TransportError
+from pydantic import BaseModel
 
-from src.tx.utils.commons import SuccessResponse
-from src.utils import handle_http_error
+from src.tx.exceptions import CircuitOpenError, MesApiError
+from src.tx.modules.leituras.types import LeiturasPost, ResultadoLeitura
+from src.tx.utils.commons import decodifica_retorno
+from src.tx.utils.retry import nao_processada
+from src.utils import handle_http_error, raise_for_api_error
 
 logger = logging.getLogger("src.tx.modules.leituras")
 
 
+def _monta_corpo_leitura(
+    id_recurso: int,
+    codigo: str,
+    qtd: int,
+    leitura_manual: bool,
+):
+    logger.info(
+        f"Enviando leitura para a API: código={codigo}, qtd={qtd}, leitura_manual={leitura_manual}"
+    )
+
+    return {
+        "id_recurso": id_recurso,
+        "codigo": codigo,
+        "qtd": qtd,
+        "leitura_manual": leitura_manual,
+    }
+
+
+class _ResultadoLeituraApi(BaseModel):
+    sucesso: bool
+    mensagem: Optional[str] = None
+
+
+def _monta_corpo_lote(leituras: List[LeiturasPost]):
+    logger.info(f"Enviando lote com {len(leituras)} leituras para a API")
+
+    return {"leituras": [leitura.model_dump() for leitura in leituras]}
+
+
+def _rota_lote_inexistente(response: Response):
+    # Versões da API sem a rota de lote respondem 404 ou 405
+    if response.status_code in (404, 405):
+        logger.warning(
+            "A API não possui a rota de leituras em lote. "
+            "Enviando as leituras individualmente."
+        )
+        return True
+
+    return False
+
+
+def _lote_rejeitado(response: Response):
+    # Uma leitura inválida faz a API rejeitar o lote inteiro. Nesse caso as
+    # leituras são enviadas individualmente, para que somente ela falhe
+    if response.status_code in (400, 422):
+        logger.warning(
+            "A API rejeitou o lote de leituras (status %s). "
+            "Enviando as leituras individualmente.",
+            response.status_code,
+        )
+        return True
+
+    return False
+
+
+def _pode_ter_sido_registrada(exc: Optional[BaseException]):
+    """
+    Indica se o erro ocorreu depois que a requisição chegou à API, como um
+    timeout de leitura, a conexão encerrada antes da resposta ou um 5xx (exceto
+    503 com `Retry-After`). Um 4xx indica que a API recusou a leitura
+    """
+
+    if nao_processada(exc):
+        return False
+
+    while exc is not None:
+        if isinstance(exc, HTTPStatusError):
+            return exc.response.status_code >= 500
+
+        if isinstance(exc, TransportError):
+            return True
+
+        exc = exc.__cause__
+
+    return False
+
+
+def _resultado_com_erro(leitura: LeiturasPost, exc: Exception, incerto: bool):
+    return ResultadoLeitura(
+        leitura=leitura,
+        sucesso=False,
+        mensagem=str(exc),
+        incerto=incerto,
+        enviada=not isinstance(exc, CircuitOpenError),
+    )
+
+
+def _lote_com_erro(leituras: List[LeiturasPost], exc: Exception, incerto: bool):
+    logger.error(f"Erro ao enviar lote de leituras: {exc}")
+
+    if incerto:
+        logger.warning(
+            "O lote pode ter sido registrado pela API e não será reenviado "
+            "automaticamente."
+        )
+
+    return [_resultado_com_erro(leitura, exc, incerto) for leitura in leituras]
+
+
+def _processa_resposta_lote(response: Response, leituras: List[LeiturasPost]):
+    raise_for_api_error(response)
+
+    try:
+        resultados = decodifica_retorno(response, List[_ResultadoLeituraApi])
+    except Exception as exc:
+        # O lote foi aceito, mas não se sabe quais leituras foram gravadas
+        return _lote_com_erro(leituras, exc, incerto=True)
+
+    if len(resultados) != len(leituras):
+        return _lote_com_erro(
+            leituras,
+            Exception(
+                f"A API retornou {len(resultados)} resultados "
+                f"para um lote de {len(leituras)} leituras"
+            ),
+            incerto=True,
+        )
+
+    return [
+        ResultadoLeitura(
+            leitura=leitura, sucesso=resultado.sucesso, mensagem=resultado.mensagem
+        )
+        for leitura, resultado in zip(leituras, resultados)
+    ]
+
+
+def _erro_leitura(exc: Exception):
+    if isinstance(exc, CircuitOpenError):
+        return exc
+
+    message = "Erro ao enviar dados para a API"
+    status_code = None
+    if isinstance(exc, HTTPStatusError):
+        message = handle_http_error(exc)
+        status_code = exc.response.status_code
+    logger.error(f"{message}: {exc}")
+
+    return MesApiError(message, status_code)
+
+
 class Leitura:
     def __init__(self, client: Client):
         self.client = client
 
+        # Desativado na primeira vez que a API responder que a rota não existe
+        self._lote_disponivel = True
+
     def nova_leitura(
         self,
         id_recurso: int,
@@ -19,25 +169,160 @@ class Leitura:
         qtd: int,
         leitura_manual: bool,
     ):
-        logger.info(
-            f"Enviando leitura para a API: código={codigo}, qtd={qtd}, leitura_manual={leitura_manual}"
-        )
-
-        body = {
-            "id_recurso": id_recurso,
-            "codigo": codigo,
-            "qtd": qtd,
-            "leitura_manual": leitura_manual,
-        }
+        body = _monta_corpo_leitura(id_recurso, codigo, qtd, leitura_manual)
 
         try:
             response = self.client.post("/leituras", json=body)
             response.raise_for_status()
         except Exception as exc:
-            message = "Erro ao enviar dados para a API"
-            if isinstance(exc, HTTPStatusError):
-                message = handle_http_error(exc)
-            logger.error(f"{message}: {exc}")
-            raise Exception(message) from exc
+            raise _erro_leitura(exc) from exc
+
+        return decodifica_retorno(response, validar=False)
+
+    def _nova_leitura_com_resultado(self, leitura: LeiturasPost):
+        try:
+            self.nova_leitura(
+                id_recurso=leitura.id_recurso,
+                codigo=leitura.codigo,
+                qtd=leitura.qtd,
+                leitura_manual=leitura.leitura_manual,
+            )
+        except Exception as exc:
+            # Com o circuit breaker aberto as leituras restantes não são
+            # enviadas, mas o resultado das já enviadas é mantido
+            return _resultado_com_erro(leitura, exc, _pode_ter_sido_registrada(exc))
+
+        return ResultadoLeitura(leitura=leitura, sucesso=True)
+
+    def nova_leituras_em_lote(
+        self,
+        leituras: List[LeiturasPost],
+        concorrencia: int = 8,
+    ) -> List[ResultadoLeitura]:
+        """
+        Envia várias leituras em uma única requisição, retornando o resultado de
+        cada uma na mesma ordem em que foram informadas.
+
+        Caso a API não possua a rota de lote, ou rejeite o lote inteiro, as
+        leituras são enviadas individualmente, com até `concorrencia` requisições
+        simultâneas. Falhas de comunicação marcam as leituras como não enviadas,
+        ou como `incerto` quando ocorreram depois de a requisição chegar à API,
+        como um timeout de leitura ou um 5xx (essas não devem ser reenviadas
+        automaticamente). Se o circuit breaker
+        estiver aberto antes do envio do lote, `CircuitOpenError` é levantado.
+        """
+
+        if not leituras:
+            return []
+
+        if self._lote_disponivel:
+            try:
+                response = self.client.post(
+                    "/leituras/lote", json=_monta_corpo_lote(leituras)
+                )
+            except CircuitOpenError:
+                raise
+            except Exception as exc:
+                return _lote_com_erro(
+                    leituras, exc, incerto=_pode_ter_sido_registrada(exc)
+                )
+
+            if _rota_lote_inexistente(response):
+                self._lote_disponivel = False
+
+            elif not _lote_rejeitado(response):
+                try:
+                    return _processa_resposta_lote(response, leituras)
+                except Exception as exc:
+                    return _lote_com_erro(
+                        leituras, exc, incerto=_pode_ter_sido_registrada(exc)
+                    )
+
+        with ThreadPoolExecutor(max_workers=concorrencia) as executor:
+            return list(executor.map(self._nova_leitura_com_resultado, leituras))
+
+
+class AsyncLeitura:
+    def __init__(self, client: AsyncClient):
+        self.client = client
+
+        self._lote_disponivel = True
+
+    async def nova_leitura(
+        self,
+        id_recurso: int,
+        codigo: str,
+        qtd: int,
+        leitura_manual: bool,
+    ):
+        body = _monta_corpo_leitura(id_recurso, codigo, qtd, leitura_manual)
+
+        try:
+            response = await self.client.post("/leituras", json=body)
+            response.raise_for_status()
+        except Exception as exc:
+            raise _erro_leitura(exc) from exc
 
-        return SuccessResponse(**response.json()).retorno
+        return decodifica_retorno(response, validar=False)
+
+    async def _nova_leitura_com_resultado(
+        self, leitura: LeiturasPost, semaforo: asyncio.Semaphore
+    ):
+        async with semaforo:
+            try:
+                await self.nova_leitura(
+                    id_recurso=leitura.id_recurso,
+                    codigo=leitura.codigo,
+                    qtd=leitura.qtd,
+                    leitura_manual=leitura.leitura_manual,
+                )
+            except Exception as exc:
+                return _resultado_com_erro(leitura, exc, _pode_ter_sido_registrada(exc))
+
+        return ResultadoLeitura(leitura=leitura, sucesso=True)
+
+    async def nova_leituras_em_lote(
+        self,
+        leituras: List[LeiturasPost],
+        concorrencia: int = 8,
+    ) -> List[ResultadoLeitura]:
+        """
+        Versão assíncrona de `Leitura.nova_leituras_em_lote`
+        """
+
+        if not leituras:
+            return []
+
+        if self._lote_disponivel:
+            try:
+                response = await self.client.post(
+                    "/leituras/lote", json=_monta_corpo_lote(leituras)
+                )
+            except CircuitOpenError:
+                raise
+            except Exception as exc:
+                return _lote_com_erro(
+                    leituras, exc, incerto=_pode_ter_sido_registrada(exc)
+                )
+
+            if _rota_lote_inexistente(response):
+                self._lote_disponivel = False
+
+            elif not _lote_rejeitado(response):
+                try:
+                    return _processa_resposta_lote(response, leituras)
+                except Exception as exc:
+                    return _lote_com_erro(
+                        leituras, exc, incerto=_pode_ter_sido_registrada(exc)
+                    )
+
+        semaforo = asyncio.Semaphore(concorrencia)
+
+        return list(
+            await asyncio.gather(
+                *(
+                    self._nova_leitura_com_resultado(leitura, semaforo)
+                    for leitura in leituras
+                )
+            )
+        )
@@ -1,3 +1,5 @@
+from typing import Optional
+
 from pydantic import BaseModel
 
 
@@ -6,3 +8,14 @@ class LeiturasPost(BaseModel):
     codigo: str
     qtd: int
     leitura_manual: bool
+
+
+class ResultadoLeitura(BaseModel):
+    leitura: LeiturasPost
+    sucesso: bool
+    mensagem: Optional[str] = None
+    # A comunicação falhou depois que a leitura foi enviada, então a API pode
+    # já tê-la registrado. Reenviar poderia contar a leitura duas vezes
+    incerto: bool = False
+    # O circuit breaker estava aberto e a leitura não chegou a ser enviada
+    enviada: bool = True
@@ -1,20 +1,68 @@
-import json
+import asyncio
 import logging
-from typing import List, Literal
-
-from httpx import Client, HTTPStatusError
-
-from src.tx.modules.plano_de_corte.pecas import Pecas
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Optional
+
+from httpx import AsyncClient, Client
+
+from src.tx.exceptions import MesApiError
+from src.tx.modules.plano_de_corte.partes import (
+    ParteProjeto,
+    ProgressoEnvio,
+    divide_em_partes,
+)
+from src.tx.modules.plano_de_corte.pecas import AsyncPecas, Pecas
 from src.tx.modules.plano_de_corte.types import PlanoDeCorteCreateModel
-from src.tx.utils.commons import SuccessResponse
-from src.utils import handle_http_error
+from src.tx.utils.commons import decodifica_retorno
+from src.tx.utils.compressao import CompressorCorpo
+from src.tx.utils.corpo_json import CorpoJson
+from src.utils import raise_for_api_error
 
 logger = logging.getLogger("src.tx.modules.plano_de_corte")
 
 
+def _partes_pendentes(partes: List[ParteProjeto], progresso: ProgressoEnvio):
+    pendentes = [parte for parte in partes if not progresso.enviada(parte)]
+
+    if len(pendentes) < len(partes):
+        logger.info(
+            "%s de %s partes já foram enviadas anteriormente. Retomando envio...",
+            len(partes) - len(pendentes),
+            len(partes),
+        )
+
+    return pendentes
+
+
+def _log_envio_parte(parte: ParteProjeto, total: int):
+    logger.info(
+        "Enviando parte %s de %s do projeto (%s planos, %s bytes)...",
+        parte.indice + 1,
+        total,
+        len(parte.planos),
+        parte.tamanho,
+    )
+
+
+def _finaliza_envio_partes(
+    erros: List[Exception], total: int, progresso: ProgressoEnvio
+):
+    if erros:
+        status_code = getattr(erros[0], "status_code", None)
+
+        raise MesApiError(
+            f"{len(erros)} de {total} partes do projeto não foram enviadas. "
+            "Execute novamente para enviar somente as partes pendentes.",
+            status_code,
+        ) from erros[0]
+
+    progresso.concluir()
+
+
 class PlanoDeCorte:
-    def __init__(self, client: Client):
+    def __init__(self, client: Client, compressor: Optional[CompressorCorpo] = None):
         self.client = client
+        self.compressor = compressor or CompressorCorpo()
 
         self.pecas = Pecas(self.client)
 
@@ -24,25 +72,61 @@ class PlanoDeCorte:
     ):
         logger.info("Enviando projeto para a API...")
 
-        body = {"planos": [plano.model_dump() for plano in planos]}
+        # Cada plano é serializado somente no momento do envio
+        body = CorpoJson("planos", planos)
 
-        response = self.client.post(
-            "/plano-de-corte/projeto",
-            json=body,
-        )
+        response = self.compressor.post(self.client, "/plano-de-corte/projeto", body)
 
-        try:
-            response.raise_for_status()
+        raise_for_api_error(response)
 
-        except Exception as exc:
-            message = "Erro ao enviar dados para a API"
+        return decodifica_retorno(response)
 
-            if isinstance(exc, HTTPStatusError):
-                message = handle_http_error(exc)
+    def novo_projeto_em_partes(
+        self,
+        planos: List[PlanoDeCorteCreateModel],
+        max_planos: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        concorrencia: int = 4,
+        progresso: Optional[ProgressoEnvio] = None,
+    ):
+        """
+        Envia o projeto dividido em partes de até `max_planos` planos e
+        `max_bytes` bytes, com até `concorrencia` partes sendo enviadas ao mesmo
+        tempo. As partes aceitas pela API são registradas em `progresso`, de
+        modo que uma nova chamada envia apenas as que faltaram.
+        """
+
+        progresso = progresso or ProgressoEnvio()
+        partes = divide_em_partes(planos, max_planos, max_bytes)
+        pendentes = _partes_pendentes(partes, progresso)
+
+        def envia(parte: ParteProjeto):
+            _log_envio_parte(parte, len(partes))
+
+            response = self.compressor.post(
+                self.client, "/plano-de-corte/projeto", parte.body
+            )
+
+            raise_for_api_error(response)
+            progresso.registrar(parte)
+
+        erros: List[Exception] = []
 
-            raise Exception(message) from exc
+        with ThreadPoolExecutor(max_workers=concorrencia) as executor:
+            futures = {executor.submit(envia, parte): parte for parte in pendentes}
 
-        return SuccessResponse(**response.json()).retorno
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                except Exception as exc:
+                    logger.error(
+                        "Erro ao enviar parte %s do projeto: %s",
+                        futures[future].indice + 1,
+                        exc,
+                    )
+                    erros.append(exc)
+
+        _finaliza_envio_partes(erros, len(partes), progresso)
 
     def apontar(
         self,
@@ -54,15 +138,89 @@ class PlanoDeCorte:
             f"/plano-de-corte/{codigo_layout}/apontar",
         )
 
-        try:
-            response.raise_for_status()
+        raise_for_api_error(response, "Erro ao apontar layout no MES")
+
+        return decodifica_retorno(response, validar=False)
 
-        except Exception as exc:
-            message = "Erro ao apontar layout no MES"
 
-            if isinstance(exc, HTTPStatusError):
-                message = handle_http_error(exc)
+class AsyncPlanoDeCorte:
+    def __init__(
+        self, client: AsyncClient, compressor: Optional[CompressorCorpo] = None
+    ):
+        self.client = client
+        self.compressor = compressor or CompressorCorpo()
+
+        self.pecas = AsyncPecas(self.client)
+
+    async def novo_projeto(
+        self,
+        planos: List[PlanoDeCorteCreateModel],
+    ):
+        logger.info("Enviando projeto para a API...")
+
+        # Cada plano é serializado somente no momento do envio
+        body = CorpoJson("planos", planos)
+
+        response = await self.compressor.apost(
+            self.client, "/plano-de-corte/projeto", body
+        )
+
+        raise_for_api_error(response)
+
+        return decodifica_retorno(response)
+
+    async def novo_projeto_em_partes(
+        self,
+        planos: List[PlanoDeCorteCreateModel],
+        max_planos: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        concorrencia: int = 4,
+        progresso: Optional[ProgressoEnvio] = None,
+    ):
+        progresso = progresso or ProgressoEnvio()
+        partes = divide_em_partes(planos, max_planos, max_bytes)
+        pendentes = _partes_pendentes(partes, progresso)
+
+        semaforo = asyncio.Semaphore(concorrencia)
+
+        async def envia(parte: ParteProjeto):
+            async with semaforo:
+                _log_envio_parte(parte, len(partes))
+
+                response = await self.compressor.apost(
+                    self.client, "/plano-de-corte/projeto", parte.body
+                )
+
+            raise_for_api_error(response)
+            progresso.registrar(parte)
+
+        resultados = await asyncio.gather(
+            *(envia(parte) for parte in pendentes), return_exceptions=True
+        )
+
+        erros: List[Exception] = []
+
+        for parte, resultado in zip(pendentes, resultados):
+            if isinstance(resultado, Exception):
+                logger.error(
+                    "Erro ao enviar parte %s do projeto: %s",
+                    parte.indice + 1,
+                    resultado,
+                )
+                erros.append(resultado)
+
+        _finaliza_envio_partes(erros, len(partes), progresso)
+
+    async def apontar(
+        self,
+        codigo_layout: str,
+    ):
+        logger.info(f"Apontando layout {codigo_layout} no MES...")
+
+        response = await self.client.post(
+            f"/plano-de-corte/{codigo_layout}/apontar",
+        )
 
-            raise Exception(message) from exc
+        raise_for_api_error(response, "Erro ao apontar layout no MES")
 
-        return SuccessResponse(**response.json()).retorno
+        return decodifica_retorno(response, validar=False)
@@ -0,0 +1,78 @@
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from src.tx.modules.plano_de_corte.types import PlanoDeCorteCreateModel
+
+logger = logging.getLogger("src.tx.modules.plano_de_corte.manifesto")
+
+
+def hash_plano(plano: PlanoDeCorteCreateModel) -> str:
+    """
+    Hash do conteúdo do plano, independente da ordem dos campos. A figura entra
+    no hash pelo seu próprio hash, para não serializar a imagem novamente
+    """
+
+    dados = plano.model_dump(mode="json", exclude={"figure"})
+    dados["figure"] = (
+        hashlib.sha256(plano.figure.encode("utf-8")).hexdigest()
+        if plano.figure is not None
+        else None
+    )
+
+    return hashlib.sha256(
+        json.dumps(dados, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    ).hexdigest()
+
+
+class ManifestoProjeto:
+    """
+    Registro local, por `codigo_layout`, do hash de cada plano já enviado ao
+    MES. Permite enviar somente os planos novos ou alterados quando o mesmo
+    lote é exportado novamente pelo Ardis.
+    """
+
+    def __init__(self, caminho: Path):
+        self.caminho = caminho
+        self.hashes: Dict[str, str] = {}
+
+        if caminho.exists():
+            try:
+                with open(caminho, "r", encoding="utf-8") as f:
+                    self.hashes = json.load(f)
+            except (OSError, ValueError) as exc:
+                logger.warning("Manifesto inválido, enviando todos os planos: %s", exc)
+
+    def diferenca(
+        self, planos: List[PlanoDeCorteCreateModel]
+    ) -> Tuple[List[PlanoDeCorteCreateModel], List[PlanoDeCorteCreateModel]]:
+        """
+        Separa os planos em novos ou alterados e sem alteração
+        """
+
+        alterados: List[PlanoDeCorteCreateModel] = []
+        inalterados: List[PlanoDeCorteCreateModel] = []
+
+        for plano in planos:
+            if self.hashes.get(plano.codigo_layout) == hash_plano(plano):
+                inalterados.append(plano)
+            else:
+                alterados.append(plano)
+
+        return alterados, inalterados
+
+    def registrar(self, planos: List[PlanoDeCorteCreateModel]):
+        for plano in planos:
+            self.hashes[plano.codigo_layout] = hash_plano(plano)
+
+        self.caminho.parent.mkdir(parents=True, exist_ok=True)
+
+        temporario = self.caminho.with_name(self.caminho.name + ".tmp")
+
+        with open(temporario, "w", encoding="utf-8") as f:
+            json.dump(self.hashes, f, indent=2, sort_keys=True)
+
+        os.replace(temporario, self.caminho)
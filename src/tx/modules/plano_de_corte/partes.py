@@ -0,0 +1,143 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Iterator, List, Optional, Set
+
+from pydantic_core import to_json
+
+from src.tx.modules.plano_de_corte.types import PlanoDeCorteCreateModel
+from src.tx.utils.corpo_json import CorpoJson
+
+logger = logging.getLogger("src.tx.modules.plano_de_corte.partes")
+
+
+class _PlanoSerializado:
+    """
+    JSON de um plano, gerado uma única vez e usado no tamanho e no hash da
+    parte e no corpo da requisição
+    """
+
+    __slots__ = ("conteudo",)
+
+    def __init__(self, plano: PlanoDeCorteCreateModel):
+        self.conteudo = to_json(plano)
+
+    def partes_json(self) -> Iterator[bytes]:
+        yield self.conteudo
+
+
+class ParteProjeto:
+    """
+    Conjunto de planos enviados em uma única requisição
+    """
+
+    def __init__(self, indice: int, planos: List[_PlanoSerializado], tamanho: int):
+        self.indice = indice
+        self.planos = planos
+        self.tamanho = tamanho
+
+        # Identifica a parte pelo conteúdo, para que uma nova execução com os
+        # mesmos arquivos reconheça as partes já enviadas
+        hash_parte = hashlib.sha256()
+
+        for plano in planos:
+            hash_parte.update(plano.conteudo)
+            hash_parte.update(b"\n")
+
+        self.hash = hash_parte.hexdigest()
+
+    @property
+    def body(self):
+        return CorpoJson("planos", self.planos)
+
+
+def divide_em_partes(
+    planos: List[PlanoDeCorteCreateModel],
+    max_planos: Optional[int] = None,
+    max_bytes: Optional[int] = None,
+) -> List[ParteProjeto]:
+    """
+    Divide os planos em partes com no máximo `max_planos` planos e
+    aproximadamente `max_bytes` bytes de JSON. Um plano maior que `max_bytes`
+    é enviado sozinho.
+
+    Cada plano é serializado uma única vez, à medida que é percorrido, e as
+    partes guardam somente o JSON dos seus planos.
+    """
+
+    partes: List[ParteProjeto] = []
+    atual: List[_PlanoSerializado] = []
+    tamanho_atual = 0
+
+    def fecha_parte():
+        nonlocal atual, tamanho_atual
+
+        if atual:
+            partes.append(ParteProjeto(len(partes), atual, tamanho_atual))
+
+        atual = []
+        tamanho_atual = 0
+
+    for plano in planos:
+        serializado = _PlanoSerializado(plano)
+        tamanho = len(serializado.conteudo)
+
+        excede_planos = max_planos is not None and len(atual) >= max_planos
+        excede_bytes = max_bytes is not None and tamanho_atual + tamanho > max_bytes
+
+        if atual and (excede_planos or excede_bytes):
+            fecha_parte()
+
+        atual.append(serializado)
+        tamanho_atual += tamanho
+
+    fecha_parte()
+
+    return partes
+
+
+class ProgressoEnvio:
+    """
+    Registra em disco as partes do projeto já aceitas pela API, permitindo que
+    um envio interrompido seja retomado sem reenviar essas partes.
+    """
+
+    def __init__(self, caminho: Optional[Path] = None):
+        self.caminho = caminho
+        self._enviadas: Set[str] = set()
+        self._lock = threading.Lock()
+
+        if caminho is not None and caminho.exists():
+            try:
+                with open(caminho, "r", encoding="utf-8") as f:
+                    self._enviadas = set(json.load(f).get("partes_enviadas", []))
+            except (OSError, ValueError) as exc:
+                logger.warning("Arquivo de progresso inválido, ignorando: %s", exc)
+
+    def enviada(self, parte: ParteProjeto):
+        return parte.hash in self._enviadas
+
+    def registrar(self, parte: ParteProjeto):
+        with self._lock:
+            self._enviadas.add(parte.hash)
+
+            if self.caminho is None:
+                return
+
+            temporario = self.caminho.with_name(self.caminho.name + ".tmp")
+
+            with open(temporario, "w", encoding="utf-8") as f:
+                json.dump({"partes_enviadas": sorted(self._enviadas)}, f)
+
+            os.replace(temporario, self.caminho)
+
+    def concluir(self):
+        """
+        Remove o arquivo de progresso após o envio de todas as partes
+        """
+
+        if self.caminho is not None and self.caminho.exists():
+            self.caminho.unlink()
@@ -1,10 +1,10 @@
 from datetime import datetime
-from typing import List, Optional
+from typing import AsyncIterator, Iterator, List, Optional
 
-from httpx import Client
+from httpx import AsyncClient, Client
 from pydantic import BaseModel
 
-from src.tx.utils.commons import SuccessResponse
+from src.tx.utils.commons import apaginar, paginar
 
 
 class PlanoDeCortePecas(BaseModel):
@@ -45,18 +45,30 @@ class Pecas:
     def __init__(self, client: Client):
         self.client = client
 
-    def busca_plano_de_corte_por_peca(self, id_unico_peca: int):
+    def itera_plano_de_corte_por_peca(
+        self, id_unico_peca: int, page_size: int = 100
+    ) -> Iterator[PlanoDeCortePecas]:
         """
-        Retorna todos os planos de corte que contém a peça com o id único informado
+        Percorre, página a página, os planos de corte que contém a peça com o id
+        único informado
         """
 
-        response = self.client.get(
-            "/plano-de-corte/pecas", params={"id_unico_peca": id_unico_peca}
+        return paginar(
+            self.client,
+            "/plano-de-corte/pecas",
+            PlanoDeCortePecas,
+            params={"id_unico_peca": id_unico_peca},
+            page_size=page_size,
         )
 
-        response.raise_for_status()
+    def busca_plano_de_corte_por_peca(
+        self, id_unico_peca: int, page_size: int = 100
+    ) -> List[PlanoDeCortePecas]:
+        """
+        Retorna todos os planos de corte que contém a peça com o id único informado
+        """
 
-        return SuccessResponse[List[PlanoDeCortePecas]](**response.json()).retorno
+        return list(self.itera_plano_de_corte_por_peca(id_unico_peca, page_size))
 
     def novo_plano_de_corte_peca(
         self,
@@ -75,3 +87,56 @@ class Pecas:
         )
 
         response.raise_for_status()
+
+
+class AsyncPecas:
+    def __init__(self, client: AsyncClient):
+        self.client = client
+
+    def itera_plano_de_corte_por_peca(
+        self, id_unico_peca: int, page_size: int = 100
+    ) -> AsyncIterator[PlanoDeCortePecas]:
+        """
+        Percorre, página a página, os planos de corte que contém a peça com o id
+        único informado
+        """
+
+        return apaginar(
+            self.client,
+            "/plano-de-corte/pecas",
+            PlanoDeCortePecas,
+            params={"id_unico_peca": id_unico_peca},
+            page_size=page_size,
+        )
+
+    async def busca_plano_de_corte_por_peca(
+        self, id_unico_peca: int, page_size: int = 100
+    ) -> List[PlanoDeCortePecas]:
+        """
+        Retorna todos os planos de corte que contém a peça com o id único informado
+        """
+
+        return [
+            plano
+            async for plano in self.itera_plano_de_corte_por_peca(
+                id_unico_peca, page_size
+            )
+        ]
+
+    async def novo_plano_de_corte_peca(
+        self,
+        codigo_layout: str,
+        qtd_cortada_no_layout: int,
+        id_unico_peca: int,
+        tempo_corte_segundos: float,
+    ):
+        response = await self.client.post(
+            f"/plano-de-corte/{codigo_layout}/pecas",
+            json={
+                "qtd_cortada_no_layout": qtd_cortada_no_layout,
+                "id_unico_peca": id_unico_peca,
+                "tempo_corte_segundos": tempo_corte_segundos,
+            },
+        )
+
+        response.raise_for_status()
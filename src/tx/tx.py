@@ -1,16 +1,41 @@
+import importlib.util
 import logging
+import threading
+import time
+from argparse import Namespace
+from typing import Optional
+
 import httpx
 
-from src.tx.exceptions import CannotLoginError
-from src.tx.modules._auth import login
-from src.tx.modules.cliente import Cliente
-from src.tx.modules.leituras import Leitura
-from src.tx.modules.plano_de_corte import PlanoDeCorte
+from src.tx.modules._auth import LoginReturn, TxAuth, async_login, login
+from src.tx.modules.cliente import AsyncCliente, Cliente
+from src.tx.modules.leituras import AsyncLeitura, Leitura
+from src.tx.modules.plano_de_corte import AsyncPlanoDeCorte, PlanoDeCorte
+from src.tx.utils.compressao import CompressorCorpo
+from src.tx.utils.retry import (
+    EXTENSAO_SEM_CIRCUIT_BREAKER,
+    AsyncRetryTransport,
+    CircuitBreaker,
+    PoliticaRetry,
+    RetryTransport,
+)
+from src.tx.utils.token_cache import CacheToken
 from src.utils import get_version
 
 logger = logging.getLogger("src.tx.tx")
 
 
+def _http2_disponivel(http2: bool):
+    if http2 and importlib.util.find_spec("h2") is None:
+        logger.warning(
+            "HTTP/2 solicitado, mas o pacote 'h2' não está instalado. "
+            "Utilizando HTTP/1.1."
+        )
+        return False
+
+    return http2
+
+
 class Tx:
     def __init__(
         self,
@@ -18,36 +43,236 @@ class Tx:
         user: str,
         password: str,
         default_timeout: httpx.Timeout = httpx.Timeout(30.0),
+        margem_renovacao_token: float = 300.0,
+        limits: Optional[httpx.Limits] = None,
+        http2: bool = False,
+        intervalo_keep_warm: Optional[float] = None,
+        politica_retry: Optional[PoliticaRetry] = None,
+        circuit_breaker: Optional[CircuitBreaker] = None,
+        cache_token: Optional[CacheToken] = None,
+        compressao: Optional[str] = None,
     ):
         self.base_url = base_url
         self.user = user
         self.password = password
+        self.cache_token = cache_token
+
+        # O token é obtido, renovado e reaplicado em caso de 401 pelo `TxAuth`
+        self.auth = TxAuth(
+            renovar=self._novo_login,
+            margem_renovacao=margem_renovacao_token,
+            renovar_em_segundo_plano=True,
+        )
+
+        self._ultima_requisicao = time.monotonic()
 
         self.client = httpx.Client(
             base_url=base_url,
             timeout=default_timeout,
+            auth=self.auth,
+            headers={"User-Agent": "tx-mes-cli/" + get_version()},
+            # Repetição de erros transitórios e circuit breaker para todas as
+            # requisições, inclusive o login
+            transport=RetryTransport(
+                httpx.HTTPTransport(
+                    limits=limits or httpx.Limits(), http2=_http2_disponivel(http2)
+                ),
+                politica=politica_retry,
+                circuit_breaker=circuit_breaker,
+            ),
+            event_hooks={"request": [self._registrar_requisicao]},
         )
 
-        self.login(user, password)  
+        if not self._restaurar_token():
+            self.login(user, password)
+
+        # Compartilhado entre os módulos, para que a recusa da compressão pelo
+        # servidor valha para todas as requisições
+        self.compressor = CompressorCorpo(compressao)
 
-        self.plano_de_corte = PlanoDeCorte(self.client)
-        self.cliente = Cliente(self.client)
+        self.plano_de_corte = PlanoDeCorte(self.client, self.compressor)
+        self.cliente = Cliente(self.client, self.compressor)
         self.leitura = Leitura(self.client)
 
+        self._parar_keep_warm = threading.Event()
+        self._keep_warm: Optional[threading.Thread] = None
+
+        if intervalo_keep_warm:
+            self._keep_warm = threading.Thread(
+                target=self._manter_conexao_ativa,
+                args=(intervalo_keep_warm,),
+                name="tx-keep-warm",
+                daemon=True,
+            )
+            self._keep_warm.start()
+
+    @classmethod
+    def from_args(cls, parsed_args: Namespace):
+        """
+        Cria o `Tx` a partir das opções globais da linha de comando
+        """
+
+        return cls(
+            base_url=parsed_args.host,
+            user=parsed_args.user,
+            password=parsed_args.password,
+            default_timeout=httpx.Timeout(parsed_args.timeout),
+            limits=httpx.Limits(
+                max_connections=parsed_args.max_conexoes,
+                max_keepalive_connections=parsed_args.max_conexoes_keep_alive,
+                keepalive_expiry=parsed_args.keep_alive_expiry,
+            ),
+            http2=parsed_args.http2,
+            intervalo_keep_warm=parsed_args.keep_warm,
+            politica_retry=PoliticaRetry(max_tentativas=parsed_args.max_tentativas),
+            circuit_breaker=CircuitBreaker(
+                limite_falhas=parsed_args.circuit_breaker_falhas,
+                tempo_aberto=parsed_args.circuit_breaker_tempo,
+            ),
+            cache_token=CacheToken(parsed_args.cache_token)
+            if parsed_args.cache_token
+            else None,
+            compressao=parsed_args.compressao,
+        )
+
     def login(self, user: str, password: str):
         logger.info("Obtendo credenciais de acesso à API...")
-        login_data = login(self.client, user, password)
 
-        if not login_data.key:
-            raise CannotLoginError(
-                "Não foi possível realizar login no sistema MES. "
-                "A resposta da API não contém a chave de autenticação."
-            )
+        self.user = user
+        self.password = password
+        self.auth.atualizar(self._novo_login())
+
+        logger.info("Credenciais obtidas com sucesso!")
+
+    def _novo_login(self) -> LoginReturn:
+        login_data = login(self.client, self.user, self.password)
+
+        if self.cache_token is not None:
+            self.cache_token.salvar(self.base_url, self.user, login_data)
+
+        return login_data
+
+    def _restaurar_token(self):
+        """
+        Utiliza o token do cache, se ainda for válido. Caso a API o recuse, o
+        `TxAuth` faz um novo login ao receber 401
+        """
+
+        if self.cache_token is None:
+            return False
+
+        em_cache = self.cache_token.carregar(self.base_url, self.user)
+
+        if em_cache is None:
+            return False
+
+        login_data, restante = em_cache
+
+        if restante <= self.auth.margem_renovacao:
+            return False
+
+        logger.info("Utilizando credenciais de acesso em cache.")
+        self.auth.atualizar(login_data, duracao=restante)
+
+        return True
+
+    def close(self):
+        self._parar_keep_warm.set()
+        self.auth.cancelar_renovacao()
+        self.client.close()
+
+    def _registrar_requisicao(self, request: httpx.Request):
+        self._ultima_requisicao = time.monotonic()
+
+    def _manter_conexao_ativa(self, intervalo: float):
+        """
+        Envia uma requisição leve sempre que o client fica ocioso por `intervalo`
+        segundos, evitando que a conexão seja encerrada entre os ciclos de leitura
+        """
 
-        self.client.headers = httpx.Headers(
-            {
-                "Authorization": f"Bearer {login_data.key}",
-                "User-Agent": "tx-mes-cli/" + get_version(),
-            }
+        while not self._parar_keep_warm.wait(intervalo):
+            if time.monotonic() - self._ultima_requisicao < intervalo:
+                continue
+
+            try:
+                # Qualquer resposta serve, o objetivo é apenas usar a conexão.
+                # Fora do circuit breaker, para que o resultado do keep-warm não
+                # abra nem feche o circuito
+                self.client.head(
+                    "/",
+                    auth=None,
+                    extensions={EXTENSAO_SEM_CIRCUIT_BREAKER: True},
+                ).close()
+            except Exception as exc:
+                # A thread continua ativa mesmo com erros inesperados
+                logger.debug("Falha no keep-warm da conexão: %s", exc)
+
+
+class AsyncTx:
+    """
+    Versão assíncrona do `Tx`, construída sobre `httpx.AsyncClient`.
+
+    Permite manter várias requisições ao MES em andamento ao mesmo tempo. O login
+    é feito ao entrar no contexto:
+
+        async with AsyncTx(base_url, user, password) as tx:
+            await asyncio.gather(*(tx.plano_de_corte.apontar(c) for c in codigos))
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        user: str,
+        password: str,
+        default_timeout: httpx.Timeout = httpx.Timeout(30.0),
+        margem_renovacao_token: float = 300.0,
+        politica_retry: Optional[PoliticaRetry] = None,
+        circuit_breaker: Optional[CircuitBreaker] = None,
+        compressao: Optional[str] = None,
+    ):
+        self.base_url = base_url
+        self.user = user
+        self.password = password
+
+        self.auth = TxAuth(
+            renovar_async=lambda: async_login(self.client, self.user, self.password),
+            margem_renovacao=margem_renovacao_token,
         )
+
+        self.client = httpx.AsyncClient(
+            base_url=base_url,
+            timeout=default_timeout,
+            auth=self.auth,
+            headers={"User-Agent": "tx-mes-cli/" + get_version()},
+            transport=AsyncRetryTransport(
+                httpx.AsyncHTTPTransport(),
+                politica=politica_retry,
+                circuit_breaker=circuit_breaker,
+            ),
+        )
+
+        self.compressor = CompressorCorpo(compressao)
+
+        self.plano_de_corte = AsyncPlanoDeCorte(self.client, self.compressor)
+        self.cliente = AsyncCliente(self.client, self.compressor)
+        self.leitura = AsyncLeitura(self.client)
+
+    async def login(self, user: str, password: str):
+        logger.info("Obtendo credenciais de acesso à API...")
+
+        self.user = user
+        self.password = password
+        self.auth.atualizar(await async_login(self.client, user, password))
+
         logger.info("Credenciais obtidas com sucesso!")
+
+    async def aclose(self):
+        await self.client.aclose()
+
+    async def __aenter__(self):
+        await self.login(self.user, self.password)
+
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
@@ -1,8 +1,31 @@
-from typing import Generic, Optional, TypeVar
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import (
+    Any,
+    AsyncIterator,
+    Dict,
+    Generic,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Type,
+    TypeVar,
+)
 
-from pydantic import BaseModel
+from httpx import AsyncClient, Client, Response
+from pydantic import BaseModel, TypeAdapter
+from pydantic_core import from_json
+
+logger = logging.getLogger("src.tx.utils.commons")
 
 DataT = TypeVar("DataT")
+ItemT = TypeVar("ItemT")
+
+# Limite de páginas de uma listagem, caso o servidor nunca indique o fim
+MAX_PAGINAS = 10_000
 
 
 class Metadata(BaseModel):
@@ -16,3 +39,206 @@ class SuccessResponse(BaseModel, Generic[DataT]):
     mensagem: str
     metadata: Optional[Metadata]
     retorno: DataT
+
+
+@lru_cache(maxsize=None)
+def _validador(tipo: Any) -> TypeAdapter:
+    # Montar o validador de um `SuccessResponse[...]` é caro, então cada tipo
+    # de retorno é compilado uma única vez
+    return TypeAdapter(SuccessResponse[tipo])
+
+
+def decodifica_resposta(response: Response, tipo: Any = Any) -> SuccessResponse:
+    """
+    Valida a resposta da API diretamente dos bytes recebidos, sem construir
+    antes um `dict` com o JSON
+    """
+
+    return _validador(tipo).validate_json(response.content)
+
+
+def decodifica_retorno(response: Response, tipo: Any = Any, validar: bool = True):
+    """
+    Retorna o campo `retorno` da resposta da API. Com `validar=False` o JSON é
+    apenas decodificado, para endpoints cujo retorno não é utilizado
+    """
+
+    if not validar:
+        return from_json(response.content).get("retorno")
+
+    return decodifica_resposta(response, tipo).retorno
+
+
+class _Pagina(NamedTuple):
+    itens: List[Any]
+    tem_proxima: bool
+    # Número da página na numeração do servidor, usado para pedir a seguinte
+    numero: int
+    # Primeiro item, para comparar com a página seguinte
+    primeiro: Any
+    # Quantidade de páginas buscadas até esta
+    quantidade: int
+
+
+def _params_pagina(
+    params: Optional[Dict[str, Any]], page: Optional[int], page_size: int
+) -> Dict[str, Any]:
+    # A primeira página é pedida sem `page`, pois a numeração do servidor (a
+    # partir de 0 ou de 1) só é conhecida pela resposta
+    if page is None:
+        return {**(params or {}), "page_size": page_size}
+
+    return {**(params or {}), "page": page, "page_size": page_size}
+
+
+def _pagina_repetida(pagina: _Pagina, page: Optional[int], anterior: _Pagina):
+    if page is not None and pagina.numero != page:
+        return True
+
+    return bool(pagina.itens) and pagina.primeiro == anterior.primeiro
+
+
+def _processa_pagina(
+    response: Response,
+    tipo_item: Type[ItemT],
+    page: Optional[int],
+    page_size: int,
+    anterior: Optional[_Pagina] = None,
+    max_paginas: int = MAX_PAGINAS,
+) -> _Pagina:
+    """
+    Retorna os itens da página e se existe uma próxima página. `page` é o número
+    pedido, ou `None` na primeira página.
+
+    Servidores que ignoram os parâmetros de paginação retornam sempre a mesma
+    página. Se o número informado for diferente do pedido, ou se a página
+    começar pelo mesmo item da anterior, seus itens são descartados e a
+    listagem termina.
+    """
+
+    response.raise_for_status()
+
+    resposta = decodifica_resposta(response, List[tipo_item])
+    itens = resposta.retorno
+    metadata = resposta.metadata
+
+    if metadata is not None:
+        numero = metadata.page
+    else:
+        numero = page if page is not None else 0
+
+    pagina = _Pagina(
+        itens=itens,
+        tem_proxima=False,
+        numero=numero,
+        primeiro=itens[0] if itens else None,
+        quantidade=anterior.quantidade + 1 if anterior is not None else 1,
+    )
+
+    if anterior is not None and _pagina_repetida(pagina, page, anterior):
+        logger.warning(
+            "A página %s de %s repete a anterior, encerrando a listagem",
+            page,
+            response.request.url.path,
+        )
+        return pagina._replace(itens=[])
+
+    if metadata is not None and metadata.last_page is not None:
+        tem_proxima = metadata.page < metadata.last_page
+    else:
+        # Sem `last_page`, uma página incompleta indica que não há mais itens
+        tem_proxima = len(itens) >= page_size
+
+    if tem_proxima and pagina.quantidade >= max_paginas:
+        logger.warning(
+            "Listagem de %s interrompida após %s páginas",
+            response.request.url.path,
+            max_paginas,
+        )
+        tem_proxima = False
+
+    return pagina._replace(tem_proxima=tem_proxima)
+
+
+def paginar(
+    client: Client,
+    url: str,
+    tipo_item: Type[ItemT],
+    params: Optional[Dict[str, Any]] = None,
+    page_size: int = 100,
+    max_paginas: int = MAX_PAGINAS,
+) -> Iterator[ItemT]:
+    """
+    Percorre todas as páginas de um endpoint de listagem, retornando um item por
+    vez. A próxima página é buscada em segundo plano enquanto a atual é
+    consumida, de modo que apenas duas páginas ficam em memória.
+
+    A partir da segunda página, o número pedido é o seguinte ao informado pelo
+    servidor. No máximo `max_paginas` páginas são buscadas.
+    """
+
+    def busca(page: Optional[int], anterior: Optional[_Pagina]):
+        response = client.get(url, params=_params_pagina(params, page, page_size))
+
+        return _processa_pagina(
+            response, tipo_item, page, page_size, anterior, max_paginas
+        )
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        pagina = busca(None, None)
+
+        while True:
+            proxima = (
+                executor.submit(busca, pagina.numero + 1, pagina)
+                if pagina.tem_proxima
+                else None
+            )
+
+            yield from pagina.itens
+
+            if proxima is None:
+                return
+
+            pagina = proxima.result()
+
+
+async def apaginar(
+    client: AsyncClient,
+    url: str,
+    tipo_item: Type[ItemT],
+    params: Optional[Dict[str, Any]] = None,
+    page_size: int = 100,
+    max_paginas: int = MAX_PAGINAS,
+) -> AsyncIterator[ItemT]:
+    """
+    Versão assíncrona do `paginar`
+    """
+
+    async def busca(page: Optional[int], anterior: Optional[_Pagina]):
+        response = await client.get(url, params=_params_pagina(params, page, page_size))
+
+        return _processa_pagina(
+            response, tipo_item, page, page_size, anterior, max_paginas
+        )
+
+    pagina = await busca(None, None)
+
+    while True:
+        proxima = (
+            asyncio.ensure_future(busca(pagina.numero + 1, pagina))
+            if pagina.tem_proxima
+            else None
+        )
+
+        try:
+            for item in pagina.itens:
+                yield item
+        except BaseException:
+            if proxima is not None:
+                proxima.cancel()
+            raise
+
+        if proxima is None:
+            return
+
+        pagina = await proxima
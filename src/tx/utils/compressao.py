@@ -0,0 +1,91 @@
+import importlib.util
+import logging
+from typing import Optional, Union
+
+from httpx import AsyncClient, Client, Request, Response
+
+from src.tx.utils.corpo_json import CorpoJson
+
+logger = logging.getLogger("src.tx.utils.compressao")
+
+COMPRESSOES = ("gzip", "zstd")
+
+# Status retornado por servidores que não aceitam o `Content-Encoding` enviado
+_STATUS_COMPRESSAO_RECUSADA = 415
+
+
+def _compressao_disponivel(compressao: Optional[str]):
+    if compressao == "zstd" and importlib.util.find_spec("zstandard") is None:
+        logger.warning(
+            "Compressão zstd solicitada, mas o pacote 'zstandard' não está "
+            "instalado. Utilizando gzip."
+        )
+        return "gzip"
+
+    return compressao
+
+
+class CompressorCorpo:
+    """
+    Envia corpos JSON grandes em streaming, comprimidos com gzip ou zstd.
+
+    Se o servidor recusar o corpo comprimido (415), a requisição é repetida sem
+    compressão e a compressão é desativada para as próximas requisições.
+    """
+
+    def __init__(self, compressao: Optional[str] = None):
+        if compressao is not None and compressao not in COMPRESSOES:
+            raise ValueError(f"Compressão inválida: {compressao}")
+
+        self.compressao = _compressao_disponivel(compressao)
+
+    def _requisicao(
+        self, client: Union[Client, AsyncClient], url: str, corpo: CorpoJson
+    ) -> Request:
+        # O tamanho do corpo não é conhecido antes do envio
+        headers = {"Content-Type": "application/json", "Transfer-Encoding": "chunked"}
+
+        if self.compressao is not None:
+            headers["Content-Encoding"] = self.compressao
+
+        # `build_request` aplica a base_url, os headers e o timeout do client
+        base = client.build_request("POST", url, headers=headers)
+
+        return Request(
+            "POST",
+            base.url,
+            headers=base.headers,
+            stream=corpo.com_compressao(self.compressao),
+            extensions=base.extensions,
+        )
+
+    def _recusada(self, response: Response):
+        if self.compressao is None:
+            return False
+
+        if response.status_code != _STATUS_COMPRESSAO_RECUSADA:
+            return False
+
+        logger.warning(
+            "A API não aceitou o corpo comprimido com %s. Enviando sem compressão.",
+            self.compressao,
+        )
+        self.compressao = None
+
+        return True
+
+    def post(self, client: Client, url: str, corpo: CorpoJson) -> Response:
+        response = client.send(self._requisicao(client, url, corpo))
+
+        if self._recusada(response):
+            response = client.send(self._requisicao(client, url, corpo))
+
+        return response
+
+    async def apost(self, client: AsyncClient, url: str, corpo: CorpoJson) -> Response:
+        response = await client.send(self._requisicao(client, url, corpo))
+
+        if self._recusada(response):
+            response = await client.send(self._requisicao(client, url, corpo))
+
+        return response
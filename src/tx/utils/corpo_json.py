@@ -0,0 +1,101 @@
+import json
+import zlib
+from typing import Any, AsyncIterator, Iterable, Iterator, Optional
+
+import httpx
+from pydantic import BaseModel
+
+# Tamanho aproximado de cada bloco enviado na requisição
+TAMANHO_BLOCO = 64 * 1024
+
+
+class CorpoJson(httpx.SyncByteStream, httpx.AsyncByteStream):
+    """
+    Corpo de requisição no formato `{"<chave>": [<itens>]}`, serializado um item
+    por vez durante o envio, em vez de montar o JSON inteiro em memória.
+
+    O corpo pode ser percorrido mais de uma vez, o que permite repetir a
+    requisição (novo login após 401, erros transitórios ou compressão recusada).
+    Por isso `itens` não pode ser um gerador, que só é percorrido uma vez.
+    O JSON gerado é idêntico ao de `json.dumps` no corpo completo.
+    """
+
+    def __init__(
+        self,
+        chave: str,
+        itens: Iterable[Any],
+        compressao: Optional[str] = None,
+        tamanho_bloco: int = TAMANHO_BLOCO,
+    ):
+        self.chave = chave
+        self.itens = itens
+        self.compressao = compressao
+        self.tamanho_bloco = tamanho_bloco
+
+    def com_compressao(self, compressao: Optional[str]):
+        return CorpoJson(self.chave, self.itens, compressao, self.tamanho_bloco)
+
+    def _partes(self) -> Iterator[bytes]:
+        yield f"{{{json.dumps(self.chave)}: [".encode("utf-8")
+
+        for indice, item in enumerate(self.itens):
+            if indice:
+                yield b", "
+
+            # Itens com representação compacta se serializam sozinhos
+            partes_json = getattr(item, "partes_json", None)
+
+            if partes_json is not None:
+                yield from partes_json()
+                continue
+
+            if isinstance(item, BaseModel):
+                item = item.model_dump()
+
+            yield json.dumps(item).encode("utf-8")
+
+        yield b"]}"
+
+    def _blocos(self) -> Iterator[bytes]:
+        # Agrupa as partes pequenas para não enviar um bloco por item
+        bloco = bytearray()
+
+        for parte in self._partes():
+            bloco += parte
+
+            if len(bloco) >= self.tamanho_bloco:
+                yield bytes(bloco)
+                bloco.clear()
+
+        if bloco:
+            yield bytes(bloco)
+
+    def _compressor(self):
+        if self.compressao == "gzip":
+            return zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+        if self.compressao == "zstd":
+            import zstandard
+
+            return zstandard.ZstdCompressor(level=3).compressobj()
+
+        return None
+
+    def __iter__(self) -> Iterator[bytes]:
+        compressor = self._compressor()
+
+        if compressor is None:
+            yield from self._blocos()
+            return
+
+        for bloco in self._blocos():
+            comprimido = compressor.compress(bloco)
+
+            if comprimido:
+                yield comprimido
+
+        yield compressor.flush()
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        for bloco in self:
+            yield bloco
@@ -0,0 +1,371 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+from typing import Optional, Union
+
+import httpx
+
+from src.tx.exceptions import CircuitOpenError
+from src.tx.utils.corpo_json import CorpoJson
+
+logger = logging.getLogger("src.tx.utils.retry")
+
+# Erros de rede em que a requisição pode ser repetida com segurança
+EXCECOES_RETENTAVEIS = (httpx.TimeoutException, httpx.ConnectError)
+
+STATUS_RETENTAVEIS = (429, 500, 502, 503, 504)
+
+# Métodos que podem ser repetidos mesmo que o servidor já os tenha processado
+METODOS_IDEMPOTENTES = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+
+# Erros em que a requisição não chegou ao servidor
+EXCECOES_SEM_ENVIO = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+# Extensões da requisição (`extensions=`) reconhecidas pelo `RetryTransport`:
+# - a rota pode ser repetida mesmo não sendo idempotente (ex.: login)
+EXTENSAO_REPETIR = "tx_repetir"
+# - a requisição não passa pelo retry nem pelo circuit breaker (ex.: keep-warm)
+EXTENSAO_SEM_CIRCUIT_BREAKER = "tx_sem_circuit_breaker"
+
+# Mensagens da API que indicam erro de negócio, mesmo quando o status é 5xx
+MENSAGENS_PERMANENTES = ("já está finalizado",)
+
+
+def _mensagem_da_resposta(response: httpx.Response) -> str:
+    try:
+        return str(response.json().get("mensagem") or response.text)
+    except (ValueError, AttributeError):
+        return response.text
+
+
+def erro_retentavel(erro: Union[Exception, httpx.Response]) -> bool:
+    """
+    Classifica um erro de comunicação com o MES em retentável (timeouts, falhas
+    de conexão, 5xx e 429) ou permanente (demais 4xx e erros de negócio)
+    """
+
+    if isinstance(erro, httpx.Response):
+        if erro.status_code not in STATUS_RETENTAVEIS:
+            return False
+
+        texto = _mensagem_da_resposta(erro)
+
+        return not any(mensagem in texto for mensagem in MENSAGENS_PERMANENTES)
+
+    if isinstance(erro, httpx.HTTPStatusError):
+        return erro_retentavel(erro.response)
+
+    return isinstance(erro, EXCECOES_RETENTAVEIS)
+
+
+class PoliticaRetry:
+    """
+    Define quantas vezes e com qual intervalo uma requisição é repetida.
+
+    O intervalo cresce exponencialmente a partir de `backoff_inicial`, limitado a
+    `backoff_maximo`, com jitter para que vários processos não tentem ao mesmo
+    tempo.
+    """
+
+    def __init__(
+        self,
+        max_tentativas: int = 3,
+        backoff_inicial: float = 0.5,
+        backoff_maximo: float = 10.0,
+    ):
+        self.max_tentativas = max_tentativas
+        self.backoff_inicial = backoff_inicial
+        self.backoff_maximo = backoff_maximo
+
+    def espera(self, tentativa: int, response: Optional[httpx.Response] = None):
+        """
+        Segundos de espera antes da próxima tentativa. Respeita o cabeçalho
+        `Retry-After` quando a API o informa
+        """
+
+        if response is not None:
+            retry_after = response.headers.get("Retry-After", "")
+
+            if retry_after.isdigit():
+                return min(float(retry_after), self.backoff_maximo)
+
+        teto = min(self.backoff_maximo, self.backoff_inicial * 2 ** (tentativa - 1))
+
+        return random.uniform(0, teto)
+
+
+class CircuitBreaker:
+    """
+    Interrompe as requisições ao MES depois de `limite_falhas` falhas retentáveis
+    consecutivas. Após `tempo_aberto` segundos uma única requisição de teste é
+    liberada; se ela for bem-sucedida o circuito volta a fechar.
+    """
+
+    def __init__(self, limite_falhas: int = 5, tempo_aberto: float = 60.0):
+        self.limite_falhas = limite_falhas
+        self.tempo_aberto = tempo_aberto
+
+        self._falhas = 0
+        self._aberto_ate: Optional[float] = None
+        self._testando = False
+        self._lock = threading.Lock()
+
+    @property
+    def aberto(self):
+        return self._aberto_ate is not None
+
+    def antes_da_requisicao(self):
+        with self._lock:
+            if self._aberto_ate is None:
+                return
+
+            restante = self._aberto_ate - time.monotonic()
+
+            if restante > 0 or self._testando:
+                raise CircuitOpenError(
+                    "A API do MES está indisponível. Novas requisições serão "
+                    f"enviadas em {max(restante, 0):.0f} segundos."
+                )
+
+            # Libera somente esta requisição como teste
+            self._testando = True
+
+    def registrar_sucesso(self):
+        with self._lock:
+            if self._aberto_ate is not None:
+                logger.info("Comunicação com a API restabelecida.")
+
+            self._falhas = 0
+            self._aberto_ate = None
+            self._testando = False
+
+    def registrar_falha(self):
+        with self._lock:
+            self._falhas += 1
+            self._testando = False
+
+            if self._falhas >= self.limite_falhas:
+                logger.warning(
+                    "A API falhou %s vezes seguidas. Suspendendo requisições por "
+                    "%s segundos.",
+                    self._falhas,
+                    self.tempo_aberto,
+                )
+                self._aberto_ate = time.monotonic() + self.tempo_aberto
+
+
+def _corpo_reenviavel(request: httpx.Request):
+    # Corpos enviados em streaming só podem ser lidos novamente se forem um
+    # `CorpoJson`, que é gerado de novo a cada leitura
+    return isinstance(request.stream, (httpx.ByteStream, CorpoJson))
+
+
+def nao_processada(erro: Union[BaseException, httpx.Response, None]) -> bool:
+    """
+    Indica se o erro garante que o servidor não processou a requisição: falha
+    ao conectar, circuit breaker aberto, 429, ou 503 com `Retry-After`. Um
+    timeout de leitura ou outro 5xx pode chegar depois de a API já ter gravado
+    a leitura, o apontamento ou a ordem.
+
+    As causas da exceção também são verificadas, como o `HTTPStatusError` de
+    um `MesApiError`.
+    """
+
+    if isinstance(erro, httpx.Response):
+        return erro.status_code == 429 or (
+            erro.status_code == 503 and "Retry-After" in erro.headers
+        )
+
+    while erro is not None:
+        if isinstance(erro, (CircuitOpenError, *EXCECOES_SEM_ENVIO)):
+            return True
+
+        if isinstance(erro, httpx.HTTPStatusError):
+            return nao_processada(erro.response)
+
+        erro = erro.__cause__
+
+    return False
+
+
+def pode_repetir(request: httpx.Request, erro: Union[Exception, httpx.Response]):
+    """
+    Requisições idempotentes, ou marcadas com `EXTENSAO_REPETIR`, são repetidas
+    em qualquer erro retentável. As demais (como `/apontar`, que alterna o
+    estado do plano, e `/leituras`) somente quando não chegaram a ser processadas
+    """
+
+    if not _corpo_reenviavel(request):
+        return False
+
+    if request.method in METODOS_IDEMPOTENTES or request.extensions.get(
+        EXTENSAO_REPETIR
+    ):
+        return True
+
+    return nao_processada(erro)
+
+
+class RetryTransport(httpx.BaseTransport):
+    """
+    Transport que aplica a `PoliticaRetry` e o `CircuitBreaker` a todas as
+    requisições feitas pelo client
+    """
+
+    def __init__(
+        self,
+        transport: httpx.BaseTransport,
+        politica: Optional[PoliticaRetry] = None,
+        circuit_breaker: Optional[CircuitBreaker] = None,
+    ):
+        self.transport = transport
+        self.politica = politica or PoliticaRetry()
+        self.circuit_breaker = circuit_breaker or CircuitBreaker()
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        if request.extensions.get(EXTENSAO_SEM_CIRCUIT_BREAKER):
+            return self.transport.handle_request(request)
+
+        self.circuit_breaker.antes_da_requisicao()
+
+        tentativa = 1
+
+        while True:
+            try:
+                response = self.transport.handle_request(request)
+            except EXCECOES_RETENTAVEIS as exc:
+                if not self._pode_repetir(request, tentativa, exc):
+                    self.circuit_breaker.registrar_falha()
+                    raise
+
+                espera = self.politica.espera(tentativa)
+                logger.warning(
+                    "Erro de comunicação com a API (%s). Tentativa %s de %s, "
+                    "repetindo em %.1f segundos...",
+                    exc,
+                    tentativa,
+                    self.politica.max_tentativas,
+                    espera,
+                )
+            except Exception:
+                self.circuit_breaker.registrar_falha()
+                raise
+            else:
+                if not self._status_retentavel(response):
+                    self.circuit_breaker.registrar_sucesso()
+                    return response
+
+                if not self._pode_repetir(request, tentativa, response):
+                    self.circuit_breaker.registrar_falha()
+                    return response
+
+                espera = self.politica.espera(tentativa, response)
+                logger.warning(
+                    "A API respondeu %s. Tentativa %s de %s, repetindo em %.1f "
+                    "segundos...",
+                    response.status_code,
+                    tentativa,
+                    self.politica.max_tentativas,
+                    espera,
+                )
+                response.close()
+
+            time.sleep(espera)
+            tentativa += 1
+
+    def _status_retentavel(self, response: httpx.Response):
+        if response.status_code not in STATUS_RETENTAVEIS:
+            return False
+
+        response.read()
+
+        return erro_retentavel(response)
+
+    def _pode_repetir(self, request: httpx.Request, tentativa: int, erro):
+        return tentativa < self.politica.max_tentativas and pode_repetir(request, erro)
+
+    def close(self):
+        self.transport.close()
+
+
+class AsyncRetryTransport(httpx.AsyncBaseTransport):
+    """
+    Versão assíncrona do `RetryTransport`
+    """
+
+    def __init__(
+        self,
+        transport: httpx.AsyncBaseTransport,
+        politica: Optional[PoliticaRetry] = None,
+        circuit_breaker: Optional[CircuitBreaker] = None,
+    ):
+        self.transport = transport
+        self.politica = politica or PoliticaRetry()
+        self.circuit_breaker = circuit_breaker or CircuitBreaker()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if request.extensions.get(EXTENSAO_SEM_CIRCUIT_BREAKER):
+            return await self.transport.handle_async_request(request)
+
+        self.circuit_breaker.antes_da_requisicao()
+
+        tentativa = 1
+
+        while True:
+            try:
+                response = await self.transport.handle_async_request(request)
+            except EXCECOES_RETENTAVEIS as exc:
+                if not self._pode_repetir(request, tentativa, exc):
+                    self.circuit_breaker.registrar_falha()
+                    raise
+
+                espera = self.politica.espera(tentativa)
+                logger.warning(
+                    "Erro de comunicação com a API (%s). Tentativa %s de %s, "
+                    "repetindo em %.1f segundos...",
+                    exc,
+                    tentativa,
+                    self.politica.max_tentativas,
+                    espera,
+                )
+            except Exception:
+                self.circuit_breaker.registrar_falha()
+                raise
+            else:
+                if not await self._status_retentavel(response):
+                    self.circuit_breaker.registrar_sucesso()
+                    return response
+
+                if not self._pode_repetir(request, tentativa, response):
+                    self.circuit_breaker.registrar_falha()
+                    return response
+
+                espera = self.politica.espera(tentativa, response)
+                logger.warning(
+                    "A API respondeu %s. Tentativa %s de %s, repetindo em %.1f "
+                    "segundos...",
+                    response.status_code,
+                    tentativa,
+                    self.politica.max_tentativas,
+                    espera,
+                )
+                await response.aclose()
+
+            await asyncio.sleep(espera)
+            tentativa += 1
+
+    async def _status_retentavel(self, response: httpx.Response):
+        if response.status_code not in STATUS_RETENTAVEIS:
+            return False
+
+        await response.aread()
+
+        return erro_retentavel(response)
+
+    def _pode_repetir(self, request: httpx.Request, tentativa: int, erro):
+        return tentativa < self.politica.max_tentativas and pode_repetir(request, erro)
+
+    async def aclose(self):
+        await self.transport.aclose()
@@ -0,0 +1,103 @@
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Optional, Tuple
+
+from src.tx.modules._auth import LoginReturn
+
+logger = logging.getLogger("src.tx.utils.token_cache")
+
+# Login guardado e quantos segundos ele ainda é válido
+LoginEmCache = Tuple[LoginReturn, float]
+
+
+class CacheToken:
+    """
+    Guarda em disco o token de acesso à API, por host e usuário, para que
+    execuções curtas do CLI não precisem fazer login a cada chamada.
+
+    No Linux o arquivo é criado com permissão somente para o usuário atual. No
+    Windows ele herda as permissões da pasta, que deve ser uma pasta do próprio
+    usuário (como `%LOCALAPPDATA%`). A senha nunca é gravada.
+    """
+
+    def __init__(self, caminho: Path):
+        self.caminho = caminho
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _chave(base_url: str, user: str):
+        return f"{base_url.rstrip('/')}|{user}"
+
+    def _ler(self) -> dict:
+        try:
+            with open(self.caminho, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as exc:
+            logger.warning("Cache de token inválido, ignorando: %s", exc)
+            return {}
+
+    def carregar(self, base_url: str, user: str) -> Optional[LoginEmCache]:
+        """
+        Retorna o login guardado e quantos segundos ele ainda é válido, ou
+        `None` se não houver token válido para o host e usuário
+        """
+
+        with self._lock:
+            entrada = self._ler().get(self._chave(base_url, user))
+
+        if entrada is None:
+            return None
+
+        try:
+            login_data = LoginReturn.model_validate(entrada["login"])
+            salvo_em = float(entrada["salvo_em"])
+        except (KeyError, TypeError, ValueError):
+            return None
+
+        # A validade é calculada pela duração informada pelo servidor e pelo
+        # relógio local no momento em que o token foi salvo
+        duracao = (login_data.validade - login_data.inicio).total_seconds()
+        restante = salvo_em + duracao - time.time()
+
+        if restante <= 0:
+            return None
+
+        return login_data, restante
+
+    def salvar(self, base_url: str, user: str, login_data: LoginReturn):
+        with self._lock:
+            dados = self._ler()
+            dados[self._chave(base_url, user)] = {
+                "login": login_data.model_dump(mode="json"),
+                "salvo_em": time.time(),
+            }
+
+            self.caminho.parent.mkdir(parents=True, exist_ok=True)
+
+            try:
+                # Um nome temporário por processo, já criado com permissão
+                # somente para o usuário atual
+                fd, temporario = tempfile.mkstemp(
+                    prefix=self.caminho.name + ".",
+                    suffix=".tmp",
+                    dir=self.caminho.parent,
+                )
+
+                try:
+                    with os.fdopen(fd, "w", encoding="utf-8") as f:
+                        json.dump(dados, f)
+
+                    os.replace(temporario, self.caminho)
+                except OSError:
+                    os.unlink(temporario)
+                    raise
+            except OSError as exc:
+                # O cache é apenas uma otimização, o login continua funcionando
+                logger.warning("Não foi possível salvar o cache de token: %s", exc)
@@ -1,7 +1,9 @@
 import json
 from pathlib import Path
 
-from httpx import HTTPStatusError
+from httpx import HTTPStatusError, Response
+
+from src.tx.exceptions import MesApiError
 
 
 def get_version():
@@ -27,3 +29,24 @@ def handle_http_error(exc: HTTPStatusError):
     )
 
     return message
+
+
+def raise_for_api_error(
+    response: Response, message: str = "Erro ao enviar dados para a API"
+):
+    """
+    Verifica o status da resposta da API, levantando uma exceção com a mensagem
+    retornada pelo servidor em caso de erro
+    """
+
+    try:
+        response.raise_for_status()
+
+    except Exception as exc:
+        status_code = None
+
+        if isinstance(exc, HTTPStatusError):
+            message = handle_http_error(exc)
+            status_code = exc.response.status_code
+
+        raise MesApiError(message, status_code) from exc